@@ -6,6 +6,8 @@ document.addEventListener('DOMContentLoaded', async function() {
     const menuToggle = document.getElementById('menuToggle');
     const sidebar = document.getElementById('sidebar');
     const reservationsListEl = document.getElementById('reservationsList');
+    const RESERVATIONS_PAGE_SIZE = 20;
+    const HISTORY_PAGE_SIZE = 50;
     
     // Log DOM elements for debugging
     console.log('DOM elements:', {
@@ -20,29 +22,26 @@ document.addEventListener('DOMContentLoaded', async function() {
     let currentUser = null;
     let currentChat = null;
     let isWaitingForResponse = false;
+    // Message whose send failed, a resend of the same text reuses its idempotency key
+    let pendingMessage = null;
+    // History cursors, message ids of the oldest and newest loaded messages
+    let oldestMessageId = null;
+    let newestMessageId = null;
+    let hasOlderMessages = false;
+    let isLoadingHistory = false;
     
     // Initialize the app
     async function initApp() {
         console.log('Initializing app...');
         try {
-            // Get or create user ID
-            currentUser = await getOrCreateUserId();
-            if (!currentUser) {
-                throw new Error('Failed to get user ID');
+            // Get or create the user and their chat in one request
+            const session = await bootstrapSession();
+            if (!session) {
+                throw new Error('Failed to bootstrap session');
             }
-            console.log(`User ID: ${currentUser}`);
-            //ocument.getElementById('userInfo').textContent = `${currentUser.slice(0, 8)}...`;
-            
-            // Create a chat for the user
-            const response = await fetch(`/create_chat/${currentUser}`, {
-                credentials: 'include'
-            });
-            if (!response.ok) {
-                throw new Error(`Failed to create chat: ${response.statusText}`);
-            }
-            const data = await response.json();
-            currentChat = data.chat_id;
-            console.log(`Chat created with ID: ${currentChat}`);
+            currentUser = session.user_id;
+            currentChat = session.chat_id;
+            console.log(`User ID: ${currentUser}, chat ID: ${currentChat}`);
             
             // Load chat messages
             await loadChatMessages(currentChat);
@@ -58,27 +57,54 @@ document.addEventListener('DOMContentLoaded', async function() {
         }
     }
     
-    // Get or create user ID from cookies/backend
-    async function getOrCreateUserId() {
+    // Get or create the user (from the cookie) and their chat
+    async function bootstrapSession() {
         try {
-            const response = await fetch('/get_user_id', {
+            const response = await fetch('/bootstrap', {
+                method: 'POST',
                 credentials: 'include'
             });
             if (!response.ok) {
-                throw new Error(`Failed to get user ID: ${response.statusText}`);
+                throw new Error(`Failed to bootstrap session: ${response.statusText}`);
             }
             const data = await response.json();
-            console.log(`User ID received: ${data.user_id}`);
-            return data.user_id;
+            console.log(`Session received: ${data.user_id} / ${data.chat_id}`);
+            return data;
         } catch (error) {
-            console.error('Error getting user ID:', error);
+            console.error('Error bootstrapping session:', error);
             addMessageToUI('Failed to connect to the server. Please try again.', 'received');
             return null;
         }
     }
     
-    // Load reservations for the user with retry
-    async function loadReservations(retryCount = 3, delay = 1000) {
+    // Render one reservation card
+    function renderReservation(reservation) {
+        const reservationEl = document.createElement('div');
+        reservationEl.className = 'reservation-item';
+        reservationEl.dataset.reservationId = `res-${reservation.reservation_id}`;
+
+        const date = new Date(reservation.day);
+        const formattedDate = date.toLocaleDateString('en-US', {
+            weekday: 'short',
+            month: 'short',
+            day: 'numeric',
+            year: 'numeric'
+        });
+
+        reservationEl.innerHTML = `
+            <div class="reservation-details">
+                <span class="label">Date:</span>
+                <span class="value">${formattedDate}</span>
+                <span class="label">Time:</span>
+                <span class="value">${reservation.time}</span>
+            </div>
+            <span class="status">Confirmed</span>
+        `;
+        return reservationEl;
+    }
+
+    // Load reservations for the user with retry, one page at a time
+    async function loadReservations(retryCount = 3, delay = 1000, after = null) {
         if (!currentUser) {
             console.error('Cannot load reservations: currentUser is null');
             reservationsListEl.innerHTML = '<p class="no-reservations">Error: User not initialized.</p>';
@@ -87,7 +113,12 @@ document.addEventListener('DOMContentLoaded', async function() {
 
         try {
             console.log(`Loading reservations for user: ${currentUser}`);
-            const response = await fetch(`/reservations/${currentUser}`, {
+            const params = new URLSearchParams({ limit: RESERVATIONS_PAGE_SIZE });
+            if (after) {
+                params.set('after_day', after.after_day);
+                params.set('after_time', after.after_time);
+            }
+            const response = await fetch(`/reservations/${currentUser}?${params}`, {
                 credentials: 'include',
                 headers: {
                     'Accept': 'application/json'
@@ -98,45 +129,27 @@ document.addEventListener('DOMContentLoaded', async function() {
             }
             const data = await response.json();
             console.log('Reservations data:', data);
-            
-            reservationsListEl.innerHTML = '';
-            
+
+            if (!after) {
+                reservationsListEl.innerHTML = '';
+            }
+            const moreButton = reservationsListEl.querySelector('.load-more');
+            if (moreButton) {
+                moreButton.remove();
+            }
+
             if (data.reservations && data.reservations.length > 0) {
-                data.reservations.forEach((reservation, index) => {
-                    const reservationEl = document.createElement('div');
-                    reservationEl.className = 'reservation-item';
-                    reservationEl.dataset.reservationId = `res-${index}`; // Placeholder ID
-                    
-                    const date = new Date(reservation.day);
-                    const formattedDate = date.toLocaleDateString('en-US', {
-                        weekday: 'short',
-                        month: 'short',
-                        day: 'numeric',
-                        year: 'numeric'
-                    });
-                    
-                    reservationEl.innerHTML = `
-                        <div class="reservation-details">
-                            <span class="label">Date:</span>
-                            <span class="value">${formattedDate}</span>
-                            <span class="label">Time:</span>
-                            <span class="value">${reservation.time}</span>
-                        </div>
-                        <span class="status">Confirmed</span>
-                    `;
-                    reservationsListEl.appendChild(reservationEl);
-                    
-                    // Add click event for interactivity
-                    //reservationEl.addEventListener('click', () => {
-                    //    console.log(`Clicked reservation: ${reservationEl.dataset.reservationId}`, {
-                    //        date: formattedDate,
-                     //       time: reservation.time
-                    //    });
-                        // Placeholder for future actions (e.g., cancel)
-                    //    addMessageToUI('Reservation details clicked. Action coming soon!', 'received');
-                    //});
+                data.reservations.forEach(reservation => {
+                    reservationsListEl.appendChild(renderReservation(reservation));
                 });
-            } else {
+                if (data.next) {
+                    const button = document.createElement('button');
+                    button.className = 'load-more';
+                    button.textContent = 'Show more';
+                    button.addEventListener('click', () => loadReservations(3, 1000, data.next));
+                    reservationsListEl.appendChild(button);
+                }
+            } else if (!after) {
                 reservationsListEl.innerHTML = '<p class="no-reservations">No reservations found.</p>';
             }
         } catch (error) {
@@ -150,25 +163,37 @@ document.addEventListener('DOMContentLoaded', async function() {
         }
     }
     
-    // Load messages for the chat
+    // Fetch one page of a chat's history
+    async function fetchMessages(chatId, params = {}) {
+        const query = new URLSearchParams({ limit: HISTORY_PAGE_SIZE, ...params });
+        const response = await fetch(`/chat/${chatId}/messages?${query}`, {
+            credentials: 'include'
+        });
+        if (!response.ok) {
+            throw new Error(`Failed to load messages: ${response.statusText}`);
+        }
+        return response.json();
+    }
+
+    // Load the newest messages of the chat, older ones come in on scroll
     async function loadChatMessages(chatId) {
         currentChat = chatId;
         messagesEl.innerHTML = '';
+        oldestMessageId = null;
+        newestMessageId = null;
+        hasOlderMessages = false;
         console.log('Loading messages for chat:', chatId);
         
         try {
-            const response = await fetch(`/chat/${chatId}/messages`, {
-                credentials: 'include'
-            });
-            if (!response.ok) {
-                throw new Error(`Failed to load messages: ${response.statusText}`);
-            }
-            const data = await response.json();
+            const data = await fetchMessages(chatId);
             
             if (data.messages && data.messages.length > 0) {
                 data.messages.forEach(msg => {
                     addMessageToUI(msg.text, msg.type);
                 });
+                oldestMessageId = data.messages[0].message_id;
+                newestMessageId = data.messages[data.messages.length - 1].message_id;
+                hasOlderMessages = data.has_more;
                 
                 messagesEl.scrollTop = messagesEl.scrollHeight;
             } else {
@@ -179,14 +204,68 @@ document.addEventListener('DOMContentLoaded', async function() {
             addMessageToUI(`Error loading messages: ${error.message}`, 'received');
         }
     }
-    
-    // Add a message to the UI
-    function addMessageToUI(text, type) {
-        const welcomeMsg = document.querySelector('.welcome-message');
-        if (welcomeMsg) {
-            welcomeMsg.remove();
+
+    // Prepend the page before the oldest loaded message, keeping the view in place
+    async function loadOlderMessages() {
+        if (!hasOlderMessages || isLoadingHistory || !currentChat) {
+            return;
         }
-        
+        isLoadingHistory = true;
+        try {
+            const data = await fetchMessages(currentChat, { before: oldestMessageId });
+            const previousHeight = messagesEl.scrollHeight;
+            const fragment = document.createDocumentFragment();
+            data.messages.forEach(msg => {
+                fragment.appendChild(createMessageElement(msg.text, msg.type));
+            });
+            messagesEl.insertBefore(fragment, messagesEl.firstChild);
+            messagesEl.scrollTop += messagesEl.scrollHeight - previousHeight;
+            if (data.messages.length > 0) {
+                oldestMessageId = data.messages[0].message_id;
+            }
+            hasOlderMessages = data.has_more;
+        } catch (error) {
+            console.error('Error loading older messages:', error);
+        } finally {
+            isLoadingHistory = false;
+        }
+    }
+
+    // Fetch only what was written since the newest known message, e.g. from another tab.
+    // Messages shown locally but not yet confirmed are replaced by the stored ones.
+    async function syncNewMessages() {
+        if (!currentChat || isWaitingForResponse || isLoadingHistory) {
+            return;
+        }
+        isLoadingHistory = true;
+        try {
+            const fresh = [];
+            let hasMore = true;
+            while (hasMore) {
+                const data = await fetchMessages(currentChat, { since: newestMessageId ?? 0 });
+                fresh.push(...data.messages);
+                if (data.messages.length > 0) {
+                    newestMessageId = data.messages[data.messages.length - 1].message_id;
+                }
+                hasMore = data.has_more;
+            }
+            if (fresh.length === 0) {
+                return;
+            }
+            messagesEl.querySelectorAll('.message.unsynced').forEach(el => el.remove());
+            if (oldestMessageId === null) {
+                oldestMessageId = fresh[0].message_id;
+            }
+            fresh.forEach(msg => addMessageToUI(msg.text, msg.type));
+        } catch (error) {
+            console.error('Error syncing messages:', error);
+        } finally {
+            isLoadingHistory = false;
+        }
+    }
+    
+    // Build a message element
+    function createMessageElement(text, type) {
         const messageEl = document.createElement('div');
         messageEl.className = `message ${type}`;
         
@@ -199,9 +278,33 @@ document.addEventListener('DOMContentLoaded', async function() {
         
         messageEl.appendChild(messageText);
         messageEl.appendChild(messageTime);
+        return messageEl;
+    }
+
+    // Add a message to the UI
+    function addMessageToUI(text, type) {
+        const welcomeMsg = document.querySelector('.welcome-message');
+        if (welcomeMsg) {
+            welcomeMsg.remove();
+        }
+        
+        const messageEl = createMessageElement(text, type);
         messagesEl.appendChild(messageEl);
         
         messagesEl.scrollTop = messagesEl.scrollHeight;
+        return messageEl;
+    }
+    
+    // Random v4 uuid, crypto.randomUUID only exists on https and localhost
+    function newIdempotencyKey() {
+        if (crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        const bytes = crypto.getRandomValues(new Uint8Array(16));
+        bytes[6] = (bytes[6] & 0x0f) | 0x40;
+        bytes[8] = (bytes[8] & 0x3f) | 0x80;
+        const hex = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+        return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
     }
     
     // Handle message submission
@@ -221,7 +324,13 @@ document.addEventListener('DOMContentLoaded', async function() {
         }
         
         console.log(`Sending message: ${message}`);
-        addMessageToUI(message, 'sent');
+        if (pendingMessage && pendingMessage.text === message) {
+            // Retrying a failed send, the server answers it at most once
+            pendingMessage.errorEl.remove();
+        } else {
+            pendingMessage = { text: message, key: newIdempotencyKey() };
+            addMessageToUI(message, 'sent').classList.add('unsynced');
+        }
         messageInput.value = '';
         
         isWaitingForResponse = true;
@@ -232,14 +341,15 @@ document.addEventListener('DOMContentLoaded', async function() {
         messagesEl.scrollTop = messagesEl.scrollHeight;
         
         try {
-            const response = await fetch(`/chat/${currentUser}/${currentChat}`, {
+            const response = await fetch(`/chat/${currentUser}/${currentChat}/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    'Accept': 'application/json'
+                    'Accept': 'text/event-stream'
                 },
                 body: JSON.stringify({
-                    question: message
+                    question: message,
+                    idempotency_key: pendingMessage.key
                 }),
                 credentials: 'include'
             });
@@ -250,26 +360,128 @@ document.addEventListener('DOMContentLoaded', async function() {
                 throw new Error(`Server error: ${response.status} - ${errorText}`);
             }
             
-            const data = await response.json();
-            console.log('Response data:', data);
+            // Swap the spinner for a message that fills in as tokens arrive
+            let streamed = null;
+            const ensureStreamedMessage = () => {
+                if (!streamed) {
+                    messagesEl.removeChild(loadingEl);
+                    streamed = createStreamingMessage();
+                }
+                return streamed;
+            };
+            
+            let finalResponse = null;
+            await readEventStream(response, (event, data) => {
+                if (event === 'status') {
+                    ensureStreamedMessage().statusEl.textContent = describeTool(data.tool);
+                } else if (event === 'token') {
+                    const target = ensureStreamedMessage();
+                    target.statusEl.textContent = '';
+                    target.textEl.textContent += data.text;
+                } else if (event === 'done') {
+                    finalResponse = data.response;
+                } else if (event === 'error') {
+                    throw new Error(data.detail);
+                }
+                messagesEl.scrollTop = messagesEl.scrollHeight;
+            });
+            console.log('Final response:', finalResponse);
+            // Answered, a failure before this point may have booked already and keeps the key
+            pendingMessage = null;
             
-            messagesEl.removeChild(loadingEl);
-            if (data.response) {
-                addMessageToUI(data.response, 'received');
+            const target = ensureStreamedMessage();
+            target.statusEl.remove();
+            if (finalResponse) {
+                target.textEl.textContent = finalResponse;
                 console.log('Reloading reservations after message');
                 await loadReservations();
-            } else {
-                addMessageToUI('Sorry, I couldn\'t process your request.', 'received');
+            } else if (!target.textEl.textContent) {
+                target.textEl.textContent = 'Sorry, I couldn\'t process your request.';
             }
         } catch (error) {
             console.error('Error sending message:', error);
-            messagesEl.removeChild(loadingEl);
-            addMessageToUI(`Error: ${error.message || 'Failed to connect to the server. Please try again.'}`, 'received');
+            if (loadingEl.parentNode) {
+                messagesEl.removeChild(loadingEl);
+            }
+            const errorText = `Error: ${error.message || 'Failed to connect to the server.'} Press send to try again.`;
+            if (pendingMessage) {
+                pendingMessage.errorEl = addMessageToUI(errorText, 'received');
+                messageInput.value = pendingMessage.text;
+            } else {
+                addMessageToUI(errorText, 'received');
+            }
         } finally {
             isWaitingForResponse = false;
         }
     }
     
+    // Create an empty received message that is filled in while streaming
+    function createStreamingMessage() {
+        const messageEl = document.createElement('div');
+        messageEl.className = 'message received unsynced';
+        
+        const textEl = document.createElement('div');
+        const statusEl = document.createElement('div');
+        statusEl.className = 'message-status';
+        
+        const messageTime = document.createElement('div');
+        messageTime.className = 'message-time';
+        messageTime.textContent = new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+        
+        messageEl.appendChild(statusEl);
+        messageEl.appendChild(textEl);
+        messageEl.appendChild(messageTime);
+        messagesEl.appendChild(messageEl);
+        messagesEl.scrollTop = messagesEl.scrollHeight;
+        return { messageEl, textEl, statusEl };
+    }
+    
+    // Human readable progress for the tool the agent is running
+    function describeTool(tool) {
+        const descriptions = {
+            FAQ: 'Looking that up...',
+            CheckAvailability: 'Checking available slots...',
+            BookAppointment: 'Booking your appointment...',
+            CancelAppointment: 'Cancelling your appointment...',
+            ViewReservations: 'Fetching your reservations...'
+        };
+        return descriptions[tool] || 'Working on it...';
+    }
+    
+    // Read a Server-Sent Events response body, calling onEvent(event, data) per message
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                let event = 'message';
+                let data = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data += line.slice(5).trim();
+                    }
+                });
+                if (data) {
+                    onEvent(event, JSON.parse(data));
+                }
+            }
+        }
+    }
+    
     // Toggle sidebar on mobile
     function toggleSidebar() {
         console.log('toggleSidebar triggered');
@@ -281,6 +493,16 @@ document.addEventListener('DOMContentLoaded', async function() {
         console.log('Setting up event listeners');
         messageForm.addEventListener('submit', handleMessageSubmit);
         menuToggle.addEventListener('click', toggleSidebar);
+        messagesEl.addEventListener('scroll', () => {
+            if (messagesEl.scrollTop < 80) {
+                loadOlderMessages();
+            }
+        });
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'visible') {
+                syncNewMessages();
+            }
+        });
         
         document.addEventListener('click', (e) => {
             console.log('Click outside check:', {
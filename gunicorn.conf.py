@@ -0,0 +1,25 @@
+# Serving with several workers: gunicorn -c gunicorn.conf.py src.api.app2:app
+# The app is imported once in the master and forked, so model weights and the
+# read-only index pages are shared copy-on-write between the workers.
+import gc
+import os
+
+# The tokenizers thread pool does not survive a fork
+os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '1'))
+worker_class = 'uvicorn.workers.UvicornWorker'
+preload_app = os.getenv('PRELOAD_APP', 'true').lower() == 'true'
+timeout = 120
+
+def when_ready(server):
+    # Objects loaded so far are never collected, so the gc does not touch (and copy) their pages
+    if preload_app:
+        gc.freeze()
+
+def post_fork(server, worker):
+    # Connections opened in the master (ensure_schema) must not be shared by the workers
+    from src.utils.db import engine, async_engine
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
@@ -0,0 +1,94 @@
+'''
+Showing that concurrent requests are no longer serialized on the event loop.
+
+Runs N concurrent slow "requests" against a local SQLite stand-in, plus one
+fast request (SELECT 1) issued while they are in flight. This happens once
+with the sync db_loader() called directly from async code, which is the old
+route pattern, and once through async_db_loader(). The script reports the
+longest event loop stall and the latency of the fast request. With the sync
+provider, the fast request waits behind every slow query. With the async
+provider, it is answered while they run.
+
+Usage (needs aiosqlite installed):
+    python -m scripts.bench_async_db --requests 8
+'''
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+SLOW_QUERY = '''
+    WITH RECURSIVE counter(x) AS (
+        SELECT 1 UNION ALL SELECT x + 1 FROM counter WHERE x < :n
+    )
+    SELECT count(*) FROM counter
+'''
+
+async def heartbeat(stop, interval=0.005):
+    '''Longest gap between ticks of a coroutine that wants to run every interval'''
+    longest = 0.0
+    last = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(interval)
+        now = time.perf_counter()
+        longest = max(longest, now - last - interval)
+        last = now
+    return longest
+
+async def run(slow_request, fast_request, requests):
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(heartbeat(stop))
+    start = time.perf_counter()
+    slow = [asyncio.create_task(slow_request()) for _ in range(requests)]
+    # Issued right behind the slow requests, like a health check or a short chat
+    fast_start = time.perf_counter()
+    await fast_request()
+    fast_latency = time.perf_counter() - fast_start
+    await asyncio.gather(*slow)
+    total = time.perf_counter() - start
+    stop.set()
+    return total, await monitor, fast_latency
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=1_000_000, help='size of the slow query')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    from sqlalchemy import text
+    from src.utils.db import db_loader, async_db_loader, async_engine
+
+    async def sync_slow():
+        with db_loader() as session:
+            session.execute(text(SLOW_QUERY), {'n': args.rows}).scalar()
+
+    async def sync_fast():
+        await asyncio.sleep(0)
+        with db_loader() as session:
+            session.execute(text('SELECT 1')).scalar()
+
+    async def async_slow():
+        async with async_db_loader() as session:
+            (await session.execute(text(SLOW_QUERY), {'n': args.rows})).scalar()
+
+    async def async_fast():
+        await asyncio.sleep(0)
+        async with async_db_loader() as session:
+            (await session.execute(text('SELECT 1'))).scalar()
+
+    results = {
+        'sync db_loader': await run(sync_slow, sync_fast, args.requests),
+        'async_db_loader': await run(async_slow, async_fast, args.requests),
+    }
+    await async_engine.dispose()
+
+    print(f'{args.requests} concurrent slow requests + 1 fast request')
+    print(f'{"provider":<18}{"total ms":>10}{"max loop stall ms":>20}{"fast request ms":>18}')
+    for name, (total, stall, fast) in results.items():
+        print(f'{name:<18}{total * 1000:>10.1f}{stall * 1000:>20.1f}{fast * 1000:>18.1f}')
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+'''
+Benchmarking query embedding latency and throughput per backend.
+
+Compares torch (SentenceTransformer), onnx fp32 and onnx dynamic int8 on the
+messages of data/faq_paraphrases.csv. For each backend and thread count it
+reports the load time, p50/p99 latency of single-message encodes (the faq
+lookup path, where the query embedding cache misses) and the throughput of
+--batch-size batches in sentences per second (the corpus embedding path).
+Thread counts set torch.set_num_threads for torch and intra_op_num_threads for
+onnx. Run scripts.check_embedding_parity first, the onnx load time
+includes the export and quantization otherwise.
+
+Usage (full model environment):
+    python -m scripts.bench_embedding
+    python -m scripts.bench_embedding --backends onnx onnx-int8 --threads 1 2 4 --rounds 5
+'''
+import argparse
+import csv
+import time
+import numpy as np
+
+def load(backend, threads, model_name):
+    if backend == 'torch':
+        import torch
+        from sentence_transformers import SentenceTransformer
+        torch.set_num_threads(threads)
+        return SentenceTransformer(model_name, device='cpu')
+    from src.model.onnx_embedder import OnnxEmbedder
+    return OnnxEmbedder(model_name, quantize=backend == 'onnx-int8', threads=threads)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paraphrases', default='data/faq_paraphrases.csv')
+    parser.add_argument('--backends', nargs='+', default=['torch', 'onnx', 'onnx-int8'])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1])
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--rounds', type=int, default=3, help='passes over the messages')
+    parser.add_argument('--warmup', type=int, default=10)
+    args = parser.parse_args()
+
+    from src.utils.config import config
+
+    with open(args.paraphrases, newline='', encoding='utf-8') as file:
+        messages = [row['message'] for row in csv.DictReader(file)]
+    print(f'{len(messages)} messages x {args.rounds} rounds, batch size {args.batch_size}')
+    print(f'{"backend":<12}{"threads":>8}{"load s":>9}{"p50 ms":>9}{"p99 ms":>9}{"sent/s":>10}')
+
+    for backend in args.backends:
+        for threads in args.threads:
+            start = time.perf_counter()
+            model = load(backend, threads, config.EMBEDDING_MODEL)
+            load_seconds = time.perf_counter() - start
+            for message in messages[:args.warmup]:
+                model.encode(message)
+
+            latencies = []
+            for _ in range(args.rounds):
+                for message in messages:
+                    start = time.perf_counter()
+                    model.encode(message)
+                    latencies.append(time.perf_counter() - start)
+            latencies = np.array(latencies) * 1000
+
+            start = time.perf_counter()
+            for _ in range(args.rounds):
+                model.encode(messages, batch_size=args.batch_size)
+            throughput = len(messages) * args.rounds / (time.perf_counter() - start)
+
+            print(f'{backend:<12}{threads:>8}{load_seconds:>9.2f}{np.percentile(latencies, 50):>9.2f}'
+                  f'{np.percentile(latencies, 99):>9.2f}{throughput:>10.0f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+'''
+Benchmarking the faiss index types against the flat baseline.
+
+Builds every variant through FaissIndex.create_index over the same corpus:
+flat, hnsw, ivf_flat and ivf_pq, over l2 and ip. For each it reports build
+time, serialized size, p50/p99 single-query latency and recall@k against exact
+search. The corpus is either synthetic, clustered unit vectors shaped like
+MiniLM embeddings, or any (n, dim) float32 .npy file such as
+data/embeddings.npy. The queries are perturbed corpus vectors.
+
+Search parameters can be swept by passing several values, e.g.
+--nprobe 4 16 64 --ef-search 32 128. Build parameters come from the flags or
+fall back to the index section of config.yml.
+
+Usage:
+    python -m scripts.bench_index --n 100000 --queries 500 --k 10
+    python -m scripts.bench_index --vectors data/embeddings.npy --types flat hnsw
+'''
+import argparse
+import time
+import numpy as np
+
+def synthetic_corpus(n, dim, clusters, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype('float32')
+    vectors = centers[rng.integers(0, clusters, n)] + 0.35 * rng.standard_normal((n, dim)).astype('float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vectors', default=None, help='.npy corpus, synthetic when omitted')
+    parser.add_argument('--n', type=int, default=100000, help='synthetic corpus size')
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--clusters', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--types', nargs='+', default=['flat', 'hnsw', 'ivf_flat', 'ivf_pq'])
+    parser.add_argument('--metrics', nargs='+', default=['l2', 'ip'])
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--hnsw-m', type=int, default=None)
+    parser.add_argument('--ef-construction', type=int, default=None)
+    parser.add_argument('--pq-m', type=int, default=None)
+    parser.add_argument('--pq-nbits', type=int, default=None)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=None)
+    parser.add_argument('--ef-search', type=int, nargs='+', default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    import faiss
+    from src.processing.data_index import FaissIndex
+    from src.utils.config import config
+
+    if args.vectors:
+        corpus = np.ascontiguousarray(np.load(args.vectors), dtype='float32')
+        corpus = corpus[np.linalg.norm(corpus, axis=1) > 0]
+    else:
+        corpus = synthetic_corpus(args.n, args.dim, args.clusters, args.seed)
+    n, dim = corpus.shape
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, n, args.queries)
+    queries = corpus[picks] + 0.1 * rng.standard_normal((args.queries, dim)).astype('float32')
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    k = min(args.k, n)
+
+    build = {
+        'nlist': args.nlist or config.INDEX_NLIST,
+        'hnsw_m': args.hnsw_m or config.INDEX_HNSW_M,
+        'ef_construction': args.ef_construction or config.INDEX_EF_CONSTRUCTION,
+        'pq_m': args.pq_m or config.INDEX_PQ_M,
+        'pq_nbits': args.pq_nbits or config.INDEX_PQ_NBITS,
+    }
+    nprobes = args.nprobe or [config.INDEX_NPROBE]
+    ef_searches = args.ef_search or [config.INDEX_EF_SEARCH]
+    print(f'corpus {n} x {dim}, {args.queries} queries, recall@{k}, {faiss.omp_get_max_threads()} threads')
+    print(f'{"index":<10}{"metric":<7}{"search":<14}{"build s":>9}{"size MB":>9}{"p50 ms":>9}{"p99 ms":>9}{"recall":>8}')
+
+    for metric in args.metrics:
+        truth = None
+        for index_type in args.types:
+            params = dict(build, type=index_type, metric=metric, id_map=True)
+            start = time.perf_counter()
+            index = FaissIndex.create_index(dim, n, params)
+            vectors = FaissIndex.prepare(index, corpus)
+            if not index.is_trained:
+                index.train(vectors)
+            index.add_with_ids(vectors, np.arange(n, dtype='int64'))
+            build_seconds = time.perf_counter() - start
+            size_mb = faiss.serialize_index(index).nbytes / 1e6
+
+            if index_type in ('ivf_flat', 'ivf_pq'):
+                sweep = [(f'nprobe={p}', {'nprobe': p, 'ef_search': ef_searches[0]}) for p in nprobes]
+            elif index_type == 'hnsw':
+                sweep = [(f'efSearch={e}', {'nprobe': nprobes[0], 'ef_search': e}) for e in ef_searches]
+            else:
+                sweep = [('exact', None)]
+            for label, search_params in sweep:
+                if search_params:
+                    FaissIndex.apply_search_params(index, search_params)
+                latencies, found = [], []
+                for query in queries:
+                    start = time.perf_counter()
+                    _, ids = FaissIndex.search(index, query.reshape(1, -1), k)
+                    latencies.append(time.perf_counter() - start)
+                    found.append(ids[0])
+                found = np.array(found)
+                if truth is None:
+                    if index_type != 'flat':
+                        # The flat result of this metric is the ground truth
+                        exact = FaissIndex.create_index(dim, n, dict(params, type='flat'))
+                        exact.add_with_ids(FaissIndex.prepare(exact, corpus), np.arange(n, dtype='int64'))
+                        truth = FaissIndex.search(exact, queries, k)[1]
+                    else:
+                        truth = found
+                recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+                latencies = np.array(latencies) * 1000
+                print(f'{index_type:<10}{metric:<7}{label:<14}{build_seconds:>9.2f}{size_mb:>9.1f}'
+                      f'{np.percentile(latencies, 50):>9.3f}{np.percentile(latencies, 99):>9.3f}{recall:>8.3f}')
+
+if __name__ == '__main__':
+    main()
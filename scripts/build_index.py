@@ -0,0 +1,47 @@
+'''
+Building the faq index offline for read-only serving.
+
+Embeds data/faqs.csv when the index cache is stale (or always with --force),
+folds any faq edits still in the delta log into the csv and a fresh snapshot,
+and prints the manifest. Run it before starting workers with
+READ_ONLY_INDEX=true, which only ever memory-map these files.
+
+Usage:
+    python -m scripts.build_index
+    python -m scripts.build_index --force
+'''
+import argparse
+import json
+import os
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--force', action='store_true', help='rebuild even when the cache is fresh')
+    args = parser.parse_args()
+
+    # This process is the one that writes the files
+    os.environ['READ_ONLY_INDEX'] = 'false'
+    from sentence_transformers import SentenceTransformer
+    from src.processing.index_cache import IndexCache
+    from src.processing.knowledge_base import KnowledgeBase
+    from src.utils.config import config
+
+    start = time.perf_counter()
+    model = SentenceTransformer(config.EMBEDDING_MODEL)
+    index_cache = IndexCache(model)
+    if args.force:
+        index_cache.invalidate()
+    answer_store, index = index_cache.load_or_build()
+    knowledge_base = KnowledgeBase(model, index_cache, index, answer_store)
+    if knowledge_base._pending:
+        print(f'folding {knowledge_base._pending} faq edits from the delta log')
+        knowledge_base.compact()
+
+    with open(config.INDEX_MANIFEST_PATH) as file:
+        print(json.dumps(json.load(file), indent=2))
+    print(f'index ready in {time.perf_counter() - start:.1f}s: {config.INDEX_PATH}, {config.ANSWERS_PATH}, '
+          f'{config.EMBEDDINGS_PATH}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+'''
+Calibrating the direct-answer thresholds on paraphrased faq questions.
+
+data/faq_paraphrases.csv pairs customer-style rewordings with the faq they
+should be answered by. Rows with an empty faq_question are out of scope and
+must never be answered directly. The rows are split into a calibration half
+and a held-out half. A grid of (max_distance, min_margin) pairs is scored on
+the calibration half, and the pair with the highest hit rate whose precision
+is at least --min-precision is reported with its held-out hit rate, precision
+and wrong answers next to the values currently in config.yml.
+
+Here a hit means the question was answered from the faq without the llm. The
+answer is correct when that faq is the labelled one.
+
+Usage:
+    python -m scripts.calibrate_direct_answer
+    python -m scripts.calibrate_direct_answer --min-precision 0.99 --holdout 0.5 --seed 1
+'''
+import argparse
+import csv
+import random
+import time
+import numpy as np
+
+def score(cases, max_distance, min_margin):
+    answered = correct = 0
+    for case in cases:
+        if case['faq_id'] is not None and case['distance'] <= max_distance and case['margin'] >= min_margin:
+            answered += 1
+            correct += case['faq_id'] == case['expected']
+    return {
+        'hit_rate': answered / len(cases) if cases else 0.0,
+        'precision': correct / answered if answered else 1.0,
+        'wrong': answered - correct,
+        'answered': answered,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default='data/faq_paraphrases.csv')
+    parser.add_argument('--min-precision', type=float, default=0.98)
+    parser.add_argument('--holdout', type=float, default=0.5, help='share of rows kept out of calibration')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    from src.processing.index_cache import IndexCache
+    from src.rag.retriever import Retriever
+    from src.rag.semantic_cache import is_transactional
+    from src.utils.config import config
+
+    model = SentenceTransformer(config.EMBEDDING_MODEL)
+    answer_store, index = IndexCache(model).load_or_build()
+    retriever = Retriever(model, index, answer_store)
+    ids_by_question = {answer_store.question(faq_id): faq_id for faq_id in answer_store.live_ids()}
+
+    with open(args.data, newline='') as file:
+        rows = list(csv.DictReader(file))
+    cases, latencies = [], []
+    for row in rows:
+        # Transactional messages never take the direct path, same as Retriever.direct_answer
+        if is_transactional(row['message']):
+            continue
+        start = time.perf_counter()
+        faq_id, distance, margin = retriever.nearest(row['message'])
+        latencies.append(time.perf_counter() - start)
+        cases.append({
+            'message': row['message'],
+            'expected': ids_by_question.get(row['faq_question']) if row['faq_question'] else None,
+            'faq_id': faq_id,
+            'distance': distance,
+            'margin': margin,
+        })
+
+    random.Random(args.seed).shuffle(cases)
+    split = int(len(cases) * (1 - args.holdout))
+    calibration, held_out = cases[:split], cases[split:]
+
+    distances = sorted({round(c['distance'], 3) for c in calibration if c['faq_id'] is not None})
+    margins = [round(m, 3) for m in np.arange(0.0, 0.31, 0.01)]
+    best = None
+    for max_distance in distances:
+        for min_margin in margins:
+            result = score(calibration, max_distance, min_margin)
+            if result['precision'] < args.min_precision:
+                continue
+            key = (result['hit_rate'], min_margin, -max_distance)
+            if best is None or key > best[0]:
+                best = (key, max_distance, min_margin)
+
+    print(f'{len(rows)} paraphrases, {len(cases)} non-transactional: {len(calibration)} calibration, '
+          f'{len(held_out)} held out; nearest faq lookup {np.median(latencies) * 1000:.1f}ms median')
+    print(f'{"thresholds":<32}{"set":<12}{"hit rate":>9}{"precision":>11}{"wrong":>7}')
+    candidates = [('config.yml', config.DIRECT_ANSWER_MAX_DISTANCE, config.DIRECT_ANSWER_MIN_MARGIN)]
+    if best is not None:
+        candidates.append(('calibrated', best[1], best[2]))
+    else:
+        print(f'no thresholds reach precision {args.min_precision} on the calibration set')
+    for label, max_distance, min_margin in candidates:
+        for name, subset in (('calibration', calibration), ('held out', held_out)):
+            result = score(subset, max_distance, min_margin)
+            print(f'{label + f" ({max_distance:.3f}, {min_margin:.2f})":<32}{name:<12}{result["hit_rate"]:>9.1%}'
+                  f'{result["precision"]:>11.1%}{result["wrong"]:>7}')
+
+    if best is not None:
+        print(f'\ndirect_answer:\n  max_distance: {best[1]}\n  min_margin: {best[2]}')
+        for case in held_out:
+            if case['faq_id'] is not None and case['faq_id'] != case['expected'] \
+                    and case['distance'] <= best[1] and case['margin'] >= best[2]:
+                print(f'  wrong on held out: {case["message"]!r} -> {answer_store.question(case["faq_id"])!r}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+'''
+Checking that the agent's conversation context stays bounded in a long chat.
+
+Seeds a local SQLite stand-in for the chats table and plays --turns turns of
+one chat through ConversationMemory, printing the tokens of the history that
+goes into the prompt every --every turns. The count must level off at
+window_tokens + summary_tokens and stay there. The memory is then persisted,
+dropped and reloaded from chats.chatmemory, and the reloaded history must be
+identical.
+
+Then two instances, standing in for two workers, answer alternate turns of a
+second chat and persist each in turn. Neither may overwrite the other: a
+third instance must load every turn of both.
+
+By default the summaries come from a stand-in that keeps the tail of the old
+summary plus the new lines, so no API key is needed. Pass --llm to summarize
+with the configured OpenAI model instead.
+
+Usage:
+    python -m scripts.check_conversation_memory --turns 200 --every 20
+'''
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+class TailSummarizer:
+    '''Offline stand-in for the llm, the summary is the most recent text that fits'''
+    async def ainvoke(self, prompt):
+        summary = prompt.split('Current summary:\n', 1)[1].split('\n\nNew lines of conversation:', 1)[0]
+        lines = prompt.split('New lines of conversation:\n', 1)[1].split('\n\nWrite the updated summary', 1)[0]
+        return SimpleNamespace(content=f'{summary} {lines}'.replace('(empty)', '')[-2000:])
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--every', type=int, default=20, help='print every N turns')
+    parser.add_argument('--llm', action='store_true', help='summarize with the configured llm')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "memory.db")}'
+    from sqlalchemy import text
+    from src.utils.db import async_db_loader, async_engine
+    from src.utils.tokens import count_tokens
+    from src.tools.memory import ConversationMemory
+
+    async with async_db_loader() as session:
+        await session.execute(text('CREATE TABLE chats (chat_id TEXT PRIMARY KEY, user_id TEXT, chatmemory TEXT)'))
+        await session.execute(text("INSERT INTO chats VALUES ('chat-1', 'user-1', '')"))
+        await session.execute(text("INSERT INTO chats VALUES ('chat-2', 'user-1', '')"))
+        await session.commit()
+
+    if args.llm:
+        from src.model.load_models import ModelLoader
+        llm = ModelLoader().get_llm_model()
+    else:
+        llm = TailSummarizer()
+    memory = ConversationMemory(llm=llm, persist_seconds=3600)
+    budget = memory.window_tokens + memory.summary_tokens
+    # Formatting around the summary and the turns, on top of the two budgets
+    slack = 64
+
+    print(f'window {memory.window_tokens} + summary {memory.summary_tokens} tokens')
+    print(f'{"turn":>6}{"history tokens":>16}')
+    worst = 0
+    for turn in range(1, args.turns + 1):
+        question = f'Question {turn}: can I book an appointment on day {turn % 28 + 1} at {9 + turn % 8}:00?'
+        answer = f'Answer {turn}: ' + 'the slot is available and has been booked for you. ' * (1 + turn % 3)
+        await memory.add_turn('chat-1', question, answer)
+        # Let the background summary finish, as it would between two user messages
+        await asyncio.sleep(0)
+        while memory.chats.peek('chat-1')['summarizing']:
+            await asyncio.sleep(0.01)
+        tokens = count_tokens(await memory.history('chat-1'))
+        worst = max(worst, tokens)
+        if turn % args.every == 0:
+            print(f'{turn:>6}{tokens:>16}')
+
+    failures = 0
+    if worst > budget + slack:
+        failures += 1
+        print(f'FAIL history reached {worst} tokens, budget {budget}')
+
+    before = await memory.history('chat-1')
+    await memory.close()
+    reloaded = ConversationMemory(llm=llm, persist_seconds=3600)
+    if await reloaded.history('chat-1') != before:
+        failures += 1
+        print('FAIL history reloaded from chats.chatmemory differs')
+    await reloaded.close()
+
+    workers = [ConversationMemory(llm=llm, persist_seconds=3600) for _ in range(2)]
+    questions = [f'Question {turn}: is the office open on day {turn + 1}?' for turn in range(6)]
+    for turn, question in enumerate(questions):
+        worker = workers[turn % 2]
+        await worker.history('chat-2')
+        await worker.add_turn('chat-2', question, 'Answer: yes.')
+        await worker.persist()
+    for worker in workers:
+        await worker.close()
+    merged = ConversationMemory(llm=llm, persist_seconds=3600)
+    history = await merged.history('chat-2')
+    lost = [question for question in questions if question not in history]
+    if lost:
+        failures += 1
+        print(f'FAIL {len(lost)} of {len(questions)} turns answered by two workers were overwritten')
+    print(f'two workers, {len(questions)} alternate turns, {sum(w.stats()["conflicts"] for w in workers)} merges')
+    await merged.close()
+    await async_engine.dispose()
+
+    print(f'largest history {worst} tokens over {args.turns} turns')
+    print('bounded' if not failures else f'{failures} check(s) failed')
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    asyncio.run(main())
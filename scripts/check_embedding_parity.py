@@ -0,0 +1,82 @@
+'''
+Checking that the onnx embedding backend agrees with the torch one.
+
+Embeds the faq texts of the faqs csv and the messages of
+data/faq_paraphrases.csv with SentenceTransformer and with OnnxEmbedder, fp32
+and dynamic int8. For each onnx variant it reports:
+- the cosine between its vector and the torch vector of the same text, min
+  and mean over faqs and messages
+- top-k retrieval agreement: every message is searched against the faqs
+  embedded by the same backend, and the hits are compared with the torch
+  hits, top-1 agreement and overlap@k
+The script exits with 1 when a variant falls under --min-cosine or --min-top1
+(int8 is held to the looser --min-cosine-int8).
+
+Usage (full model environment):
+    python -m scripts.check_embedding_parity
+    python -m scripts.check_embedding_parity --k 3 --min-cosine 0.999 --min-top1 0.97
+'''
+import argparse
+import csv
+import sys
+import numpy as np
+
+def unit(vectors):
+    vectors = np.asarray(vectors, dtype='float32')
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+def top_k(corpus, queries, k):
+    '''Exact nearest faqs by cosine, the order an l2 search over unit vectors gives'''
+    return np.argsort(-(unit(queries) @ unit(corpus).T), axis=1, kind='stable')[:, :k]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--faqs', default=None, help='faqs csv, config faqs_path when omitted')
+    parser.add_argument('--paraphrases', default='data/faq_paraphrases.csv')
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--min-cosine', type=float, default=0.999)
+    parser.add_argument('--min-cosine-int8', type=float, default=0.98)
+    parser.add_argument('--min-top1', type=float, default=0.95)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    from src.model.onnx_embedder import OnnxEmbedder
+    from src.utils.config import config
+
+    with open(args.faqs or config.DATA_PATH, newline='', encoding='utf-8') as file:
+        faqs = [row['faqs'] for row in csv.DictReader(file)]
+    with open(args.paraphrases, newline='', encoding='utf-8') as file:
+        messages = [row['message'] for row in csv.DictReader(file)]
+    k = min(args.k, len(faqs))
+
+    reference = SentenceTransformer(config.EMBEDDING_MODEL, device='cpu')
+    torch_faqs, torch_messages = reference.encode(faqs), reference.encode(messages)
+    torch_hits = top_k(torch_faqs, torch_messages, k)
+
+    print(f'{len(faqs)} faqs, {len(messages)} messages, top-{k} against torch')
+    print(f'{"backend":<12}{"min cos":>10}{"mean cos":>10}{"top-1":>8}{f"overlap@{k}":>12}')
+    failed = []
+    for label, quantize, min_cosine in (('onnx', False, args.min_cosine), ('onnx-int8', True, args.min_cosine_int8)):
+        embedder = OnnxEmbedder(quantize=quantize)
+        onnx_faqs, onnx_messages = embedder.encode(faqs), embedder.encode(messages)
+        cosines = np.concatenate([
+            np.sum(unit(onnx_faqs) * unit(torch_faqs), axis=1),
+            np.sum(unit(onnx_messages) * unit(torch_messages), axis=1),
+        ])
+        hits = top_k(onnx_faqs, onnx_messages, k)
+        top1 = np.mean(hits[:, 0] == torch_hits[:, 0])
+        overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(hits, torch_hits)])
+        print(f'{label:<12}{cosines.min():>10.5f}{cosines.mean():>10.5f}{top1:>8.1%}{overlap:>12.1%}')
+        if cosines.min() < min_cosine or top1 < args.min_top1:
+            failed.append(label)
+            for position in np.where(hits[:, 0] != torch_hits[:, 0])[0][:5]:
+                print(f'  {messages[position]!r}: {faqs[hits[position, 0]][:60]!r} '
+                      f'instead of {faqs[torch_hits[position, 0]][:60]!r}')
+
+    if failed:
+        print(f'\nbelow the parity thresholds: {", ".join(failed)}')
+        sys.exit(1)
+    print('\nonnx backends agree with torch')
+
+if __name__ == '__main__':
+    main()
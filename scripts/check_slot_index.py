@@ -0,0 +1,130 @@
+'''
+Checking that the slot index stays consistent with the database under concurrency.
+
+Seeds a local SQLite stand-in for the appointments table. Several threads then
+book and cancel random slots the way AppointmentManager does: inside the slot
+lock, with a conditional UPDATE followed by a write-through to the index. Meanwhile another thread keeps reconciling the index. Once the writers
+stop, every day's free slots in the index must equal the database, without a
+final reconcile. A second phase changes the table behind the index's back,
+like another worker would, and checks that one reconcile picks the change up.
+Availability is then asked as of noon on a later day: the days before it must
+list nothing, whatever their slot times, and that day only its afternoon, as
+the available-slots SQL answers.
+The script also times an availability lookup in the index and in the
+database.
+
+Usage:
+    python -m scripts.check_slot_index --threads 8 --ops 300
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=300, help='book/cancel operations per thread')
+    parser.add_argument('--days', type=int, default=14)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "slots.db")}'
+    from sqlalchemy import text
+    from src.utils.db import db_loader
+    from src.tools.slot_index import SlotIndex, day_key
+
+    today = date.today()
+    days = [today + timedelta(days=d) for d in range(1, args.days + 1)]
+    times = [f'{h:02d}:{m:02d}' for h in range(9, 17) for m in (0, 30)]
+    with db_loader() as session:
+        session.execute(text('CREATE TABLE appointments (appoin_id INTEGER PRIMARY KEY, day TEXT, time TEXT, is_booked BOOLEAN)'))
+        session.execute(text('INSERT INTO appointments (day, time, is_booked) VALUES (:day, :time, 0)'),
+                        [{'day': day_key(d), 'time': t} for d in days for t in times])
+        session.commit()
+
+    index = SlotIndex(horizon_days=args.days + 1, reconcile_seconds=3600)
+    index.reconcile()
+    flip = text('UPDATE appointments SET is_booked = :booked WHERE day = :day AND time = :time AND is_booked = :was')
+
+    def database_calendar():
+        with db_loader() as session:
+            rows = session.execute(text('SELECT day, time FROM appointments WHERE is_booked = 0 ORDER BY day, time')).fetchall()
+        calendar = {}
+        for day, slot_time in rows:
+            calendar.setdefault(day, []).append(slot_time)
+        return sorted(calendar.items())
+
+    def writer(seed):
+        rng = random.Random(seed)
+        for _ in range(args.ops):
+            day, slot_time = day_key(rng.choice(days)), rng.choice(times)
+            booked = rng.random() < 0.5
+            with index.slot_locks.lock_slot(day, slot_time):
+                with db_loader() as session:
+                    changed = session.execute(flip, {'booked': booked, 'was': not booked, 'day': day, 'time': slot_time}).rowcount
+                    session.commit()
+                if changed:
+                    (index.mark_booked if booked else index.mark_free)(day, slot_time)
+
+    stop = threading.Event()
+    def reconciler():
+        while not stop.is_set():
+            index.reconcile()
+
+    start = time.perf_counter()
+    background = threading.Thread(target=reconciler)
+    background.start()
+    writers = [threading.Thread(target=writer, args=(seed,)) for seed in range(args.threads)]
+    for thread in writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    background.join()
+    elapsed = time.perf_counter() - start
+
+    failures = 0
+    if index.available(days) != database_calendar():
+        failures += 1
+        print('FAIL index diverged from the database after concurrent book/cancel')
+    print(f'{args.threads * args.ops} book/cancel operations with {index.reconciles} concurrent reconciles '
+          f'in {elapsed:.1f}s')
+
+    # Another worker books every slot of the first day without telling this index
+    with db_loader() as session:
+        session.execute(text('UPDATE appointments SET is_booked = 1 WHERE day = :day'), {'day': day_key(days[0])})
+        session.commit()
+    stale = index.available(days) != database_calendar()
+    index.reconcile()
+    if not stale or index.available(days) != database_calendar():
+        failures += 1
+        print('FAIL a reconcile did not pick up a change made outside this process')
+
+    # As of noon on the third day, the first two days are past and their afternoon slots too
+    now = datetime.combine(days[2], dt_time(12, 0))
+    expected = [(day, [t for t in slots if day > day_key(now) or (day == day_key(now) and t > '12:00')])
+                for day, slots in database_calendar() if day >= day_key(now)]
+    if index.available(days, now=now) != [(day, slots) for day, slots in expected if slots]:
+        failures += 1
+        print('FAIL slots of past days or of earlier today were listed as available')
+
+    lookups = 1000
+    start = time.perf_counter()
+    for _ in range(lookups):
+        index.available(days)
+    index_us = (time.perf_counter() - start) / lookups * 1e6
+    start = time.perf_counter()
+    for _ in range(lookups // 10):
+        database_calendar()
+    database_us = (time.perf_counter() - start) / (lookups // 10) * 1e6
+    print(f'availability over {len(days)} days: index {index_us:.0f}us, database {database_us:.0f}us')
+
+    print('consistent' if not failures else f'{failures} check(s) failed')
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
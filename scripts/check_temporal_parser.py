@@ -0,0 +1,50 @@
+'''
+Running the temporal parser over the table of cases in data/temporal_cases.csv.
+
+Every row holds a message, the reference date it is parsed against and the
+expected day, time and ambiguity flag. An empty day or time means none is
+expected. The script prints the rows that disagree and the parsing latency, and
+exits non-zero when any row fails, so it can gate a change to the rules.
+
+Usage:
+    python -m scripts.check_temporal_parser
+    python -m scripts.check_temporal_parser --data my_cases.csv
+'''
+import argparse
+import csv
+import sys
+import time
+from datetime import date
+from src.tools.temporal import TemporalParser
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default='data/temporal_cases.csv')
+    args = parser.parse_args()
+
+    with open(args.data, newline='') as file:
+        cases = list(csv.DictReader(file))
+
+    temporal = TemporalParser()
+    failures = 0
+    elapsed = 0.0
+    for case in cases:
+        today = date.fromisoformat(case['today'])
+        start = time.perf_counter()
+        parsed = temporal.parse(case['text'], today=today)
+        elapsed += time.perf_counter() - start
+        expected = {
+            'day': case['day'] or None,
+            'time': case['time'] or None,
+            'ambiguous': case['ambiguous'].strip().lower() == 'true',
+        }
+        if parsed != expected:
+            failures += 1
+            print(f'FAIL {case["text"]!r} (today {today})\n     expected {expected}\n     got      {parsed}')
+
+    print(f'{len(cases) - failures}/{len(cases)} cases pass, '
+          f'{elapsed / max(len(cases), 1) * 1e6:.0f}us per message')
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
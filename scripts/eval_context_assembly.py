@@ -0,0 +1,74 @@
+'''
+Comparing the context tokens of the fixed top 3 with the assembled context.
+
+Loads the embedding model, the faq index and the knowledge base the way the
+app does, then runs every faq question (or the messages of --data) through
+both the previous Retriever.retriever top-3 join and ContextAssembler. For
+each it reports the context tokens, how often the faq the question came from
+is still in the context, and how many hits were dropped by the distance gap,
+as near duplicates or by the token budget.
+No llm is called.
+
+Usage:
+    python -m scripts.eval_context_assembly
+    python -m scripts.eval_context_assembly --gap 0.2 --max-tokens 300 --data data/intent_eval.csv
+'''
+import argparse
+import csv
+import statistics
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=None, help='csv with a message column, faq questions by default')
+    parser.add_argument('--gap', type=float, default=None)
+    parser.add_argument('--duplicate-similarity', type=float, default=None)
+    parser.add_argument('--max-tokens', type=int, default=None)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    from src.processing.index_cache import IndexCache
+    from src.processing.knowledge_base import KnowledgeBase
+    from src.rag.retriever import Retriever
+    from src.rag.context_assembler import ContextAssembler
+    from src.tools.router import IntentRouter
+    from src.utils.config import config
+    from src.utils.tokens import count_tokens
+
+    model = SentenceTransformer(config.EMBEDDING_MODEL)
+    index_cache = IndexCache(model)
+    answer_store, index = index_cache.load_or_build()
+    knowledge_base = KnowledgeBase(model, index_cache, index, answer_store)
+    retriever = Retriever(model, index, answer_store, lock=knowledge_base.lock)
+    assembler = ContextAssembler(retriever, vector_lookup=knowledge_base.get_vector,
+                                 intent_router=IntentRouter(model), gap=args.gap,
+                                 duplicate_similarity=args.duplicate_similarity, max_tokens=args.max_tokens)
+
+    if args.data:
+        with open(args.data, newline='') as file:
+            cases = [(row['message'], None) for row in csv.DictReader(file)]
+    else:
+        cases = [(answer_store.question(faq_id), answer_store.answer(faq_id)) for faq_id in answer_store.live_ids()]
+
+    fixed, assembled, fixed_found, assembled_found = [], [], 0, 0
+    for message, source in cases:
+        top3 = retriever.retriever(message)
+        context = assembler.assemble(message)
+        fixed.append(count_tokens(top3))
+        assembled.append(count_tokens(context))
+        if source is not None:
+            fixed_found += source in top3
+            assembled_found += source in context
+
+    stats = assembler.stats()
+    print(f'{len(cases)} messages (max_k {assembler.max_k}, gap {assembler.gap}, '
+          f'duplicates >= {assembler.duplicate_similarity}, budget {assembler.max_tokens} tokens)')
+    print(f'{"context":<12}{"mean tokens":>12}{"p95":>8}{"max":>8}{"source kept":>13}')
+    for label, tokens, found in (('top 3', fixed, fixed_found), ('assembled', assembled, assembled_found)):
+        p95 = sorted(tokens)[max(0, int(len(tokens) * 0.95) - 1)]
+        kept = f'{found}/{len(cases)}' if not args.data else '-'
+        print(f'{label:<12}{statistics.mean(tokens):>12.1f}{p95:>8}{max(tokens):>8}{kept:>13}')
+    print(f'hits kept {stats["hits_kept"]}, dropped {stats["hits_dropped"]}, '
+          f'{1 - sum(assembled) / max(sum(fixed), 1):.0%} fewer context tokens')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+'''
+Evaluating the intent router on the labelled messages in data/intent_eval.csv.
+
+Reports accuracy, per-intent precision and recall, every misrouted message and
+the routing latency. The number that matters most is the count of non-social
+messages the router answered, because those users never reach the agent. With
+--agent N, the first N social messages also go through the ReAct agent (the
+old path) so that both latencies can be compared. That needs the full app
+environment: OPENAI_API_KEY and the database settings.
+
+Usage:
+    python -m scripts.eval_intent_router
+    python -m scripts.eval_intent_router --threshold 0.7 --margin 0.05 --agent 5
+'''
+import argparse
+import csv
+import time
+import numpy as np
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default='data/intent_eval.csv')
+    parser.add_argument('--threshold', type=float, default=None)
+    parser.add_argument('--margin', type=float, default=None)
+    parser.add_argument('--agent', type=int, default=0, help='social messages to also time through the agent')
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    from src.tools.router import IntentRouter, SOCIAL_INTENTS
+    from src.utils.config import config
+
+    with open(args.data, newline='') as file:
+        rows = list(csv.DictReader(file))
+
+    start = time.perf_counter()
+    model = SentenceTransformer(config.EMBEDDING_MODEL)
+    router = IntentRouter(model, threshold=args.threshold, margin=args.margin)
+    print(f'model + prototypes loaded in {time.perf_counter() - start:.2f}s '
+          f'(threshold {router.threshold}, margin {router.margin})')
+
+    router.route('warm up')
+    latencies, predictions = [], []
+    for row in rows:
+        start = time.perf_counter()
+        predictions.append(router.route(row['message']) or 'other')
+        latencies.append(time.perf_counter() - start)
+
+    labels = [row['intent'] for row in rows]
+    correct = sum(p == l for p, l in zip(predictions, labels))
+    print(f'\naccuracy {correct}/{len(rows)} = {correct / len(rows):.1%}')
+    print(f'{"intent":<10}{"precision":>10}{"recall":>8}{"support":>9}')
+    for intent in (*SOCIAL_INTENTS, 'other'):
+        predicted = sum(p == intent for p in predictions)
+        actual = sum(l == intent for l in labels)
+        hits = sum(p == l == intent for p, l in zip(predictions, labels))
+        precision = hits / predicted if predicted else 0.0
+        recall = hits / actual if actual else 0.0
+        print(f'{intent:<10}{precision:>10.2f}{recall:>8.2f}{actual:>9}')
+
+    wrongly_routed = [(r['message'], p) for r, p, l in zip(rows, predictions, labels) if l == 'other' and p != 'other']
+    missed = [(r['message'], l) for r, p, l in zip(rows, predictions, labels) if l != 'other' and p != l]
+    print(f'\nnon-social messages answered by the router: {len(wrongly_routed)}')
+    for message, intent in wrongly_routed:
+        print(f'  {message!r} -> {intent}')
+    print(f'social messages sent to the agent or misclassified: {len(missed)}')
+    for message, intent in missed:
+        print(f'  {message!r} (expected {intent})')
+
+    print(f'\nrouter latency  p50 {percentile(latencies, 50):.2f}ms  p95 {percentile(latencies, 95):.2f}ms')
+
+    if args.agent:
+        from src.api.app2 import chatbot_api
+        social = [row['message'] for row in rows if row['intent'] in SOCIAL_INTENTS][:args.agent]
+        agent_latencies = []
+        for message in social:
+            start = time.perf_counter()
+            chatbot_api.agent_executor.invoke({'input': message})
+            agent_latencies.append(time.perf_counter() - start)
+        print(f'agent latency   p50 {percentile(agent_latencies, 50):.0f}ms  '
+              f'p95 {percentile(agent_latencies, 95):.0f}ms  ({len(social)} social messages)')
+
+if __name__ == '__main__':
+    main()
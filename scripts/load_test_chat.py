@@ -0,0 +1,156 @@
+'''
+Pool usage of the chat path as concurrency grows, old session handling vs new.
+
+Seeds a local SQLite stand-in for the chats and messages tables and fires
+batches of concurrent chat requests at increasing concurrency. The agent is
+replaced by a sleep of --agent-seconds, which is the part that matters here:
+- old: one session opened before the chat check and kept through the agent
+  call, messages inserted and committed at the end, as the route used to do
+- new: the chat check of the routes (ChatOwnership.ensure), no connection
+  during the agent call, both messages handed to MessageWriter. Each chat
+  is checked against the database once, its later messages hit the
+  ownership cache
+
+For each run the script reports the peak number of checked-out connections,
+how many are checked out half-way through the agent calls, the request
+latency and how many requests failed. The old path holds one connection per
+chat up to the pool limit (pool_size + max_overflow = 15) and then queues
+behind it, the new one holds none while the agent runs and its latency stays
+at the agent's. Both see the same short burst of chat checks when every
+request arrives at once. SQLite serialises writers, so the old path also fails
+with "database is locked" where PostgreSQL would only queue. Every message of
+the new path must end up in the table.
+
+Usage:
+    python -m scripts.load_test_chat --levels 5 15 30 60 --agent-seconds 0.5
+'''
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+CHECK_CHAT = 'SELECT chat_id FROM chats WHERE chat_id = :chat_id AND user_id = :user_id'
+INSERT_MESSAGE = '''
+    INSERT INTO messages (chat_id, message_text, message_type, timestamp)
+    VALUES (:chat_id, :message_text, :message_type, CURRENT_TIMESTAMP)
+'''
+
+class PoolWatcher:
+    def __init__(self, engine, event):
+        self.checked_out = 0
+        self.peak = 0
+        self.checkouts = 0
+        event.listen(engine.sync_engine.pool, 'checkout', self._checkout)
+        event.listen(engine.sync_engine.pool, 'checkin', self._checkin)
+
+    def _checkout(self, *args):
+        self.checked_out += 1
+        self.checkouts += 1
+        self.peak = max(self.peak, self.checked_out)
+
+    def _checkin(self, *args):
+        self.checked_out -= 1
+
+    def reset(self):
+        self.peak = self.checked_out
+
+async def old_chat(async_db_loader, text, user_id, chat_id, question, agent_seconds):
+    '''The chat route as it was: one session across the agent call'''
+    async with async_db_loader() as session:
+        if not (await session.execute(text(CHECK_CHAT), {'chat_id': chat_id, 'user_id': user_id})).fetchone():
+            raise LookupError(chat_id)
+        await session.execute(text(INSERT_MESSAGE), {'chat_id': chat_id, 'message_text': question, 'message_type': 'sent'})
+        await asyncio.sleep(agent_seconds)
+        await session.execute(text(INSERT_MESSAGE), {'chat_id': chat_id, 'message_text': 'answer', 'message_type': 'received'})
+        await session.commit()
+
+async def new_chat(ownership, writer, user_id, chat_id, question, agent_seconds):
+    '''The chat route now: the route's own chat check, nothing held while the agent runs'''
+    await ownership.ensure(user_id, chat_id)
+    await asyncio.sleep(agent_seconds)
+    writer.write((chat_id, question, 'sent'), (chat_id, 'answer', 'received'))
+
+async def run(label, chat, concurrency, watcher, agent_seconds):
+    async def timed(n):
+        start = time.perf_counter()
+        try:
+            await chat(f'user-{n}', f'chat-{n}', f'question {n}')
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    async def sample(delay):
+        # Mid-way through the agent calls, after the burst of chat checks
+        await asyncio.sleep(delay)
+        return watcher.checked_out
+
+    watcher.reset()
+    held, *results = await asyncio.gather(sample(agent_seconds / 2),
+                                          *(timed(n) for n in range(concurrency)))
+    latencies = sorted(latency for latency, _ in results)
+    failed = sum(1 for _, error in results if error is not None)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f'{label:<6}{concurrency:>12}{watcher.peak:>12}{held:>14}{p95 * 1000:>10.0f}{statistics.mean(latencies) * 1000:>10.0f}{failed:>8}')
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--levels', type=int, nargs='+', default=[5, 15, 30, 60], help='concurrent chats per run')
+    parser.add_argument('--agent-seconds', type=float, default=0.5, help='simulated agent latency')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(tempfile.mkdtemp(), "chat.db")}'
+    from fastapi import HTTPException
+    from sqlalchemy import event, text
+    from src.utils.chat_ownership import ChatOwnership
+    from src.utils.db import async_db_loader, async_engine
+    from src.utils.message_writer import MessageWriter
+
+    async with async_db_loader() as session:
+        await session.execute(text('CREATE TABLE chats (chat_id TEXT PRIMARY KEY, user_id TEXT)'))
+        await session.execute(text('''
+            CREATE TABLE messages (message_id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id TEXT,
+                                   message_text TEXT, message_type TEXT, timestamp TIMESTAMP)
+        '''))
+        await session.execute(text('INSERT INTO chats (chat_id, user_id) VALUES (:chat_id, :user_id)'),
+                              [{'chat_id': f'chat-{n}', 'user_id': f'user-{n}'} for n in range(max(args.levels))])
+        await session.commit()
+
+    watcher = PoolWatcher(async_engine, event)
+    writer = MessageWriter()
+    ownership = ChatOwnership()
+    # The check the routes run must accept the owner and refuse anyone else
+    await ownership.ensure('user-0', 'chat-0')
+    try:
+        await ownership.ensure('user-1', 'chat-0')
+        raise SystemExit('chat check accepted a chat of another user')
+    except HTTPException as e:
+        assert e.status_code == 404, e.status_code
+    # The owner's next message is answered from the ownership cache, without a connection
+    checkouts = watcher.checkouts
+    await ownership.ensure('user-0', 'chat-0')
+    assert ownership.stats()['hits'] == 1 and watcher.checkouts == checkouts, ownership.stats()
+    print(f'simulated agent call {args.agent_seconds * 1000:.0f}ms, pool 5 + 10 overflow')
+    print(f'{"path":<6}{"concurrency":>12}{"peak conns":>12}{"during agent":>14}{"p95 ms":>10}{"mean ms":>10}{"failed":>8}')
+    for concurrency in args.levels:
+        await run('old', lambda u, c, q: old_chat(async_db_loader, text, u, c, q, args.agent_seconds),
+                  concurrency, watcher, args.agent_seconds)
+
+    async with async_db_loader() as session:
+        await session.execute(text('DELETE FROM messages'))
+        await session.commit()
+    for concurrency in args.levels:
+        await run('new', lambda u, c, q: new_chat(ownership, writer, u, c, q, args.agent_seconds),
+                  concurrency, watcher, args.agent_seconds)
+    await writer.close()
+
+    async with async_db_loader() as session:
+        stored = (await session.execute(text('SELECT count(*) FROM messages'))).scalar()
+    expected = 2 * sum(args.levels)
+    stats = writer.stats()
+    print(f'new path messages stored {stored}/{expected}, writer used {stats["batches"]} INSERTs for {stats["rows"]} rows')
+    await async_engine.dispose()
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,185 @@
+'''
+Measuring the memory of N gunicorn workers, private loading vs shared serving.
+
+Starts the app twice with --workers workers:
+- before: no preload, every worker imports the app and loads the models and
+  the index into its own memory
+- after: preload in the master (gunicorn.conf.py) and READ_ONLY_INDEX=true,
+  so the index and answer texts are memory-mapped read-only
+Once every worker answers /health, the script reads Rss and Pss from
+/proc/<pid>/smaps_rollup of the master and each worker. Pss splits shared
+pages between the processes that map them, so the Pss total is the real cost
+of the deployment. Linux only.
+
+Build the index first (python -m scripts.build_index), the read-only run
+refuses to start without it.
+
+--index-only skips gunicorn and the models: it forks --workers processes that
+each load only the faiss index through FaissIndex.load_index, privately and
+then read-only, and search it so every vector page is touched. It runs
+without the app environment, on the built index or, with --n, on a synthetic
+flat index of n MiniLM-sized vectors.
+
+Usage (full app environment):
+    python -m scripts.measure_worker_memory --workers 4
+Usage (index only):
+    python -m scripts.measure_worker_memory --index-only --workers 4 --n 200000
+'''
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+def memory(pid):
+    '''Rss and Pss of a process in MB'''
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as file:
+        for line in file:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                values[key] = int(rest.split()[0]) / 1024
+    return values['Rss'], values['Pss']
+
+def children(pid):
+    found = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as file:
+                # The command name may contain spaces, fields after it are fixed
+                ppid = int(file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            found.append(int(entry))
+    return sorted(found)
+
+def healthy(port):
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=2) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+def run(label, workers, port, env, timeout, settle):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port), **env)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'src.api.app2:app'],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + timeout
+        while len(children(server.pid)) < workers or not healthy(port):
+            if server.poll() is not None:
+                raise RuntimeError(f'{label}: gunicorn exited with {server.returncode}')
+            if time.monotonic() > deadline:
+                raise RuntimeError(f'{label}: workers not ready after {timeout}s')
+            time.sleep(1)
+        # Every worker has to serve a few requests before its memory settles
+        for _ in range(workers * 5):
+            healthy(port)
+        time.sleep(settle)
+
+        rows = [('master', server.pid, *memory(server.pid))]
+        rows += [(f'worker {n}', pid, *memory(pid)) for n, pid in enumerate(children(server.pid), 1)]
+        print(f'\n{label}')
+        print(f'{"process":<12}{"pid":>8}{"rss MB":>10}{"pss MB":>10}')
+        for name, pid, rss, pss in rows:
+            print(f'{name:<12}{pid:>8}{rss:>10.0f}{pss:>10.0f}')
+        rss_total, pss_total = sum(r[2] for r in rows), sum(r[3] for r in rows)
+        print(f'{"total":<12}{"":>8}{rss_total:>10.0f}{pss_total:>10.0f}')
+        return pss_total
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+def index_worker(index_path, read_only, ready, stop):
+    import numpy as np
+    from src.processing.data_index import FaissIndex
+    loader = FaissIndex()
+    loader.index_path = index_path
+    index = loader.load_index(read_only=read_only)
+    # A flat search reads every stored vector, like the first minutes of traffic
+    queries = np.random.default_rng(0).standard_normal((8, index.d)).astype('float32')
+    FaissIndex.search(index, queries, 10)
+    os.write(ready, b'1')
+    os.read(stop, 1)
+    os._exit(0)
+
+def run_index_only(label, workers, index_path, read_only, settle):
+    ready_r, ready_w = os.pipe()
+    stop_r, stop_w = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            index_worker(index_path, read_only, ready_w, stop_r)
+        pids.append(pid)
+    try:
+        for _ in range(workers):
+            os.read(ready_r, 1)
+        time.sleep(settle)
+        rows = [(f'worker {n}', pid, *memory(pid)) for n, pid in enumerate(pids, 1)]
+        print(f'\n{label}')
+        print(f'{"process":<12}{"pid":>8}{"rss MB":>10}{"pss MB":>10}')
+        for name, pid, rss, pss in rows:
+            print(f'{name:<12}{pid:>8}{rss:>10.0f}{pss:>10.0f}')
+        pss_total = sum(r[3] for r in rows)
+        print(f'{"total":<12}{"":>8}{sum(r[2] for r in rows):>10.0f}{pss_total:>10.0f}')
+        return pss_total
+    finally:
+        os.write(stop_w, b'1' * workers)
+        for pid in pids:
+            os.waitpid(pid, 0)
+
+def index_only(args):
+    from src.processing.data_index import FaissIndex
+    from src.utils.config import config
+    index_path = config.INDEX_PATH
+    if args.n:
+        import tempfile
+        import numpy as np
+        index_path = os.path.join(tempfile.mkdtemp(), 'index.bin')
+        vectors = np.random.default_rng(0).standard_normal((args.n, args.dim)).astype('float32')
+        index = FaissIndex.create_index(args.dim, args.n, dict(FaissIndex.index_params(), type='flat'))
+        index.add_with_ids(vectors, np.arange(args.n, dtype='int64'))
+        del vectors
+        import faiss
+        faiss.write_index(index, index_path)
+        del index
+    size = os.path.getsize(index_path) / 2 ** 20
+    print(f'index {index_path}: {size:.0f} MB on disk, {args.workers} workers')
+    before = run_index_only('before: private index', args.workers, index_path, False, args.settle)
+    after = run_index_only('after: read-only mmap index', args.workers, index_path, True, args.settle)
+    print(f'\nPss total for {args.workers} workers: {before:.0f} MB -> {after:.0f} MB '
+          f'({1 - after / before:.0%} less)')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--timeout', type=int, default=300, help='seconds to wait for the workers')
+    parser.add_argument('--settle', type=float, default=5.0)
+    parser.add_argument('--index-only', action='store_true', help='fork index-only workers, no gunicorn or models')
+    parser.add_argument('--n', type=int, default=None, help='synthetic flat index size for --index-only')
+    parser.add_argument('--dim', type=int, default=384)
+    args = parser.parse_args()
+
+    if args.index_only:
+        index_only(args)
+        return
+
+    before = run('before: no preload, private index', args.workers, args.port,
+                 {'PRELOAD_APP': 'false', 'READ_ONLY_INDEX': 'false'}, args.timeout, args.settle)
+    after = run('after: preload, read-only mmap index', args.workers, args.port,
+                {'PRELOAD_APP': 'true', 'READ_ONLY_INDEX': 'true'}, args.timeout, args.settle)
+    print(f'\nPss total for {args.workers} workers: {before:.0f} MB -> {after:.0f} MB '
+          f'({1 - after / before:.0%} less)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+'''
+Profiling the cold start of the app: import time per package and init time per component.
+
+Runs a fresh interpreter with -X importtime that imports src.api.app2 (which
+builds the whole app), runs the warm-up synchronously and prints the
+StartupProfile. The importtime log is folded into the cumulative import time
+of each top-level package, so a new heavy import shows up by name.
+
+--save writes the result as json, --baseline compares against a saved run and
+exits with 1 when any phase or package got slower by more than --tolerance.
+
+Usage (full app environment):
+    python -m scripts.profile_startup
+    python -m scripts.profile_startup --save startup.json
+    python -m scripts.profile_startup --baseline startup.json --tolerance 0.2
+'''
+import argparse
+import json
+import subprocess
+import sys
+
+CHILD = '''
+import json
+from src.api.app2 import chatbot_api
+chatbot_api.warm_up()
+print("PROFILE " + json.dumps(chatbot_api.startup.as_dict()))
+'''
+
+def import_times(stderr):
+    '''Cumulative import seconds of each top-level package, from the -X importtime log'''
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        # Nested imports are indented, only top-level entries are summed
+        if name[1:].startswith(' '):
+            continue
+        top = name.strip().split('.')[0]
+        packages[top] = packages.get(top, 0.0) + int(cumulative) / 1e6
+    return packages
+
+def profile():
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], capture_output=True, text=True)
+    lines = [line for line in result.stdout.splitlines() if line.startswith('PROFILE ')]
+    if result.returncode or not lines:
+        sys.stderr.write(result.stderr[-4000:])
+        raise RuntimeError(f'App start failed with exit code {result.returncode}')
+    startup = json.loads(lines[-1][len('PROFILE '):])
+    return {'phases': startup['phases'], 'total': startup['total'], 'imports': import_times(result.stderr)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=15, help='packages to list')
+    parser.add_argument('--save', default=None, help='write the profile to this json file')
+    parser.add_argument('--baseline', default=None, help='json profile to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown before failing')
+    parser.add_argument('--min-seconds', type=float, default=0.05, help='ignore changes below this')
+    args = parser.parse_args()
+
+    result = profile()
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    def row(name, seconds, before):
+        change = f'{seconds - before:>+10.3f}' if before is not None else ''
+        print(f'{name:<28}{seconds:>10.3f}{change}')
+
+    print(f'{"init phase":<28}{"seconds":>10}{"change" if baseline else "":>10}')
+    for name, seconds in result['phases'].items():
+        row(name, seconds, baseline['phases'].get(name) if baseline else None)
+    row('total', result['total'], baseline['total'] if baseline else None)
+
+    print(f'\n{"package (cumulative import)":<28}{"seconds":>10}{"change" if baseline else "":>10}')
+    for name, seconds in sorted(result['imports'].items(), key=lambda item: -item[1])[:args.top]:
+        row(name, seconds, baseline['imports'].get(name) if baseline else None)
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(result, file, indent=2)
+    if baseline:
+        regressions = []
+        for section in ('phases', 'imports'):
+            for name, seconds in result[section].items():
+                before = baseline[section].get(name, 0.0)
+                if seconds - before > max(args.min_seconds, before * args.tolerance):
+                    regressions.append(f'{name} {before:.3f}s -> {seconds:.3f}s')
+        if regressions:
+            print('\nslower than the baseline: ' + ', '.join(regressions))
+            sys.exit(1)
+        print('\nno regression against the baseline')
+
+if __name__ == '__main__':
+    main()
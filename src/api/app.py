@@ -2,9 +2,7 @@ from fastapi import FastAPI, HTTPException
 from src.rag.retriever import Retriever
 from src.rag.answer_generator import AnswerGenerator
 from src.tools.agent import LumiAgent
-from src.processing.data_loader import DataLoader
-from src.processing.data_embedder import DataEmbedder
-from src.processing.data_index import FaissIndex
+from src.processing.index_cache import IndexCache
 from src.utils.logger import app_logger
 from src.model.load_models import ModelLoader
 from src.tools.manager import AppointmentManager
@@ -24,21 +22,20 @@ class ChatbotAPI:
 
         #Process data
         app_logger.info('Processing data...')
-        self.df = DataLoader().load_data()
-        self.embed_df = DataEmbedder(self.embedding_model,self.df).embed_data()
-        self.index = FaissIndex(self.df).data_index()
+        index_cache = IndexCache(self.embedding_model)
+        self.answer_store, self.index = index_cache.load_or_build()
+        self.vectors = index_cache.vectors
         app_logger.info('Data processing completed successfully')
 
         #Initialize RAG components
         app_logger.info('Initializing RAG components...')
-        self.retriver = Retriever(self.embedding_model,self.index,self.df)
+        self.retriver = Retriever(self.embedding_model,self.index,self.answer_store)
         self.answer_generator = AnswerGenerator(self.llm_model, self.retriver)
         app_logger.info('RAG components initialized successfully')
         
         #Initialize Manager
         app_logger.info('Initializing Manager...')
         self.manager = AppointmentManager(llm=self.llm_model)
-        self.answer_generator = AnswerGenerator(self.llm_model, self.retriver)
         app_logger.info('Manager initialized successfully')
         #Initialize Agent
         app_logger.info('Initializing Agent...')
@@ -1,35 +1,117 @@
-from fastapi import FastAPI, HTTPException, Response, Request
+import time
+# Start of the import phase in the startup profile
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Response, Request, Header, Depends, Query as QueryParam
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware  
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse 
+from fastapi.responses import FileResponse, StreamingResponse
 from src.rag.retriever import Retriever
 from src.rag.answer_generator import AnswerGenerator
-from src.tools.agent import LumiAgent
-from src.processing.data_loader import DataLoader
-from src.processing.data_embedder import DataEmbedder
-from src.processing.data_index import FaissIndex
+from src.rag.context_assembler import ContextAssembler, track_context_tokens
+from src.tools.agent import LumiAgent, agent_context
+from src.tools.router import IntentRouter
+from src.tools.memory import ConversationMemory
+from src.processing.index_cache import IndexCache
+from src.processing.knowledge_base import KnowledgeBase
+from src.rag.semantic_cache import SemanticCache
 from src.utils.logger import app_logger
 from src.model.load_models import ModelLoader
+from src.model.registry import model_registry
+from src.model.query_embedder import QueryEmbedder
 from src.tools.manager import AppointmentManager
-from src.utils.setting import Query
-from src.utils.db import db_loader
+from src.tools.slot_index import SlotIndex
+from src.utils.setting import Query, FaqEntry
+from src.utils.config import config
+from src.utils.db import async_db_loader, async_engine, ensure_schema, pool_stats
+from src.utils.message_writer import MessageWriter
+from src.utils.chat_ownership import ChatOwnership
+from src.utils.startup import StartupProfile
+from src.utils.tokens import count_tokens
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 from sqlalchemy.sql import text
 from pathlib import Path
+import asyncio
+import hmac
+import json
 import uuid
 
+# Chat history pages, message_id orders the rows and serves as the cursor
+LATEST_MESSAGES_SQL = text("""
+    SELECT message_id, message_text, message_type, timestamp
+    FROM messages
+    WHERE chat_id = :chat_id
+    ORDER BY message_id DESC
+    LIMIT :limit
+""")
+
+MESSAGES_BEFORE_SQL = text("""
+    SELECT message_id, message_text, message_type, timestamp
+    FROM messages
+    WHERE chat_id = :chat_id AND message_id < :before
+    ORDER BY message_id DESC
+    LIMIT :limit
+""")
+
+MESSAGES_SINCE_SQL = text("""
+    SELECT message_id, message_text, message_type, timestamp
+    FROM messages
+    WHERE chat_id = :chat_id AND message_id > :since
+    ORDER BY message_id
+    LIMIT :limit
+""")
+
+EXPORT_MESSAGES_SQL = text("""
+    SELECT message_id, message_text, message_type, timestamp
+    FROM messages
+    WHERE chat_id = :chat_id
+    ORDER BY message_id
+""")
+
+# Bootstrap, the upsert takes the user's row lock so concurrent first visits
+# of one user wait here instead of each creating a chat
+UPSERT_USER_SQL = text("""
+    INSERT INTO users (user_id) VALUES (:user_id)
+    ON CONFLICT (user_id) DO UPDATE SET user_id = EXCLUDED.user_id
+""")
+
+FETCH_OR_CREATE_CHAT_SQL = text("""
+    WITH existing AS (
+        SELECT chat_id FROM chats WHERE user_id = :user_id LIMIT 1
+    ), created AS (
+        INSERT INTO chats (chat_id, user_id, chatmemory)
+        SELECT :chat_id, :user_id, '' WHERE NOT EXISTS (SELECT 1 FROM existing)
+        RETURNING chat_id
+    )
+    SELECT chat_id FROM existing
+    UNION ALL
+    SELECT chat_id FROM created
+""")
+
+def sse_event(event, data):
+    '''Formatting one Server-Sent Events message'''
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 class ChatbotAPI:
     def __init__(self):
         '''Initialize the chatbot API components'''
         app_logger.info('Starting the app initialization...')
+        self.startup = StartupProfile(started=IMPORT_STARTED)
+        self.startup.mark('imports')
+        # Flipped as each part is loaded, /ready answers 200 once all are
+        self.readiness = {'models': False, 'index': False, 'warm': False}
 
         # Initialize models
         app_logger.info('Initializing models...')
         try:
             self.model_loader = ModelLoader()
             self.embedding_model = self.model_loader.embedding_model
+            self.query_embedder = QueryEmbedder(self.embedding_model)
             self.llm_model = self.model_loader.get_llm_model()
+            self.startup.mark('models')
+            self.readiness['models'] = True
             app_logger.info('Models initialized successfully')
         except Exception as e:
             app_logger.error(f'Failed to initialize models: {str(e)}')
@@ -38,9 +120,12 @@ class ChatbotAPI:
         # Process data
         app_logger.info('Processing data...')
         try:
-            self.df = DataLoader().load_data()
-            self.embed_df = DataEmbedder(self.embedding_model, self.df).embed_data()
-            self.index = FaissIndex(self.df).data_index()
+            index_cache = IndexCache(self.embedding_model)
+            self.answer_store, self.index = index_cache.load_or_build()
+            self.knowledge_base = KnowledgeBase(self.embedding_model, index_cache, self.index, self.answer_store,
+                                                workers=config.WEB_CONCURRENCY)
+            self.startup.mark('index')
+            self.readiness['index'] = True
             app_logger.info('Data processing completed successfully')
         except Exception as e:
             app_logger.error(f'Failed to process data: {str(e)}')
@@ -49,8 +134,16 @@ class ChatbotAPI:
         # Initialize RAG components
         app_logger.info('Initializing RAG components...')
         try:
-            self.retriever = Retriever(self.embedding_model, self.index, self.df)
-            self.answer_generator = AnswerGenerator(self.llm_model, self.retriever)
+            self.retriever = Retriever(self.query_embedder, self.index, self.answer_store,
+                                       lock=self.knowledge_base.lock)
+            self.semantic_cache = SemanticCache(self.query_embedder, self.knowledge_base)
+            self.intent_router = IntentRouter(self.query_embedder)
+            self.context_assembler = ContextAssembler(self.retriever,
+                                                      vector_lookup=self.knowledge_base.get_vector,
+                                                      intent_router=self.intent_router)
+            self.answer_generator = AnswerGenerator(self.llm_model, self.retriever,
+                                                    context_assembler=self.context_assembler)
+            self.startup.mark('rag')
             app_logger.info('RAG components initialized successfully')
         except Exception as e:
             app_logger.error(f'Failed to initialize RAG components: {str(e)}')
@@ -59,13 +152,19 @@ class ChatbotAPI:
         # Initialize Manager
         app_logger.info('Initializing Manager...')
         try:
-            self.manager = AppointmentManager(llm=self.llm_model)
+            ensure_schema()
+            self.slot_index = SlotIndex() if config.SLOT_INDEX_ENABLED else None
+            self.manager = AppointmentManager(llm=self.llm_model, slot_index=self.slot_index)
+            self.startup.mark('manager')
             app_logger.info('Manager initialized successfully')
         except Exception as e:
             app_logger.error(f'Failed to initialize Manager: {str(e)}')
             raise
 
-        self.chat_memories = {}
+        self.memory = ConversationMemory(llm=self.llm_model)
+        self.message_writer = MessageWriter()
+        # Checks chats against their user, (user_id, chat_id) pairs already checked are cached
+        self.chat_ownership = ChatOwnership()
 
         # Initialize Agent
         app_logger.info('Initializing Agent...')
@@ -76,6 +175,8 @@ class ChatbotAPI:
                 generator=self.answer_generator,
                 appointment_manager=self.manager
             )
+            self.agent_executor = self.agent.init_agent()
+            self.startup.mark('agent')
             app_logger.info('Agent initialized successfully')
         except Exception as e:
             app_logger.error(f'Failed to initialize Agent: {str(e)}')
@@ -96,9 +197,32 @@ class ChatbotAPI:
             allow_headers=["*"],
         )
         self._setup_routes()
+        self.startup.mark('app')
+
+    def warm_up(self):
+        '''
+        Paying the first-use costs before traffic arrives: the first encode,
+        the tokenizer, a search and the first slot calendar load
+        '''
+        try:
+            model_registry.warm_up()
+            count_tokens('warm up')
+            self.retriever.search('warm up', 1)
+            if self.slot_index is not None:
+                self.slot_index.reconcile()
+            self.startup.mark('warm_up')
+            self.readiness['warm'] = True
+            app_logger.info(f'Warm-up completed, startup profile: {self.startup.as_dict()}')
+        except Exception as e:
+            app_logger.error(f'Warm-up failed: {str(e)}')
 
     def _setup_routes(self):
         """Setup all API routes."""
+        def verify_admin(x_admin_token: str = Header(None)):
+            if not config.ADMIN_TOKEN or not x_admin_token \
+                    or not hmac.compare_digest(x_admin_token, config.ADMIN_TOKEN):
+                raise HTTPException(status_code=403, detail="Admin token required")
+
         @self.app.get('/')
         async def read_root():
             app_logger.info('Root endpoint accessed')
@@ -110,81 +234,132 @@ class ChatbotAPI:
             app_logger.info('Health check endpoint accessed')
             return {'status': 'healthy'}
         
+        @self.app.post('/bootstrap')
+        async def bootstrap(request: Request, response: Response):
+            '''
+            User and chat of a page load in one transaction
+
+            Returns:
+                user_id and chat_id, the user_id cookie is set for new users
+            '''
+            user_id = request.cookies.get('user_id')
+            new_user = not user_id
+            if new_user:
+                user_id = str(uuid.uuid4())
+            async with async_db_loader() as session:
+                try:
+                    await session.execute(UPSERT_USER_SQL, {"user_id": user_id})
+                    result = await session.execute(
+                        FETCH_OR_CREATE_CHAT_SQL,
+                        {"user_id": user_id, "chat_id": str(uuid.uuid4())}
+                    )
+                    chat_id = result.scalar_one()
+                    await session.commit()
+                except Exception as e:
+                    await session.rollback()
+                    app_logger.error(f"Error bootstrapping user {user_id}: {str(e)}")
+                    raise HTTPException(status_code=500, detail=f"Failed to bootstrap session: {str(e)}")
+            if new_user:
+                response.set_cookie(key='user_id', value=user_id, httponly=True, max_age=604800)
+            self.chat_ownership.remember(user_id, chat_id)
+            app_logger.info(f"Bootstrapped user {user_id}, chat {chat_id}")
+            return {'user_id': user_id, 'chat_id': chat_id}
+
+        @self.app.get('/ready')
+        async def ready(response: Response):
+            '''Readiness, separate from /health: 503 until models, index and warm-up are done'''
+            is_ready = all(self.readiness.values())
+            if not is_ready:
+                response.status_code = 503
+            return {
+                'ready': is_ready,
+                'components': self.readiness,
+                'models': model_registry.loaded(),
+                'startup': self.startup.as_dict(),
+            }
+
+        @self.app.on_event('startup')
+        async def startup():
+            # In the background, the worker accepts /health while it warms up
+            asyncio.get_running_loop().run_in_executor(None, self.warm_up)
+
         @self.app.get('/get_user_id')
         async def get_user_id(request: Request, response: Response):
             user_id = request.cookies.get('user_id')
             app_logger.info(f'get_user_id accessed, cookie user_id: {user_id}')
-            with db_loader() as session:
+            async with async_db_loader() as session:
                 try:
                     if user_id:
-                        result = session.execute(
+                        result = await session.execute(
                             text("SELECT user_id FROM users WHERE user_id = :user_id"),
                             {"user_id": user_id}
                         )
                         user = result.fetchone()
                         if not user:
                             app_logger.info(f"User {user_id} not found in database, inserting...")
-                            session.execute(
+                            await session.execute(
                                 text("INSERT INTO users (user_id) VALUES (:user_id)"),
                                 {"user_id": user_id}
                             )
-                            session.commit()
+                            await session.commit()
                     else:
                         user_id = str(uuid.uuid4())
                         app_logger.info(f"Generating new user_id: {user_id}")
-                        session.execute(
+                        await session.execute(
                             text("INSERT INTO users (user_id) VALUES (:user_id)"),
                             {"user_id": user_id}
                         )
-                        session.commit()
+                        await session.commit()
                         response.set_cookie(key='user_id', value=user_id, httponly=True, max_age=604800)
                     app_logger.info(f'Returning user_id: {user_id}')
                     return {'user_id': user_id}
                 except IntegrityError as e:
-                    session.rollback()
+                    await session.rollback()
                     app_logger.error(f"Database integrity error in get_user_id: {str(e)}")
                     raise HTTPException(status_code=400, detail="Failed to process user_id due to database constraint violation")
                 except Exception as e:
-                    session.rollback()
+                    await session.rollback()
                     app_logger.error(f"Error in get_user_id: {str(e)}")
                     raise HTTPException(status_code=500, detail=f"Failed to process user_id: {str(e)}")
         
         @self.app.get('/create_chat/{user_id}')
         async def create_chat(user_id: str):
             app_logger.info(f"Creating chat for user_id: {user_id}")
-            with db_loader() as session:
+            async with async_db_loader() as session:
                 try:
-                    result = session.execute(
+                    result = await session.execute(
                         text("SELECT chat_id FROM chats WHERE user_id = :user_id"),
                         {"user_id": user_id}
                     )
                     chat = result.fetchone()
                     if chat:
                         app_logger.info(f"Existing chat found: {chat[0]}")
+                        self.chat_ownership.remember(user_id, chat[0])
                         return {'chat_id': chat[0]}
                     
                     chat_id = str(uuid.uuid4())
-                    session.execute(
+                    await session.execute(
                         text("""
                             INSERT INTO chats (chat_id, user_id, chatmemory)
                             VALUES (:chat_id, :user_id, :chatmemory)
                         """),
                         {"chat_id": chat_id, "user_id": user_id, "chatmemory": ""}
                     )
-                    session.commit()
+                    await session.commit()
+                    self.chat_ownership.remember(user_id, chat_id)
                     app_logger.info(f"Created new chat {chat_id} for user {user_id}")
                     return {'chat_id': chat_id}
                 except Exception as e:
-                    session.rollback()
+                    await session.rollback()
                     app_logger.error(f"Error creating chat for user {user_id}: {str(e)}")
                     raise HTTPException(status_code=500, detail=f"Failed to create chat: {str(e)}")
         
         @self.app.get('/chats/{user_id}')
         async def get_chats(user_id: str):
             app_logger.info(f"Getting chats for user_id: {user_id}")
-            with db_loader() as session:
+            async with async_db_loader() as session:
                 try:
-                    result = session.execute(
+                    result = await session.execute(
                         text("SELECT chat_id FROM chats WHERE user_id = :user_id"),
                         {"user_id": user_id}
                     )
@@ -196,126 +371,248 @@ class ChatbotAPI:
                     raise HTTPException(status_code=500, detail=f"Failed to get chats: {str(e)}")
         
         @self.app.get('/chat/{chat_id}/messages')
-        async def get_chat_messages(chat_id: str):
+        async def get_chat_messages(chat_id: str, before: int = None, since: int = None,
+                                    limit: int = QueryParam(50, ge=1, le=200)):
+            '''
+            One page of a chat's history, in message order
+
+            Without a cursor the newest messages come back, before=<message_id>
+            pages towards older ones and since=<message_id> returns only what
+            was written after that message.
+            '''
             app_logger.info(f"Getting messages for chat_id: {chat_id}")
-            with db_loader() as session:
-                try:
-                    result = session.execute(
-                        text("""
-                            SELECT message_id, message_text, message_type, timestamp
-                            FROM messages
-                            WHERE chat_id = :chat_id
-                            ORDER BY timestamp
-                        """),
-                        {"chat_id": chat_id}
+            if before is not None and since is not None:
+                raise HTTPException(status_code=400, detail="Use either before or since, not both")
+            if since is not None:
+                statement, params = MESSAGES_SINCE_SQL, {"chat_id": chat_id, "since": since, "limit": limit + 1}
+            elif before is not None:
+                statement, params = MESSAGES_BEFORE_SQL, {"chat_id": chat_id, "before": before, "limit": limit + 1}
+            else:
+                statement, params = LATEST_MESSAGES_SQL, {"chat_id": chat_id, "limit": limit + 1}
+            try:
+                async with async_db_loader() as session:
+                    messages = (await session.execute(statement, params)).fetchall()
+            except Exception as e:
+                app_logger.error(f"Error getting messages for chat {chat_id}: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Failed to get messages: {str(e)}")
+
+            # One extra row tells whether the page is complete
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+            if since is None:
+                messages.reverse()
+            app_logger.info(f"Found {len(messages)} messages for chat {chat_id}")
+            return {
+                'messages': [{'message_id': msg[0], 'type': msg[2], 'text': msg[1]} for msg in messages],
+                'has_more': has_more,
+            }
+
+        @self.app.get('/chat/{chat_id}/messages/export')
+        async def export_chat_messages(chat_id: str):
+            '''The whole history as newline-delimited json, streamed from a server-side cursor'''
+            app_logger.info(f"Exporting messages for chat_id: {chat_id}")
+
+            async def rows():
+                async with async_db_loader() as session:
+                    result = await session.stream(
+                        EXPORT_MESSAGES_SQL.execution_options(yield_per=500), {"chat_id": chat_id}
                     )
-                    messages = result.fetchall()
-                    if not messages:
-                        app_logger.info(f"No messages found for chat {chat_id}")
-                        raise HTTPException(status_code=404, detail="No messages found for this chat")
-                    app_logger.info(f"Found {len(messages)} messages for chat {chat_id}")
-                    return {
-                        'messages': [{'type': msg[2], 'text': msg[1]} for msg in messages]
-                    }
-                except Exception as e:
-                    app_logger.error(f"Error getting messages for chat {chat_id}: {str(e)}")
-                    raise HTTPException(status_code=500, detail=f"Failed to get messages: {str(e)}")
+                    async for msg in result:
+                        yield json.dumps({
+                            'message_id': msg[0],
+                            'type': msg[2],
+                            'text': msg[1],
+                            'timestamp': msg[3].isoformat() if msg[3] else None,
+                        }) + "\n"
+
+            return StreamingResponse(
+                rows(),
+                media_type='application/x-ndjson',
+                headers={'Content-Disposition': f'attachment; filename="chat-{chat_id}.jsonl"'},
+            )
         
         @self.app.get('/reservations/{user_id}')
-        async def get_reservations(user_id: str):
+        async def get_reservations(user_id: str, after_day: str = None, after_time: str = None,
+                                   limit: int = QueryParam(20, ge=1, le=100)):
             app_logger.info(f"Getting reservations for user: {user_id}")
+            if (after_day is None) != (after_time is None):
+                raise HTTPException(status_code=400, detail="after_day and after_time must be given together")
+            after = (after_day, after_time) if after_day is not None else None
             try:
-                # Try AppointmentManager first
-                reservations = self.manager.get_user_reservations(user_id)
-                app_logger.info(f"Raw reservations from AppointmentManager: {reservations}")
-                if "no current reservations" in reservations.lower():
-                    app_logger.info("No reservations found via AppointmentManager")
-                    reservations_list = []
-                else:
-                    reservations_list = []
-                    lines = reservations.split('\n')
-                    for line in lines:
-                        if line.startswith('-'):
-                            parts = line.split(' at ')
-                            if len(parts) == 2:
-                                day = parts[0].replace('- ', '').strip()
-                                time = parts[1].strip()
-                                reservations_list.append({'day': day, 'time': time})
-                    app_logger.info(f"Parsed reservations from AppointmentManager: {reservations_list}")
-
-                # Fallback to direct database query
-                if not reservations_list:
-                    with db_loader() as session:
-                        result = session.execute(
-                            text("""
-                                SELECT day, time
-                                FROM reservations
-                                WHERE user_id = :user_id
-                                ORDER BY day, time
-                            """),
-                            {"user_id": user_id}
-                        )
-                        db_reservations = result.fetchall()
-                        app_logger.info(f"Raw reservations from database: {db_reservations}")
-                        reservations_list = [
-                            {
-                                'day': res[0].strftime('%Y-%m-%d'),
-                                'time': res[1].strftime('%H:%M')
-                            } for res in db_reservations
-                        ]
-                        app_logger.info(f"Parsed reservations from database: {reservations_list}")
-
-                return {'reservations': reservations_list}
+                # One extra row tells whether there is a next page
+                reservations = await self.manager.aget_user_reservations(user_id, after=after, limit=limit + 1)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="after_day must be YYYY-MM-DD and after_time HH:MM")
             except Exception as e:
                 app_logger.error(f"Error fetching reservations for user {user_id}: {str(e)}")
                 raise HTTPException(status_code=500, detail=f"Failed to fetch reservations: {str(e)}")
-        
+
+            page = reservations[:limit]
+            next_page = None
+            if len(reservations) > limit:
+                next_page = {'after_day': page[-1].day, 'after_time': page[-1].time}
+            return {'reservations': page, 'next': next_page}
+
         @self.app.post('/chat/{user_id}/{chat_id}')
         async def chat(user_id: str, chat_id: str, query: Query):
             app_logger.info(f"Processing chat for user {user_id}, chat {chat_id}, question: {query.question}")
-            with db_loader() as session:
+            await self.chat_ownership.ensure(user_id, chat_id)
+            try:
+                corpus_version = self.semantic_cache.corpus_version()
+                with self.query_embedder.request_scope(), agent_context(user_id, chat_id, query.idempotency_key), \
+                        track_context_tokens() as usage:
+                    history = await self.memory.history(chat_id)
+                    output = await run_in_threadpool(self.intent_router.answer, query.question)
+                    # The shared cache only holds standalone questions, a follow-up depends on this chat
+                    if output is None and not history:
+                        output = await run_in_threadpool(self.semantic_cache.lookup, query.question)
+                    if output is None:
+                        output = await run_in_threadpool(self.retriever.direct_answer, query.question)
+                    if output is None:
+                        response = await self.agent_executor.ainvoke({"input": query.question, "chat_history": history})
+                        output = response['output']
+                        tools_used = [action.tool for action, _ in response.get('intermediate_steps', [])]
+                        if not history:
+                            await run_in_threadpool(self.semantic_cache.store, query.question, output,
+                                                    tools_used, corpus_version)
+                self.message_writer.write((chat_id, query.question, 'sent'), (chat_id, output, 'received'))
+                await self.memory.add_turn(chat_id, query.question, output)
+                app_logger.info(f"Chat response for user {user_id}, chat {chat_id}: {output} "
+                                f"({usage['context_tokens']} context tokens)")
+                return {'response': output, 'context_tokens': usage['context_tokens']}
+            except Exception as e:
+                app_logger.error(f"Error processing chat for user {user_id}, chat {chat_id}: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Failed to process chat: {str(e)}")
+
+        @self.app.post('/chat/{user_id}/{chat_id}/stream')
+        async def chat_stream(user_id: str, chat_id: str, query: Query):
+            app_logger.info(f"Streaming chat for user {user_id}, chat {chat_id}, question: {query.question}")
+            await self.chat_ownership.ensure(user_id, chat_id)
+
+            async def event_stream():
                 try:
-                    result = session.execute(
-                        text("SELECT chat_id FROM chats WHERE chat_id = :chat_id AND user_id = :user_id"),
-                        {"chat_id": chat_id, "user_id": user_id}
-                    )
-                    chat = result.fetchone()
-                    if not chat:
-                        app_logger.error(f"Chat {chat_id} not found for user {user_id}")
-                        raise HTTPException(status_code=404, detail="Chat not found")
+                    corpus_version = self.semantic_cache.corpus_version()
+                    with self.query_embedder.request_scope(), agent_context(user_id, chat_id, query.idempotency_key), \
+                            track_context_tokens() as usage:
+                        history = await self.memory.history(chat_id)
+                        output = await run_in_threadpool(self.intent_router.answer, query.question)
+                        # The shared cache only holds standalone questions, a follow-up depends on this chat
+                        if output is None and not history:
+                            output = await run_in_threadpool(self.semantic_cache.lookup, query.question)
+                        if output is None:
+                            output = await run_in_threadpool(self.retriever.direct_answer, query.question)
+                        if output is not None:
+                            yield sse_event('token', {'text': output})
+                        else:
+                            response = None
+                            inputs = {"input": query.question, "chat_history": history}
+                            async for kind, payload in self.agent.astream(self.agent_executor, inputs):
+                                if kind == 'final':
+                                    response = payload
+                                elif kind == 'token':
+                                    yield sse_event('token', {'text': payload})
+                                else:
+                                    yield sse_event(kind, payload)
+                            output = response['output']
+                            tools_used = [action.tool for action, _ in response.get('intermediate_steps', [])]
+                            if not history:
+                                await run_in_threadpool(self.semantic_cache.store, query.question, output,
+                                                        tools_used, corpus_version)
 
-                    agent_executor = self.agent.init_agent(user_id=user_id, chat_id=chat_id)
-                    session.execute(
-                        text("""
-                            INSERT INTO messages (chat_id, message_text, message_type, timestamp)
-                            VALUES (:chat_id, :message_text, :message_type, CURRENT_TIMESTAMP)
-                        """),
-                        {
-                            "chat_id": chat_id,
-                            "message_text": query.question,
-                            "message_type": "sent"
-                        }
-                    )
-                    
-                    response = await agent_executor.ainvoke({"input": query.question})
-                    session.execute(
-                        text("""
-                            INSERT INTO messages (chat_id, message_text, message_type, timestamp)
-                            VALUES (:chat_id, :message_text, :message_type, CURRENT_TIMESTAMP)
-                        """),
-                        {
-                            "chat_id": chat_id,
-                            "message_text": response['output'],
-                            "message_type": "received"
-                        }
-                    )
-                    session.commit()
-                    app_logger.info(f"Chat response for user {user_id}, chat {chat_id}: {response['output']}")
-                    return {'response': response['output']}
+                    self.message_writer.write((chat_id, query.question, 'sent'), (chat_id, output, 'received'))
+                    await self.memory.add_turn(chat_id, query.question, output)
+                    app_logger.info(f"Chat response for user {user_id}, chat {chat_id}: {output} "
+                                    f"({usage['context_tokens']} context tokens)")
+                    yield sse_event('done', {'response': output, 'context_tokens': usage['context_tokens']})
                 except Exception as e:
-                    session.rollback()
-                    app_logger.error(f"Error processing chat for user {user_id}, chat {chat_id}: {str(e)}")
-                    raise HTTPException(status_code=500, detail=f"Failed to process chat: {str(e)}")
+                    app_logger.error(f"Error streaming chat for user {user_id}, chat {chat_id}: {str(e)}")
+                    yield sse_event('error', {'detail': f"Failed to process chat: {str(e)}"})
+
+            return StreamingResponse(
+                event_stream(),
+                media_type='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+            )
+
+        @self.app.get('/admin/faqs', dependencies=[Depends(verify_admin)])
+        async def list_faqs():
+            faqs = await run_in_threadpool(self.knowledge_base.list_faqs)
+            return {'faqs': faqs}
+
+        @self.app.post('/admin/faqs', dependencies=[Depends(verify_admin)])
+        async def add_faq(entry: FaqEntry):
+            app_logger.info(f"Adding faq: {entry.question}")
+            try:
+                faq = await run_in_threadpool(self.knowledge_base.add_faq, entry.question, entry.answer)
+                return {'faq': faq}
+            except PermissionError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+            except Exception as e:
+                app_logger.error(f"Error adding faq: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Failed to add faq: {str(e)}")
+
+        @self.app.put('/admin/faqs/{faq_id}', dependencies=[Depends(verify_admin)])
+        async def update_faq(faq_id: int, entry: FaqEntry):
+            app_logger.info(f"Updating faq {faq_id}")
+            try:
+                faq = await run_in_threadpool(self.knowledge_base.update_faq, faq_id, entry.question, entry.answer)
+                return {'faq': faq}
+            except KeyError:
+                raise HTTPException(status_code=404, detail="Faq not found")
+            except PermissionError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+            except Exception as e:
+                app_logger.error(f"Error updating faq {faq_id}: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Failed to update faq: {str(e)}")
+
+        @self.app.delete('/admin/faqs/{faq_id}', dependencies=[Depends(verify_admin)])
+        async def delete_faq(faq_id: int):
+            app_logger.info(f"Deleting faq {faq_id}")
+            try:
+                await run_in_threadpool(self.knowledge_base.delete_faq, faq_id)
+                return {'deleted': faq_id}
+            except KeyError:
+                raise HTTPException(status_code=404, detail="Faq not found")
+            except PermissionError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+            except Exception as e:
+                app_logger.error(f"Error deleting faq {faq_id}: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Failed to delete faq: {str(e)}")
+
+        @self.app.get('/admin/stats', dependencies=[Depends(verify_admin)])
+        async def stats():
+            return {
+                'query_embeddings': self.query_embedder.stats(),
+                'semantic_cache': self.semantic_cache.stats(),
+                'intent_router': self.intent_router.stats(),
+                'slot_index': self.slot_index.stats() if self.slot_index else None,
+                'retrieval_batching': self.retriever.batcher.stats() if self.retriever.batcher else None,
+                'direct_answer': self.retriever.stats(),
+                'message_writer': self.message_writer.stats(),
+                'db_pool': pool_stats(),
+                'chat_owners': self.chat_ownership.stats(),
+                'conversation_memory': self.memory.stats(),
+                'context': self.context_assembler.stats(),
+            }
+
+        @self.app.post('/admin/faqs/compact', dependencies=[Depends(verify_admin)])
+        async def compact_faqs():
+            app_logger.info("Compacting faq edits")
+            try:
+                await run_in_threadpool(self.knowledge_base.compact)
+                return {'status': 'compacted'}
+            except PermissionError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+            except Exception as e:
+                app_logger.error(f"Error compacting faqs: {str(e)}")
+                raise HTTPException(status_code=500, detail=f"Failed to compact faqs: {str(e)}")
+
+        @self.app.on_event('shutdown')
+        async def shutdown():
+            # Queued messages and chat memories go out before the pool is closed
+            await self.message_writer.close()
+            await self.memory.close()
+            await async_engine.dispose()
 
 app_logger.info('Creating Chatbot API instance...')
 chatbot_api = ChatbotAPI()
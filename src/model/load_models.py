@@ -1,23 +1,13 @@
-from sentence_transformers import SentenceTransformer
-from langchain_openai import ChatOpenAI
-from src.utils.config import config
+from src.model.registry import model_registry
 from src.utils.logger import pipeline_logger
-from transformers import AutoTokenizer
 
 class ModelLoader:
-    '''Initiakizing and loading models'''
+    '''Initiakizing and loading models, shared through the process-wide model registry'''
     def __init__(self):
         try:
-            pipeline_logger.info('Initializing Embedding,LLM,sentiment and zero shot models')
-            self.embedding_model = SentenceTransformer(config.EMBEDDING_MODEL)
-            #self.embedding_model = SentenceTransformer(
-            #    config.EMBEDDING_MODEL,
-            #    tokenizer=AutoTokenizer.from_pretrained(
-            #        config.EMBEDDING_MODEL,
-            #        clean_up_tokenization_spaces=True  # Explicitly set to True
-            #    )
-            #)
-            self.llm_model = ChatOpenAI(model=config.LLM_MODEL,temperature=config.TEMBERATURE,api_key=config.OPENAI_API_KEY)
+            pipeline_logger.info('Initializing Embedding and LLM models')
+            self.embedding_model = model_registry.embedding_model()
+            self.llm_model = model_registry.llm_model()
             pipeline_logger.info('Initializing Compleated successfully')
 
         except Exception as e:
@@ -30,4 +20,4 @@ class ModelLoader:
     
     def get_llm_model(self):
 
-        return self.llm_model
\ No newline at end of file
+        return self.llm_model
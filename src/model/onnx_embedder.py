@@ -0,0 +1,178 @@
+import json
+import os
+import numpy as np
+from src.utils.config import config
+from src.utils.logger import pipeline_logger
+
+EXPORT_FILE = 'export.json'
+OPSET = 14
+
+class OnnxEmbedder:
+    '''
+    Sentence embeddings of a sentence-transformers model run with ONNX Runtime.
+
+    Exposes the same encode() as SentenceTransformer. Only the transformer is
+    exported to onnx, mean pooling and the normalisation of the model's pipeline
+    run in numpy on its outputs. The export (and the int8 copy when quantize is
+    set) is written once to onnx_dir/<model name> and reused by every later start,
+    so torch is only needed to export.
+
+    Args:
+        model_name: sentence-transformers model, config EMBEDDING_MODEL when None
+        model_dir: export directory, under config EMBEDDING_ONNX_DIR when None
+        quantize: run the dynamic int8 quantized model, config EMBEDDING_QUANTIZE when None
+        threads: ONNX Runtime intra-op threads, config EMBEDDING_THREADS when None, 0 lets ORT decide
+    '''
+    def __init__(self,model_name=None,model_dir=None,quantize=None,threads=None):
+        self.model_name = model_name or config.EMBEDDING_MODEL
+        self.model_dir = model_dir or os.path.join(config.EMBEDDING_ONNX_DIR, self.model_name.split('/')[-1])
+        self.quantize = config.EMBEDDING_QUANTIZE if quantize is None else quantize
+        self.threads = config.EMBEDDING_THREADS if threads is None else threads
+        try:
+            info = self._read_export()
+            if info is None or info.get('model') != self.model_name:
+                info = self.export(self.model_name, self.model_dir)
+            model_path = os.path.join(self.model_dir, 'model.onnx')
+            if self.quantize:
+                model_path = self.quantize_model(model_path)
+            self.max_seq_length = info['max_seq_length']
+            self.normalize = info['normalize']
+            self.dimension = info['dimension']
+            self.session = self._session(model_path)
+            self.input_names = {node.name for node in self.session.get_inputs()}
+            self.tokenizer = self._tokenizer()
+            pipeline_logger.info(f'Loaded onnx embedding model {model_path} '
+                                 f'({self.threads or "default"} intra-op threads)')
+        except Exception as e:
+            pipeline_logger.error(f'Failed to load onnx embedding model : {e}')
+            raise RuntimeError('Loading onnx embedding model has failed')
+
+    def _read_export(self):
+        try:
+            with open(os.path.join(self.model_dir, EXPORT_FILE),'r') as file:
+                info = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(os.path.join(self.model_dir, 'model.onnx')):
+            return None
+        return info
+
+    @staticmethod
+    def export(model_name,model_dir):
+        '''
+        Exporting the transformer of a sentence-transformers model and its tokenizer
+
+        Args:
+            model_name: sentence-transformers model
+            model_dir: directory model.onnx, tokenizer.json and export.json are written to
+        Returns:
+            info: export.json contents
+        '''
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        pipeline_logger.info(f'Exporting {model_name} to onnx in {model_dir}')
+        model = SentenceTransformer(model_name, device='cpu')
+        pooling = [module for module in model if type(module).__name__ == 'Pooling']
+        if not pooling or pooling[0].get_pooling_mode_str() != 'mean':
+            raise ValueError(f'{model_name} does not use mean pooling, only mean pooling is supported')
+        transformer = model[0].auto_model.eval()
+        os.makedirs(model_dir, exist_ok=True)
+        model.tokenizer.save_pretrained(model_dir)
+
+        sample = model.tokenizer(['warm up export'], return_tensors='pt')
+        names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+        axes = {name: {0: 'batch', 1: 'sequence'} for name in names}
+        tmp_path = os.path.join(model_dir, 'model.onnx.tmp')
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(sample[name] for name in names),
+                tmp_path,
+                input_names=names,
+                output_names=['last_hidden_state'],
+                dynamic_axes=dict(axes, last_hidden_state={0: 'batch', 1: 'sequence'}),
+                opset_version=OPSET,
+            )
+        os.replace(tmp_path, os.path.join(model_dir, 'model.onnx'))
+        # A quantized copy of an older export is stale
+        if os.path.exists(os.path.join(model_dir, 'model.int8.onnx')):
+            os.remove(os.path.join(model_dir, 'model.int8.onnx'))
+
+        info = {
+            'model': model_name,
+            'max_seq_length': model.max_seq_length,
+            'normalize': any(type(module).__name__ == 'Normalize' for module in model),
+            'dimension': model.get_sentence_embedding_dimension(),
+        }
+        with open(os.path.join(model_dir, EXPORT_FILE),'w') as file:
+            json.dump(info, file, indent=2)
+        pipeline_logger.info('Onnx export compleated successfully')
+        return info
+
+    @staticmethod
+    def quantize_model(model_path):
+        '''Dynamic int8 quantization of the weights, activations stay float and are quantized per batch'''
+        quantized_path = model_path.replace('.onnx', '.int8.onnx')
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            pipeline_logger.info(f'Quantizing {model_path} to int8')
+            quantize_dynamic(model_path, f'{quantized_path}.tmp', weight_type=QuantType.QInt8)
+            os.replace(f'{quantized_path}.tmp', quantized_path)
+        return quantized_path
+
+    def _session(self,model_path):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = self.threads
+        options.inter_op_num_threads = 1
+        return ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+
+    def _tokenizer(self):
+        from tokenizers import Tokenizer
+        tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, 'tokenizer.json'))
+        tokenizer.enable_truncation(max_length=self.max_seq_length)
+        tokenizer.enable_padding(pad_id=tokenizer.token_to_id('[PAD]') or 0, pad_token='[PAD]')
+        return tokenizer
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def _encode_batch(self,texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype='int64')
+        inputs = {
+            'input_ids': np.array([encoding.ids for encoding in encodings], dtype='int64'),
+            'attention_mask': mask,
+            'token_type_ids': np.array([encoding.type_ids for encoding in encodings], dtype='int64'),
+        }
+        hidden = self.session.run(None, {name: inputs[name] for name in self.input_names})[0]
+        # Mean pooling over the real tokens, same as the sentence-transformers Pooling module
+        weights = mask[..., None].astype('float32')
+        return (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+
+    def encode(self,sentences,batch_size=32,normalize_embeddings=False,**kwargs):
+        '''
+        Embedding one text or a list of texts
+
+        Args:
+            sentences: text or list of texts
+            batch_size: texts per onnx run
+            normalize_embeddings: normalise even when the model pipeline does not
+        Returns:
+            embeddings: float32 array of shape (dim,) for one text, (n, dim) for a list
+        '''
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, self.dimension), dtype='float32')
+        # Batching texts of similar length keeps the padding short
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        embeddings = np.empty((len(texts), self.dimension), dtype='float32')
+        for start in range(0, len(texts), batch_size):
+            positions = order[start:start + batch_size]
+            embeddings[positions] = self._encode_batch([texts[position] for position in positions])
+        if self.normalize or normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
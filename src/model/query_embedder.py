@@ -0,0 +1,124 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+import numpy as np
+from src.utils.cache import LRUCache, normalize_query
+from src.utils.config import config
+
+_request_cache = ContextVar('query_embedding_request_cache', default=None)
+
+class QueryEmbedder:
+    '''
+    Memoizing wrapper around the embedding model for user queries.
+
+    Exposes the same encode() as SentenceTransformer. Vectors are kept as float32
+    by normalized query text in a process-wide LRU and, while request_scope() is
+    active, in a per-request dict, so the repeated lookups of one agent run never
+    reach the model even when the process cache has evicted them. Only queries
+    should go through it, corpus embedding keeps using the raw model.
+
+    Args:
+        embedding_model: all-MiniLM-L6-v2 embedding model
+        max_entries: size of the process-wide cache
+    '''
+    def __init__(self,embedding_model,max_entries=None):
+        self.embedding_model = embedding_model
+        self.cache = LRUCache(max_entries or config.QUERY_EMBEDDING_CACHE_SIZE)
+        self.hits = 0
+        self.request_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def request_scope(self):
+        '''Scoping a per-request cache to the current context'''
+        token = _request_cache.set({})
+        try:
+            yield
+        finally:
+            _request_cache.reset(token)
+
+    def lookup(self,text):
+        '''
+        Cached vector of a query, None when it still has to be encoded
+
+        Lets callers that hand the encoding to another thread, like the retrieval
+        batcher, resolve hits on the request side where request_scope() applies.
+        '''
+        key = normalize_query(text)
+        request_cache = _request_cache.get()
+        vector = request_cache.get(key) if request_cache is not None else None
+        if vector is not None:
+            with self._lock:
+                self.request_hits += 1
+            return vector
+        vector = self.cache.get(key)
+        if vector is None:
+            return None
+        with self._lock:
+            self.hits += 1
+        if request_cache is not None:
+            request_cache[key] = vector
+        return vector
+
+    def remember(self,text):
+        '''Copying a vector encoded by another thread into the request cache'''
+        request_cache = _request_cache.get()
+        if request_cache is None:
+            return
+        key = normalize_query(text)
+        vector = self.cache.peek(key)
+        if vector is not None:
+            request_cache[key] = vector
+
+    def encode(self,sentences,**kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, 0), dtype='float32')
+        request_cache = _request_cache.get()
+        vectors = [None] * len(texts)
+        missing = {}
+        hits = request_hits = 0
+        for position, text in enumerate(texts):
+            key = normalize_query(text)
+            vector = request_cache.get(key) if request_cache is not None else None
+            if vector is not None:
+                request_hits += 1
+            else:
+                vector = self.cache.get(key)
+                hits += vector is not None
+            if vector is None:
+                missing.setdefault(key, []).append(position)
+            vectors[position] = vector
+
+        if missing:
+            keys = list(missing)
+            encoded = self.embedding_model.encode([texts[missing[key][0]] for key in keys], **kwargs)
+            encoded = np.array(encoded, dtype='float32').reshape(len(keys), -1)
+            # Cached vectors are shared between callers
+            encoded.setflags(write=False)
+            for key, vector in zip(keys, encoded):
+                self.cache.set(key, vector)
+                for position in missing[key]:
+                    vectors[position] = vector
+
+        if request_cache is not None:
+            for text, vector in zip(texts, vectors):
+                request_cache[normalize_query(text)] = vector
+
+        with self._lock:
+            self.hits += hits
+            self.request_hits += request_hits
+            self.misses += len(missing)
+
+        return vectors[0] if single else np.stack(vectors)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self.cache),
+                'hits': self.hits,
+                'request_hits': self.request_hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,62 @@
+import threading
+import time
+from src.utils.config import config
+from src.utils.logger import pipeline_logger
+
+class ModelRegistry:
+    '''
+    Process-wide, lazily loaded models.
+
+    Every model is created once per process, on first use or in warm_up(), no
+    matter how many components ask for it. The heavy libraries are only
+    imported at that point, so importing a module that uses the registry
+    stays cheap. load_seconds records how long each model took.
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self.load_seconds = {}
+
+    def _get(self,name,factory):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            if name not in self._models:
+                start = time.perf_counter()
+                try:
+                    self._models[name] = factory()
+                except Exception as e:
+                    pipeline_logger.error(f'Failed to load {name} model : {e}')
+                    raise RuntimeError(f'Loading {name} model has failed')
+                self.load_seconds[name] = time.perf_counter() - start
+                pipeline_logger.info(f'Loaded {name} model in {self.load_seconds[name]:.2f}s')
+            return self._models[name]
+
+    def embedding_model(self):
+        '''SentenceTransformer or OnnxEmbedder depending on config EMBEDDING_BACKEND'''
+        def load():
+            if config.EMBEDDING_BACKEND == 'onnx':
+                from src.model.onnx_embedder import OnnxEmbedder
+                return OnnxEmbedder()
+            if config.EMBEDDING_BACKEND != 'torch':
+                raise ValueError(f'Unknown embedding backend {config.EMBEDDING_BACKEND}, expected torch or onnx')
+            from sentence_transformers import SentenceTransformer
+            return SentenceTransformer(config.EMBEDDING_MODEL)
+        return self._get('embedding', load)
+
+    def llm_model(self):
+        def load():
+            from langchain_openai import ChatOpenAI
+            return ChatOpenAI(model=config.LLM_MODEL,temperature=config.TEMBERATURE,api_key=config.OPENAI_API_KEY)
+        return self._get('llm', load)
+
+    def loaded(self):
+        return sorted(self._models)
+
+    def warm_up(self):
+        '''Loading every model and running one encode, so the first request pays nothing'''
+        self.embedding_model().encode(['warm up'])
+        self.llm_model()
+
+model_registry = ModelRegistry()
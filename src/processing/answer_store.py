@@ -0,0 +1,163 @@
+import os
+import numpy as np
+from src.utils.config import config
+from src.utils.logger import pipeline_logger
+
+DELETED = -1
+
+class AnswerStore:
+    '''
+    Compact store for the faq texts, addressed by faiss id.
+
+    Questions and answers are kept as utf-8 in one contiguous byte buffer with an
+    offset table holding a (question_start, answer_start, end) row per id, so a
+    lookup is a slice and a decode with no pandas involved. Both the buffer and
+    the offset table can be memory-mapped from disk.
+
+    Edits never touch the base buffer: new texts are appended to an in-memory
+    tail and the offset row is repointed, deleted ids keep a row of -1 so ids
+    stay stable. compact() folds the tail back into a single buffer.
+
+    Args:
+        buffer: uint8 array holding every text back to back
+        offsets: int64 array of shape (n, 3)
+    '''
+    def __init__(self,buffer,offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+        self._tail = bytearray()
+
+    @classmethod
+    def from_records(cls,questions,answers,ids=None,size=None):
+        '''
+        Building a store from parallel sequences of questions and answers
+
+        Args:
+            questions: faq questions
+            answers: faq answers
+            ids: faiss id of each row, defaults to the row position
+            size: length of the offset table, at least max(ids) + 1
+        '''
+        ids = list(range(len(questions))) if ids is None else [int(idx) for idx in ids]
+        size = max(max(ids, default=-1) + 1, size or 0)
+        chunks = []
+        offsets = np.full((size, 3), DELETED, dtype=np.int64)
+        position = 0
+        for idx, question, answer in zip(ids, questions, answers):
+            question_bytes = str(question).encode('utf-8')
+            answer_bytes = str(answer).encode('utf-8')
+            answer_start = position + len(question_bytes)
+            end = answer_start + len(answer_bytes)
+            offsets[idx] = (position, answer_start, end)
+            chunks.extend((question_bytes, answer_bytes))
+            position = end
+        buffer = np.frombuffer(b''.join(chunks), dtype=np.uint8)
+        return cls(buffer, offsets)
+
+    @staticmethod
+    def _offsets_path(path):
+        return f'{path}.offsets.npy'
+
+    @classmethod
+    def exists(cls,path=None):
+        path = path or config.ANSWERS_PATH
+        return os.path.exists(path) and os.path.exists(cls._offsets_path(path))
+
+    @classmethod
+    def load(cls,path=None,mmap=None):
+        '''
+        Loading a store from disk
+
+        Args:
+            path: buffer file, the offset table lives next to it
+            mmap: memory-map the files instead of reading them into memory
+        Returns:
+            store: AnswerStore
+        '''
+        path = path or config.ANSWERS_PATH
+        mmap = config.ANSWERS_MMAP if mmap is None else mmap
+        try:
+            offsets = np.load(cls._offsets_path(path), mmap_mode='r' if mmap else None)
+            if mmap and os.path.getsize(path) > 0:
+                buffer = np.memmap(path, dtype=np.uint8, mode='r')
+            else:
+                buffer = np.fromfile(path, dtype=np.uint8)
+            pipeline_logger.info(f'Answer store loaded with {len(offsets)} entries')
+            return cls(buffer, offsets)
+        except Exception as e:
+            pipeline_logger.error(f'Failed to load answer store : {e}')
+            raise RuntimeError('Loading answer store has failed')
+
+    def save(self,path=None):
+        '''Writing the buffer and offset table to disk'''
+        path = path or config.ANSWERS_PATH
+        try:
+            with open(f'{path}.tmp','wb') as file:
+                file.write(np.asarray(self.buffer).tobytes())
+                file.write(bytes(self._tail))
+            with open(f'{self._offsets_path(path)}.tmp','wb') as file:
+                np.save(file, np.asarray(self.offsets))
+            os.replace(f'{path}.tmp', path)
+            os.replace(f'{self._offsets_path(path)}.tmp', self._offsets_path(path))
+        except Exception as e:
+            pipeline_logger.error(f'Failed to save answer store : {e}')
+            raise RuntimeError('Saving answer store has failed')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def live_ids(self):
+        return np.flatnonzero(np.asarray(self.offsets)[:, 0] != DELETED)
+
+    def is_live(self,idx):
+        return 0 <= idx < len(self.offsets) and self.offsets[idx][0] != DELETED
+
+    def _text(self,start,end):
+        base_size = len(self.buffer)
+        if start >= base_size:
+            return bytes(self._tail[start - base_size:end - base_size]).decode('utf-8')
+        return bytes(self.buffer[start:end]).decode('utf-8')
+
+    def question(self,idx):
+        question_start, answer_start, _ = self.offsets[idx]
+        return self._text(question_start, answer_start)
+
+    def answer(self,idx):
+        _, answer_start, end = self.offsets[idx]
+        return self._text(answer_start, end)
+
+    def _writable_offsets(self,size):
+        # Loaded offsets may be a read-only memmap, copy them on the first edit
+        if isinstance(self.offsets, np.memmap) or not self.offsets.flags.writeable \
+                or len(self.offsets) < size:
+            offsets = np.full((max(size, len(self.offsets)), 3), DELETED, dtype=np.int64)
+            offsets[:len(self.offsets)] = self.offsets
+            self.offsets = offsets
+        return self.offsets
+
+    def put(self,idx,question,answer):
+        '''Adding or replacing the texts stored under an id'''
+        question_bytes = question.encode('utf-8')
+        answer_bytes = answer.encode('utf-8')
+        position = len(self.buffer) + len(self._tail)
+        answer_start = position + len(question_bytes)
+        offsets = self._writable_offsets(idx + 1)
+        self._tail.extend(question_bytes)
+        self._tail.extend(answer_bytes)
+        offsets[idx] = (position, answer_start, answer_start + len(answer_bytes))
+
+    def delete(self,idx):
+        self._writable_offsets(idx + 1)[idx] = DELETED
+
+    def compact(self):
+        '''Rewriting the buffer with only the live texts, keeping ids unchanged'''
+        live_ids = self.live_ids()
+        compacted = AnswerStore.from_records(
+            [self.question(idx) for idx in live_ids],
+            [self.answer(idx) for idx in live_ids],
+            ids=live_ids,
+            size=len(self.offsets),
+        )
+        self.buffer = compacted.buffer
+        self.offsets = compacted.offsets
+        self._tail = bytearray()
@@ -1,31 +1,191 @@
+import os
 import faiss
 import numpy as np
 from src.utils.config import config
 from src.utils.logger import pipeline_logger
 
+INDEX_TYPES = ('flat', 'hnsw', 'ivf_flat', 'ivf_pq')
+METRICS = {'l2': faiss.METRIC_L2, 'ip': faiss.METRIC_INNER_PRODUCT}
+
+# faiss wants about 39 training points per ivf list and 2**nbits per pq codebook
+MIN_POINTS_PER_LIST = 39
+
 class FaissIndex:
-    def __init__(self,df):
+    '''
+    Building, loading and searching the faq index.
+
+    The index type and metric come from the index section of config.yml:
+    flat, hnsw, ivf_flat or ivf_pq, over l2 or inner product. With ip the
+    vectors are normalised, so scores are cosine similarities; search() turns
+    them back into squared L2 distances (2 - 2 * cosine), so every caller ranks
+    and thresholds hits the same way whatever the metric.
+    Build parameters (nlist, hnsw_m, ef_construction, pq_m, pq_nbits) key the
+    index cache; search parameters (nprobe, ef_search) are applied on every
+    load and never trigger a rebuild.
+    '''
+    def __init__(self,df=None,params=None):
         self.index_path = config.INDEX_PATH
         self.df = df
-    
+        self.params = params or FaissIndex.index_params()
+
+    @staticmethod
+    def index_params():
+        '''Parameters that define how the index is built, used to key the index cache'''
+        params = {'type': config.INDEX_TYPE, 'metric': config.INDEX_METRIC, 'id_map': True}
+        if config.INDEX_TYPE == 'hnsw':
+            params.update(hnsw_m=config.INDEX_HNSW_M, ef_construction=config.INDEX_EF_CONSTRUCTION)
+        if config.INDEX_TYPE in ('ivf_flat', 'ivf_pq'):
+            params.update(nlist=config.INDEX_NLIST)
+        if config.INDEX_TYPE == 'ivf_pq':
+            params.update(pq_m=config.INDEX_PQ_M, pq_nbits=config.INDEX_PQ_NBITS)
+        return params
+
+    @staticmethod
+    def search_params():
+        return {'nprobe': config.INDEX_NPROBE, 'ef_search': config.INDEX_EF_SEARCH}
+
+    @staticmethod
+    def create_index(dim,n_vectors,params):
+        '''
+        Empty id-mapped index of the requested type, sized down for small corpora
+
+        Args:
+            dim: vector dimension
+            n_vectors: number of training vectors available
+            params: index_params() style dict
+        Returns:
+            index: untrained faiss.IndexIDMap2
+        '''
+        index_type, metric = params.get('type', 'flat'), METRICS[params.get('metric', 'l2')]
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f'Unknown index type {index_type}, expected one of {INDEX_TYPES}')
+        if index_type == 'ivf_pq' and (n_vectors < 2 ** params['pq_nbits'] or dim % params['pq_m']):
+            pipeline_logger.warning(f'{n_vectors} vectors of dim {dim} cannot train ivf_pq '
+                                    f'(pq_m {params["pq_m"]}, pq_nbits {params["pq_nbits"]}), using ivf_flat')
+            index_type = 'ivf_flat'
+        if index_type == 'flat':
+            inner = faiss.IndexFlatIP(dim) if metric == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dim)
+        elif index_type == 'hnsw':
+            inner = faiss.IndexHNSWFlat(dim, params['hnsw_m'], metric)
+            inner.hnsw.efConstruction = params['ef_construction']
+        else:
+            nlist = max(1, min(params['nlist'], n_vectors // MIN_POINTS_PER_LIST))
+            if nlist != params['nlist']:
+                pipeline_logger.warning(f'{n_vectors} vectors are too few for nlist {params["nlist"]}, using {nlist}')
+            quantizer = faiss.IndexFlatIP(dim) if metric == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dim)
+            if index_type == 'ivf_flat':
+                inner = faiss.IndexIVFFlat(quantizer, dim, nlist, metric)
+            else:
+                inner = faiss.IndexIVFPQ(quantizer, dim, nlist, params['pq_m'], params['pq_nbits'], metric)
+        # faiss' python wrappers keep inner and its quantizer referenced by the map
+        return faiss.IndexIDMap2(inner)
+
+    @staticmethod
+    def apply_search_params(index,search_params=None):
+        '''Setting nprobe / efSearch on an index built or loaded from disk'''
+        search_params = search_params or FaissIndex.search_params()
+        inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+        if isinstance(inner, faiss.IndexIVF):
+            inner.nprobe = min(search_params['nprobe'], inner.nlist)
+        elif isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efSearch = search_params['ef_search']
+        return index
+
+    @staticmethod
+    def is_ip(index):
+        return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+    @staticmethod
+    def supports_removal(index):
+        '''HNSW graphs cannot drop vectors, deleted faqs are filtered by the answer store instead'''
+        inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+        return not isinstance(inner, faiss.IndexHNSW)
+
+    @staticmethod
+    def prepare(index,vectors):
+        '''float32 copy of the vectors, normalised when the index compares inner products'''
+        vectors = np.array(vectors, dtype='float32', copy=True).reshape(-1, index.d)
+        if FaissIndex.is_ip(index):
+            faiss.normalize_L2(vectors)
+        return vectors
+
+    @staticmethod
+    def search(index,queries,top_k):
+        '''
+        Searching with squared L2 distances whatever the metric
+
+        Returns:
+            distances: ascending squared L2 distances, 2 - 2 * cosine for ip indexes
+            indices: faiss ids, -1 padded
+        '''
+        distances, indices = index.search(FaissIndex.prepare(index, queries), top_k)
+        if FaissIndex.is_ip(index):
+            distances = np.where(indices >= 0, 2.0 - 2.0 * distances, np.float32(np.inf)).astype('float32')
+        return distances, indices
+
     def data_index(self):
         '''
         Creating faiss index
-    
+
         Args:
             df: faqs dataframe
         Returns:
-            index: faiss index 
-        '''    
+            index: faiss index
+        '''
+        embedded_array = np.array(self.df['faqs_embed'].tolist()).astype('float32')
+        return self.build_index(embedded_array)
+
+    def build_index(self,embedded_array,ids=None):
+        '''
+        Creating faiss index from an array of embeddings and writing it to disk.
+        The index is id-mapped so single faqs can be added or removed in place.
+
+        Args:
+            embedded_array: float32 array of shape (n, dim)
+            ids: int64 faiss id of each row, defaults to the row position
+        Returns:
+            index: faiss index
+        '''
         try:
             pipeline_logger.info('Creating Index for the dataset')
-            embedded_array = np.array(self.df['faqs_embed'].tolist()).astype('float32')
-            index = faiss.IndexFlatL2(embedded_array.shape[1])
-            index.add(embedded_array)
-            faiss.write_index(index, self.index_path)
-            pipeline_logger.info(f"FAISS index contains {index.ntotal} vectors")
+            if ids is None:
+                ids = np.arange(embedded_array.shape[0])
+            index = self.create_index(embedded_array.shape[1], embedded_array.shape[0], self.params)
+            vectors = self.prepare(index, embedded_array)
+            if not index.is_trained:
+                index.train(vectors)
+            index.add_with_ids(vectors, np.asarray(ids, dtype='int64'))
+            self.apply_search_params(index)
+            self.save_index(index)
+            pipeline_logger.info(f"FAISS {self.params['type']} index contains {index.ntotal} vectors")
             pipeline_logger.info('Index creation compleated successfully')
             return index
         except Exception as e:
-            pipeline_logger.error(f'Failed to create index')
+            pipeline_logger.error(f'Failed to create index : {e}')
             raise RuntimeError('Creating Index has failed')
+
+    def save_index(self,index):
+        '''Writing an index to disk through a temporary file'''
+        faiss.write_index(index, f'{self.index_path}.tmp')
+        os.replace(f'{self.index_path}.tmp', self.index_path)
+
+    def load_index(self,read_only=None):
+        '''
+        Loading a previously built faiss index from disk
+
+        Args:
+            read_only: memory-map the file read-only so workers share its pages,
+                config READ_ONLY_INDEX when None
+        '''
+        read_only = config.READ_ONLY_INDEX if read_only is None else read_only
+        try:
+            pipeline_logger.info(f'Loading Index from {self.index_path}{" (read-only mmap)" if read_only else ""}')
+            # IO_FLAG_MMAP alone still copies flat and hnsw storage into private memory,
+            # MMAP_IFC keeps the vectors in the file mapping, shared through the page cache
+            flags = faiss.IO_FLAG_MMAP_IFC if read_only else 0
+            index = self.apply_search_params(faiss.read_index(self.index_path, flags))
+            pipeline_logger.info(f"FAISS index contains {index.ntotal} vectors")
+            return index
+        except Exception as e:
+            pipeline_logger.error(f'Failed to load index : {e}')
+            raise RuntimeError('Loading Index has failed')
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import numpy as np
+from src.processing.answer_store import AnswerStore
+from src.processing.data_index import FaissIndex
+from src.utils.config import config
+from src.utils.logger import pipeline_logger
+
+MANIFEST_VERSION = 3
+
+class IndexCache:
+    '''
+    Content-addressed cache for the FAQ embeddings and faiss index.
+
+    A manifest stored next to the index records a key derived from the faqs csv
+    contents, the embedding model name and the index parameters. When the key of
+    the current inputs matches the manifest, the stored vectors and index are
+    loaded from disk and the embedder is skipped. Otherwise both are rebuilt.
+
+    The faq texts are served from an AnswerStore written alongside the index, so
+    pandas is only imported when a rebuild is needed.
+
+    With READ_ONLY_INDEX the index, vectors and answer texts are memory-mapped
+    read-only and a missing or stale cache is an error instead of a rebuild.
+
+    Args:
+        embedding_model: all-MiniLM-L6-v2 embedding model
+    '''
+    def __init__(self,embedding_model):
+        self.embedding_model = embedding_model
+        self.data_path = config.DATA_PATH
+        self.index_path = config.INDEX_PATH
+        self.manifest_path = config.INDEX_MANIFEST_PATH
+        self.embeddings_path = config.EMBEDDINGS_PATH
+        self.vectors = None
+        self.key = None
+
+    def build_key(self):
+        '''Hash of everything the index depends on'''
+        digest = hashlib.sha256()
+        with open(self.data_path,'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                digest.update(chunk)
+        digest.update(config.EMBEDDING_MODEL.encode('utf-8'))
+        # int8 vectors differ slightly from the torch ones, queries and corpus must come from the same backend
+        if config.EMBEDDING_BACKEND != 'torch':
+            digest.update(f'{config.EMBEDDING_BACKEND}:{config.EMBEDDING_QUANTIZE}'.encode('utf-8'))
+        digest.update(json.dumps(FaissIndex.index_params(), sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path,'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self,manifest):
+        tmp_path = f'{self.manifest_path}.tmp'
+        with open(tmp_path,'w') as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def invalidate(self):
+        '''Dropping the manifest so a crash mid-write never leaves a stale match'''
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def _is_fresh(self,manifest,key):
+        return (
+            manifest is not None
+            and manifest.get('version') == MANIFEST_VERSION
+            and manifest.get('key') == key
+            and os.path.exists(self.index_path)
+            and os.path.exists(self.embeddings_path)
+            and AnswerStore.exists()
+        )
+
+    def load_or_build(self):
+        '''
+        Loading the faq texts and their index, rebuilding only when the inputs changed
+
+        Returns:
+            answer_store: AnswerStore with the faq questions and answers
+            index: faiss index
+        '''
+        self.key = self.build_key()
+        manifest = self._read_manifest()
+
+        if self._is_fresh(manifest, self.key):
+            try:
+                pipeline_logger.info(f'Index cache hit ({self.key[:12]}), skipping embedding')
+                self.vectors = np.load(self.embeddings_path, mmap_mode='r')
+                index = FaissIndex().load_index()
+                answer_store = AnswerStore.load(mmap=True if config.READ_ONLY_INDEX else None)
+                if len(answer_store) != self.vectors.shape[0] \
+                        or index.ntotal != len(answer_store.live_ids()):
+                    raise RuntimeError('Cached index does not match the answer store')
+                return answer_store, index
+            except Exception as e:
+                if config.READ_ONLY_INDEX:
+                    raise
+                pipeline_logger.warning(f'Index cache is unusable, rebuilding : {e}')
+
+        if config.READ_ONLY_INDEX:
+            # Workers never build, several of them would race writing the same files
+            raise RuntimeError('The index is missing or stale, build it offline with python -m scripts.build_index')
+        pipeline_logger.info(f'Index cache miss ({self.key[:12]}), rebuilding index')
+        return self._rebuild()
+
+    def _rebuild(self):
+        # pandas is only needed to read and embed the csv
+        from src.processing.data_loader import DataLoader
+        from src.processing.data_embedder import DataEmbedder
+
+        self.invalidate()
+        df = DataLoader().load_data()
+        df = DataEmbedder(self.embedding_model, df).embed_data()
+        # Faqs edited through the admin api carry their stable id in the csv
+        ids = df['id'].to_numpy(dtype='int64') if 'id' in df.columns else np.arange(len(df))
+        embedded_array = np.array(df['faqs_embed'].tolist()).astype('float32')
+        answer_store = AnswerStore.from_records(df['question'].tolist(), df['answer'].tolist(), ids=ids)
+        self.vectors = np.zeros((len(answer_store), embedded_array.shape[1]), dtype='float32')
+        self.vectors[ids] = embedded_array
+        index = FaissIndex().build_index(embedded_array, ids)
+        self.write_snapshot(answer_store, index, self.vectors, write_index=False)
+        return answer_store, index
+
+    def write_snapshot(self,answer_store,index,vectors,write_index=True):
+        '''
+        Persisting the vectors, answer store and index, then the manifest keyed by
+        the current faqs csv
+
+        Args:
+            answer_store: AnswerStore
+            index: faiss index
+            vectors: float32 array with one row per faiss id
+            write_index: False when the index file is already up to date
+        '''
+        self.invalidate()
+        # Replace rather than overwrite, the old file may still be memory-mapped
+        with open(f'{self.embeddings_path}.tmp','wb') as file:
+            np.save(file, np.asarray(vectors, dtype='float32'))
+        os.replace(f'{self.embeddings_path}.tmp', self.embeddings_path)
+        answer_store.save()
+        if write_index:
+            FaissIndex().save_index(index)
+        self.key = self.build_key()
+        self._write_manifest({
+            'version': MANIFEST_VERSION,
+            'key': self.key,
+            'embedding_model': config.EMBEDDING_MODEL,
+            'index_params': FaissIndex.index_params(),
+            'ntotal': int(index.ntotal),
+            'dim': int(vectors.shape[1]),
+        })
@@ -0,0 +1,229 @@
+import base64
+import csv
+import json
+import os
+import threading
+import numpy as np
+from src.processing.data_index import FaissIndex
+from src.utils.config import config
+from src.utils.logger import pipeline_logger
+
+class KnowledgeBase:
+    '''
+    Live faq corpus supporting add, update and delete of single entries.
+
+    Edits embed only the changed faq, update the id-mapped faiss index and the
+    AnswerStore in place, and are appended to a delta log so they survive a
+    restart. Every `faq_compact_every` edits the log is folded back into the faqs
+    csv and a fresh index snapshot, then truncated.
+
+    Edits live in the memory of the process that made them, other workers keep
+    serving what they loaded. There is a single writer: with more than one worker
+    edits are refused and the faqs csv is edited and the index rebuilt offline.
+
+    Args:
+        embedding_model: all-MiniLM-L6-v2 embedding model
+        index_cache: IndexCache the index and answer store were loaded through
+        index: id-mapped faiss index
+        answer_store: AnswerStore
+        workers: number of processes serving this index
+    '''
+    def __init__(self,embedding_model,index_cache,index,answer_store,workers=1):
+        self.embedding_model = embedding_model
+        self.index_cache = index_cache
+        self.index = index
+        self.answer_store = answer_store
+        self.data_path = config.DATA_PATH
+        self.delta_path = config.FAQ_DELTA_PATH
+        self.compact_every = config.FAQ_COMPACT_EVERY
+        # Guards the index and answer store, searches take it as well
+        self.lock = threading.RLock()
+        # hnsw cannot remove vectors: an edited faq keeps its old vector next to the new one
+        # and a deleted one is hidden by the answer store, both until the index is rebuilt
+        self.removable = FaissIndex.supports_removal(index)
+        self.version = 0
+        self._vectors = index_cache.vectors
+        self._changed_vectors = {}
+        self._pending = 0
+        self.read_only = config.READ_ONLY_INDEX
+        self.workers = workers
+        if self.workers > 1 and not self.read_only:
+            pipeline_logger.warning(f'Serving the faq index from {self.workers} workers, faq edits are refused')
+        if self.read_only:
+            if os.path.exists(self.delta_path) and os.path.getsize(self.delta_path):
+                pipeline_logger.warning('Ignoring the faq delta log in read-only mode, run scripts.build_index to fold it in')
+        else:
+            self._replay()
+
+    def _embed(self,question,answer):
+        # Same text layout as the faqs column of the csv
+        vector = self.embedding_model.encode(f'{question} {answer}')
+        return np.asarray(vector, dtype='float32').reshape(-1)
+
+    def _apply(self,record,vector=None):
+        faq_id = record['id']
+        ids = np.array([faq_id], dtype='int64')
+        if self.answer_store.is_live(faq_id) and self.removable:
+            self.index.remove_ids(ids)
+        if record['op'] == 'upsert':
+            self.index.add_with_ids(FaissIndex.prepare(self.index, vector), ids)
+            self.answer_store.put(faq_id, record['question'], record['answer'])
+            self._changed_vectors[faq_id] = vector
+        else:
+            self.answer_store.delete(faq_id)
+            self._changed_vectors.pop(faq_id, None)
+        self.version += 1
+
+    def _append_delta(self,record,vector=None):
+        entry = dict(record, base=self.index_cache.key)
+        if vector is not None:
+            entry['vector'] = base64.b64encode(vector.tobytes()).decode('ascii')
+        with open(self.delta_path,'a') as file:
+            file.write(json.dumps(entry) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self._pending += 1
+
+    def _replay(self):
+        '''Re-applying edits logged since the last compaction'''
+        if not os.path.exists(self.delta_path):
+            return
+        applied = 0
+        with open(self.delta_path,'r') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    pipeline_logger.warning('Skipping truncated faq delta entry')
+                    continue
+                # Entries written against another snapshot were already compacted
+                if entry.get('base') != self.index_cache.key:
+                    continue
+                vector = None
+                if entry['op'] == 'upsert':
+                    vector = np.frombuffer(base64.b64decode(entry['vector']), dtype='float32')
+                self._apply(entry, vector)
+                applied += 1
+        self._pending = applied
+        pipeline_logger.info(f'Replayed {applied} faq edits from the delta log')
+
+    def get_vector(self,faq_id):
+        if faq_id in self._changed_vectors:
+            return self._changed_vectors[faq_id]
+        return np.asarray(self._vectors[faq_id])
+
+    def get_faq(self,faq_id):
+        with self.lock:
+            if not self.answer_store.is_live(faq_id):
+                return None
+            return {
+                'id': int(faq_id),
+                'question': self.answer_store.question(faq_id),
+                'answer': self.answer_store.answer(faq_id),
+            }
+
+    def list_faqs(self):
+        with self.lock:
+            return [self.get_faq(int(faq_id)) for faq_id in self.answer_store.live_ids()]
+
+    def _check_writable(self):
+        if self.read_only:
+            raise PermissionError('The faq index is served read-only, edit the faqs csv and rebuild it offline')
+        if self.workers > 1:
+            raise PermissionError(f'Faq edits would only reach one of {self.workers} workers, '
+                                  'edit with a single worker or edit the faqs csv and rebuild the index offline')
+
+    def add_faq(self,question,answer):
+        self._check_writable()
+        vector = self._embed(question, answer)
+        with self.lock:
+            record = {'op': 'upsert', 'id': len(self.answer_store), 'question': question, 'answer': answer}
+            self._append_delta(record, vector)
+            self._apply(record, vector)
+            pipeline_logger.info(f"Added faq {record['id']}")
+            self._maybe_compact()
+            return self.get_faq(record['id'])
+
+    def update_faq(self,faq_id,question,answer):
+        self._check_writable()
+        if not self.answer_store.is_live(faq_id):
+            raise KeyError(faq_id)
+        vector = self._embed(question, answer)
+        with self.lock:
+            if not self.answer_store.is_live(faq_id):
+                raise KeyError(faq_id)
+            record = {'op': 'upsert', 'id': faq_id, 'question': question, 'answer': answer}
+            self._append_delta(record, vector)
+            self._apply(record, vector)
+            pipeline_logger.info(f'Updated faq {faq_id}')
+            self._maybe_compact()
+            return self.get_faq(faq_id)
+
+    def delete_faq(self,faq_id):
+        self._check_writable()
+        with self.lock:
+            if not self.answer_store.is_live(faq_id):
+                raise KeyError(faq_id)
+            record = {'op': 'delete', 'id': faq_id}
+            self._append_delta(record)
+            self._apply(record)
+            pipeline_logger.info(f'Deleted faq {faq_id}')
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._pending >= self.compact_every:
+            self.compact()
+
+    def _dense_vectors(self):
+        vectors = np.zeros((len(self.answer_store), self._vectors.shape[1]), dtype='float32')
+        vectors[:len(self._vectors)] = self._vectors
+        for faq_id, vector in self._changed_vectors.items():
+            vectors[faq_id] = vector
+        deleted = np.ones(len(vectors), dtype=bool)
+        deleted[self.answer_store.live_ids()] = False
+        vectors[deleted] = 0
+        return vectors
+
+    def _write_csv(self):
+        tmp_path = f'{self.data_path}.tmp'
+        with open(tmp_path,'w',newline='',encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(['id', 'question', 'answer', 'faqs'])
+            for faq_id in self.answer_store.live_ids():
+                question = self.answer_store.question(faq_id)
+                answer = self.answer_store.answer(faq_id)
+                writer.writerow([int(faq_id), question, answer, f'{question} {answer}'])
+        os.replace(tmp_path, self.data_path)
+
+    def _rebuild_index(self,vectors):
+        '''
+        Re-adding only the live vectors, in place so every holder of the index sees it.
+        hnsw keeps the vectors of edited and deleted faqs until then, the snapshot
+        would not match the answer store.
+        '''
+        live_ids = np.asarray(self.answer_store.live_ids(), dtype='int64')
+        self.index.reset()
+        if len(live_ids):
+            self.index.add_with_ids(FaissIndex.prepare(self.index, vectors[live_ids]), live_ids)
+        pipeline_logger.info(f'Rebuilt the index from {len(live_ids)} live faqs')
+
+    def compact(self):
+        '''Folding the delta log into the faqs csv and a new index snapshot'''
+        self._check_writable()
+        with self.lock:
+            try:
+                pipeline_logger.info(f'Compacting {self._pending} faq edits')
+                self.answer_store.compact()
+                vectors = self._dense_vectors()
+                if not self.removable:
+                    self._rebuild_index(vectors)
+                self._write_csv()
+                self.index_cache.write_snapshot(self.answer_store, self.index, vectors)
+                self._vectors = vectors
+                self._changed_vectors = {}
+                open(self.delta_path,'w').close()
+                self._pending = 0
+                pipeline_logger.info('Faq compaction compleated successfully')
+            except Exception as e:
+                pipeline_logger.error(f'Failed to compact faq edits : {e}')
+                raise RuntimeError('Compacting faq edits has failed')
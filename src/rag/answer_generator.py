@@ -3,7 +3,7 @@ from langchain_core.runnables import RunnablePassthrough
 import re
 
 class AnswerGenerator:
-    def __init__(self,llm,retriever):
+    def __init__(self,llm,retriever,context_assembler=None):
 
         '''
         Setting up answer generator with chat memory and sentiment analysis.
@@ -12,9 +12,11 @@ class AnswerGenerator:
             llm: LLM model (e.g., gpt-4o-mini)
             retriever: A retriever method
             sentiment_analyzer: Sentiment analysis pipeline
+            context_assembler: ContextAssembler picking the answers to inline, top 3 when None
         '''
         self.llm_model = llm
         self.retriever = retriever
+        self.context_assembler = context_assembler
 
         
         self.prompt = PromptTemplate(
@@ -51,6 +53,8 @@ class AnswerGenerator:
 
     def _retrieve_context(self,question):
         """Retrieve context using the retriever."""
+        if self.context_assembler is not None:
+            return self.context_assembler.assemble(question)
         return self.retriever.retriever(question)
     
 
@@ -66,6 +70,10 @@ class AnswerGenerator:
             cleaned_response: A generated response based on context, history, and sentiment'''
         
         try:
+            # A confident faq match is already the answer, the llm would only rephrase it
+            direct = self.retriever.direct_answer(question)
+            if direct is not None:
+                return direct
             response = self.rag_chain.invoke(question)
 
             cleaned_response = re.sub(r'\*\*(.*?)\*\*',r'\1',response.content)
@@ -0,0 +1,85 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from src.utils.logger import pipeline_logger
+
+class RetrievalBatcher:
+    '''
+    Coalescing retrieval requests from concurrent callers into batches.
+
+    Callers wait on a future while a worker thread collects pending queries for
+    up to max_wait_ms or max_batch_size, runs them through search_fn in a single
+    call and hands every caller its own row of the result. The worker is started
+    lazily, so a batcher created before a fork starts its own thread in the child.
+
+    Args:
+        search_fn: callable(queries, top_k) returning batched (distances, indices)
+        max_batch_size: maximum number of queries per batch
+        max_wait_ms: how long the first query of a batch waits for company
+    '''
+    def __init__(self,search_fn,max_batch_size=32,max_wait_ms=2):
+        self.search_fn = search_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.queries = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='retrieval-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self,query,top_k):
+        '''Queueing a query, the future resolves to its (distances, indices) row'''
+        self._ensure_started()
+        future = Future()
+        self._queue.put((query, top_k, future))
+        return future
+
+    def search(self,query,top_k):
+        return self.submit(query, top_k).result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            top_k = max(item[1] for item in batch)
+            try:
+                distances, indices = self.search_fn([item[0] for item in batch], top_k)
+            except Exception as e:
+                pipeline_logger.error(f'Batched retrieval failed : {e}')
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for row, (_, k, future) in enumerate(batch):
+                future.set_result((distances[row, :k], indices[row, :k]))
+            self.batches += 1
+            self.queries += len(batch)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'queries': self.queries,
+            'mean_batch_size': self.queries / self.batches if self.batches else 0.0,
+        }
@@ -0,0 +1,143 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+import numpy as np
+from src.utils.config import config
+from src.utils.logger import pipeline_logger
+from src.utils.tokens import count_tokens, truncate_tokens
+
+# Context tokens sent for the current request, bound by track_context_tokens()
+_request_usage = ContextVar('context_usage', default=None)
+
+@contextmanager
+def track_context_tokens():
+    '''
+    Counting the context tokens sent to the llm during a request
+
+    Yields:
+        usage: dict whose 'context_tokens' and 'contexts' grow with each assembled context
+    '''
+    usage = {'context_tokens': 0, 'contexts': 0}
+    token = _request_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _request_usage.reset(token)
+
+class ContextAssembler:
+    '''
+    Choosing which faq answers go into the generation prompt.
+
+    The retriever's hits are walked in distance order and one is kept only if
+    - it is within gap of the best hit's distance, so a clear winner goes alone
+    - its stored vector is not a near duplicate (cosine >= duplicate_similarity)
+      of a hit already kept
+    - it still fits in max_tokens, the first hit is truncated to fit
+    Social messages, as recognised by the intent router, get no context.
+
+    Args:
+        retriever: Retriever
+        vector_lookup: faq id -> stored embedding, KnowledgeBase.get_vector
+        intent_router: IntentRouter, optional
+        max_k: hits looked at
+        gap: largest L2 distance from the best hit that is still kept
+        duplicate_similarity: cosine from which two hits count as the same answer
+        max_tokens: token budget of the whole context
+    '''
+    def __init__(self,retriever,vector_lookup=None,intent_router=None,max_k=None,gap=None,
+                 duplicate_similarity=None,max_tokens=None):
+        self.retriever = retriever
+        self.vector_lookup = vector_lookup
+        self.intent_router = intent_router
+        self.max_k = max_k or config.CONTEXT_MAX_K
+        self.gap = gap if gap is not None else config.CONTEXT_GAP
+        self.duplicate_similarity = duplicate_similarity or config.CONTEXT_DUPLICATE_SIMILARITY
+        self.max_tokens = max_tokens or config.CONTEXT_MAX_TOKENS
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_sent = 0
+        self.tokens_candidates = 0
+        self.hits_kept = 0
+        self.hits_dropped = 0
+
+    def _vector(self,faq_id):
+        if self.vector_lookup is None:
+            return None
+        try:
+            vector = np.asarray(self.vector_lookup(faq_id), dtype='float32').reshape(-1)
+        except (KeyError, IndexError):
+            return None
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _hits(self,question):
+        distances, indices = self.retriever.search(question, self.max_k)
+        hits = []
+        with self.retriever.lock:
+            for distance, idx in zip(distances, indices):
+                idx = int(idx)
+                # faiss pads with -1 when fewer than max_k vectors are indexed
+                if idx >= 0 and self.retriever.answer_store.is_live(idx):
+                    hits.append((float(distance), idx, self.retriever.answer_store.answer(idx)))
+        return hits
+
+    def assemble(self,question):
+        '''
+        Building the context for one question
+
+        Args:
+            question: the user's question
+        Returns:
+            context: kept answers joined by newlines, '' when none
+        '''
+        try:
+            if self.intent_router is not None and self.intent_router.route(question):
+                hits = []
+            else:
+                hits = self._hits(question)
+            kept, kept_vectors, used = [], [], 0
+            for distance, idx, answer in hits:
+                if distance - hits[0][0] > self.gap:
+                    break
+                vector = self._vector(idx)
+                if vector is not None and any(float(vector @ other) >= self.duplicate_similarity
+                                              for other in kept_vectors):
+                    continue
+                tokens = count_tokens(answer)
+                if used + tokens > self.max_tokens:
+                    if kept:
+                        break
+                    answer = truncate_tokens(answer, self.max_tokens)
+                    tokens = count_tokens(answer)
+                kept.append(answer)
+                used += tokens
+                if vector is not None:
+                    kept_vectors.append(vector)
+            # What inlining every hit would have cost
+            candidates = sum(count_tokens(answer) for _, _, answer in hits)
+        except Exception as e:
+            pipeline_logger.error(f'Assembling context has failed : {e}')
+            raise RuntimeError('Assembling context has failed')
+
+        with self._lock:
+            self.requests += 1
+            self.tokens_sent += used
+            self.tokens_candidates += candidates
+            self.hits_kept += len(kept)
+            self.hits_dropped += len(hits) - len(kept)
+        usage = _request_usage.get()
+        if usage is not None:
+            usage['context_tokens'] += used
+            usage['contexts'] += 1
+        pipeline_logger.info(f'Context of {len(kept)}/{len(hits)} hits, {used}/{candidates} tokens for: {question}')
+        return '\n'.join(kept)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'tokens_sent': self.tokens_sent,
+                'tokens_candidates': self.tokens_candidates,
+                'avg_tokens_sent': self.tokens_sent / self.requests if self.requests else 0.0,
+                'hits_kept': self.hits_kept,
+                'hits_dropped': self.hits_dropped,
+            }
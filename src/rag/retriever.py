@@ -1,3 +1,10 @@
+import threading
+import numpy as np
+from src.model.query_embedder import QueryEmbedder
+from src.processing.data_index import FaissIndex
+from src.rag.batcher import RetrievalBatcher
+from src.rag.semantic_cache import is_transactional
+from src.utils.config import config
 from src.utils.logger import pipeline_logger
 
 class Retriever:
@@ -6,24 +13,163 @@ class Retriever:
     Args:
         embedding_model: all-MiniLM-L6-v2 embedding model
         index: faiss index
-        df: Faqs dataframe
+        answer_store: AnswerStore holding the faq texts by faiss id
+        lock: lock shared with whatever edits the index in place
 
     Returns:
-        relevant_ans : relevant data from the datafram
-    
+        relevant_ans : relevant answers from the answer store
+
     '''
-    def __init__(self,embedding_model,index,df):
+    def __init__(self,embedding_model,index,answer_store,lock=None):
         self.embedding_model = embedding_model
         self.index = index
-        self.df = df
+        self.answer_store = answer_store
+        self.lock = lock or threading.RLock()
+        self.direct_enabled = config.DIRECT_ANSWER_ENABLED
+        self.direct_max_distance = config.DIRECT_ANSWER_MAX_DISTANCE
+        self.direct_min_margin = config.DIRECT_ANSWER_MIN_MARGIN
+        self.direct_hits = 0
+        self.direct_misses = 0
+        self.batcher = None
+        if config.RETRIEVAL_BATCHING:
+            self.batcher = RetrievalBatcher(
+                self._search_batch,
+                max_batch_size=config.RETRIEVAL_MAX_BATCH_SIZE,
+                max_wait_ms=config.RETRIEVAL_MAX_WAIT_MS,
+            )
+
+    def _search_batch(self,queries,top_k):
+        '''
+        One batched encode of the queries given as text and one batched index search
+
+        Args:
+            queries: query texts, or their vectors when already embedded
+        '''
+        texts = [query for query in queries if isinstance(query, str)]
+        encoded = []
+        if texts:
+            encoded = np.asarray(self.embedding_model.encode(texts), dtype='float32').reshape(len(texts), -1)
+        encoded = iter(encoded)
+        embedded_queries = np.stack([
+            next(encoded) if isinstance(query, str) else np.asarray(query, dtype='float32').reshape(-1)
+            for query in queries
+        ])
+        with self.lock:
+            return FaissIndex.search(self.index, embedded_queries, top_k)
+
+    def _submit(self,query,top_k):
+        '''
+        Queueing a query on the batcher. The batcher thread never sees the request
+        context, so cached vectors are resolved here, with the per-request cache,
+        and only misses are encoded in the batch.
+        '''
+        vector = None
+        if isinstance(self.embedding_model, QueryEmbedder):
+            vector = self.embedding_model.lookup(query)
+        return self.batcher.submit(query if vector is None else vector, top_k), vector is None
+
+    def _resolved(self,query,future,encoded):
+        result = future.result()
+        if encoded and isinstance(self.embedding_model, QueryEmbedder):
+            self.embedding_model.remember(query)
+        return result
+
+    def search(self,query,top_k = 3):
+        '''
+        Searching the index for a single query, batched with concurrent callers
+
+        Returns:
+            distances: L2 distances of the hits
+            indices: faiss ids of the hits, -1 padded
+        '''
+        if self.batcher is not None:
+            return self._resolved(query, *self._submit(query, top_k))
+        distances, indices = self._search_batch([query], top_k)
+        return distances[0], indices[0]
+
+    def _answers(self,indices):
+        with self.lock:
+            # faiss pads with -1 when fewer than top_k vectors are indexed
+            return [self.answer_store.answer(idx) for idx in indices
+                    if idx >= 0 and self.answer_store.is_live(idx)]
+
+    def nearest(self,query):
+        '''
+        Nearest live faq and how clearly it wins
+
+        Returns:
+            faq_id: id of the nearest faq, None when the index is empty
+            distance: its L2 distance to the query
+            margin: distance of the runner-up minus distance, inf without one
+        '''
+        distances, indices = self.search(query, 2)
+        with self.lock:
+            hits = [(float(d), int(i)) for d, i in zip(distances, indices)
+                    if i >= 0 and self.answer_store.is_live(i)]
+        if not hits:
+            return None, float('inf'), 0.0
+        margin = hits[1][0] - hits[0][0] if len(hits) > 1 else float('inf')
+        return hits[0][1], hits[0][0], margin
+
+    def direct_answer(self,query,max_distance=None,min_margin=None):
+        '''
+        The stored faq answer verbatim when the nearest faq is a confident match
+
+        Args:
+            query: user query
+            max_distance: largest distance answered directly, config value when None
+            min_margin: smallest lead over the runner-up, config value when None
+        Returns:
+            answer: the faq answer or None when the llm should answer
+        '''
+        if not self.direct_enabled or is_transactional(query):
+            return None
+        max_distance = self.direct_max_distance if max_distance is None else max_distance
+        min_margin = self.direct_min_margin if min_margin is None else min_margin
+        try:
+            faq_id, distance, margin = self.nearest(query)
+            if faq_id is None or distance > max_distance or margin < min_margin:
+                self.direct_misses += 1
+                return None
+            with self.lock:
+                answer = self.answer_store.answer(faq_id)
+        except Exception as e:
+            pipeline_logger.error(f'Direct answer has failed : {e}')
+            raise RuntimeError('Direct answer has failed')
+        self.direct_hits += 1
+        pipeline_logger.info(f'Direct answer from faq {faq_id} (distance {distance:.3f}, margin {margin:.3f}) for: {query}')
+        return answer
+
+    def stats(self):
+        return {'direct_hits': self.direct_hits, 'direct_misses': self.direct_misses}
+
+    def retrieve_many(self,queries,top_k = 3):
+        '''
+        Retrieving the relevant answers for several queries at once
+
+        Args:
+            queries: list of user queries
+            top_k: number of answers per query
+        Returns:
+            answers: one list of answers per query
+        '''
+        try:
+            if self.batcher is not None:
+                submitted = [self._submit(query, top_k) for query in queries]
+                rows = [self._resolved(query, *item)[1] for query, item in zip(queries, submitted)]
+            else:
+                rows = self._search_batch(queries, top_k)[1]
+            return [self._answers(row) for row in rows]
+        except Exception as e:
+            pipeline_logger.error(f'Retrieving has failed : {e}')
+            raise RuntimeError('Retrieving has failed')
 
     def retriever(self,query,top_k = 3):
 
         try:
-            embedded_query = self.embedding_model.encode(query).reshape(1,-1)
-            distances, indices = self.index.search(embedded_query,top_k)
-            relevant_ans = [self.df['answer'].iloc[idx] for idx in indices[0]]
+            _, indices = self.search(query, top_k)
+            relevant_ans = self._answers(indices)
             return '\n'.join(relevant_ans)
-        
+
         except Exception as e:
-            raise RuntimeError('Retrieving has failed')
\ No newline at end of file
+            raise RuntimeError('Retrieving has failed')
@@ -0,0 +1,153 @@
+import re
+import threading
+import numpy as np
+from src.utils.cache import LRUCache, normalize_query
+from src.utils.config import config
+from src.utils.logger import pipeline_logger
+
+# Messages that may need a booking tool are never answered from the cache
+TRANSACTIONAL_PATTERN = re.compile(
+    r'\b(book|booking|appointments?|reserv\w*|cancel\w*|schedul\w*|availab\w*|slots?|meeting|'
+    r'today|tomorrow|tonight|monday|tuesday|wednesday|thursday|friday|saturday|sunday|'
+    r'\d{1,2}(:\d{2})?\s*(am|pm)|\d{1,2}:\d{2}|\d{4}-\d{2}-\d{2})\b',
+    re.IGNORECASE,
+)
+
+# Tools whose output depends only on the faq corpus
+CACHEABLE_TOOLS = {'FAQ'}
+
+def is_transactional(text):
+    return TRANSACTIONAL_PATTERN.search(text) is not None
+
+class SemanticCache:
+    '''
+    Nearest-neighbour cache of answers to previously asked faq-type questions.
+
+    Questions are embedded with the already-loaded embedding model and compared
+    by cosine similarity against the cached ones; a match above the configured
+    threshold returns the stored answer without running the agent. Entries are
+    bounded by an LRU with a ttl and the whole cache is dropped when the faq
+    corpus changes.
+
+    Args:
+        embedding_model: all-MiniLM-L6-v2 embedding model
+        knowledge_base: KnowledgeBase whose version invalidates the cache
+    '''
+    def __init__(self,embedding_model,knowledge_base=None):
+        self.embedding_model = embedding_model
+        self.knowledge_base = knowledge_base
+        self.enabled = config.SEMANTIC_CACHE_ENABLED
+        self.threshold = config.SEMANTIC_CACHE_THRESHOLD
+        self.max_size = config.SEMANTIC_CACHE_MAX_SIZE
+        self.lock = threading.RLock()
+        self.entries = LRUCache(self.max_size, ttl=config.SEMANTIC_CACHE_TTL, on_evict=self._release_slot)
+        self._vectors = None
+        self._occupied = np.zeros(self.max_size, dtype=bool)
+        self._slot_keys = [None] * self.max_size
+        self._free_slots = list(range(self.max_size - 1, -1, -1))
+        self._corpus_version = self._current_version()
+        self.hits = 0
+        self.misses = 0
+
+    def corpus_version(self):
+        return self._current_version()
+
+    def _current_version(self):
+        return self.knowledge_base.version if self.knowledge_base is not None else 0
+
+    def _release_slot(self,key,entry):
+        slot = entry[0]
+        self._occupied[slot] = False
+        self._slot_keys[slot] = None
+        self._free_slots.append(slot)
+
+    def _embed(self,question):
+        vector = np.asarray(self.embedding_model.encode(question), dtype='float32').reshape(-1)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self._occupied[:] = False
+            self._slot_keys = [None] * self.max_size
+            self._free_slots = list(range(self.max_size - 1, -1, -1))
+
+    def _check_corpus(self):
+        version = self._current_version()
+        if version != self._corpus_version:
+            pipeline_logger.info('Faq corpus changed, clearing semantic cache')
+            self.clear()
+            self._corpus_version = version
+
+    def eligible(self,question):
+        return self.enabled and not is_transactional(question)
+
+    def lookup(self,question):
+        '''
+        Returning a cached answer for a semantically equivalent question
+
+        Args:
+            question: the user's question
+        Returns:
+            answer: the cached answer or None
+        '''
+        if not self.eligible(question):
+            return None
+        vector = self._embed(question)
+        with self.lock:
+            self._check_corpus()
+            if self._vectors is None or not self._occupied.any():
+                self.misses += 1
+                return None
+            slots = np.flatnonzero(self._occupied)
+            similarities = self._vectors[slots] @ vector
+            best = int(np.argmax(similarities))
+            entry = None
+            if similarities[best] >= self.threshold:
+                # get() also drops the entry if its ttl has passed
+                entry = self.entries.get(self._slot_keys[slots[best]])
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            pipeline_logger.info(f'Semantic cache hit ({similarities[best]:.3f}) for: {question}')
+            return entry[1]
+
+    def store(self,question,answer,tools_used=(),corpus_version=None):
+        '''
+        Caching an answer produced by the agent
+
+        Args:
+            question: the user's question
+            answer: the agent's final answer
+            tools_used: names of the tools the agent called for this answer, only answers
+                that called the FAQ tool and nothing else are cached
+            corpus_version: corpus version the answer was generated against
+        '''
+        # At least one faq lookup and nothing else, an answer without a tool came from the
+        # chat itself (or the iteration limit) and must not be served to other users
+        tools_used = set(tools_used)
+        if not self.eligible(question) or not answer or not tools_used or not tools_used <= CACHEABLE_TOOLS:
+            return
+        key = normalize_query(question)
+        vector = self._embed(question)
+        with self.lock:
+            self._check_corpus()
+            if corpus_version is not None and corpus_version != self._corpus_version:
+                return
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, vector.shape[0]), dtype='float32')
+            entry = self.entries.peek(key)
+            if entry is not None:
+                slot = entry[0]
+            else:
+                if not self._free_slots:
+                    self.entries.evict_oldest()
+                slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._occupied[slot] = True
+            self._slot_keys[slot] = key
+            self.entries.set(key, (slot, answer))
+
+    def stats(self):
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
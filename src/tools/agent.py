@@ -1,13 +1,50 @@
-import re
-import faiss
-import numpy as np
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-from langchain_openai import ChatOpenAI
 from langchain.agents import create_react_agent, AgentExecutor
-from langchain import hub
+from langchain_core.prompts import PromptTemplate
 from langchain.tools import Tool
-import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from src.tools.prompts import REACT_TEMPLATE
+
+FINAL_ANSWER_MARKER = 'Final Answer:'
+
+# User, chat and client idempotency key the booking tools act on, bound per request by agent_context()
+current_user_id = ContextVar('current_user_id', default=None)
+current_chat_id = ContextVar('current_chat_id', default=None)
+current_request_key = ContextVar('current_request_key', default=None)
+
+@contextmanager
+def agent_context(user_id, chat_id, request_key=None):
+    '''Binding the user, chat and idempotency key for the agent run in the current context'''
+    user_token = current_user_id.set(user_id)
+    chat_token = current_chat_id.set(chat_id)
+    key_token = current_request_key.set(request_key)
+    try:
+        yield
+    finally:
+        current_request_key.reset(key_token)
+        current_chat_id.reset(chat_token)
+        current_user_id.reset(user_token)
+
+class FinalAnswerFilter:
+    '''Passing through only the text a ReAct generation writes after "Final Answer:"'''
+    def __init__(self):
+        self.buffer = ''
+        self.position = None
+        self.started = False
+
+    def feed(self, text):
+        self.buffer += text
+        if self.position is None:
+            marker = self.buffer.find(FINAL_ANSWER_MARKER)
+            if marker < 0:
+                return ''
+            self.position = marker + len(FINAL_ANSWER_MARKER)
+        new_text = self.buffer[self.position:]
+        self.position = len(self.buffer)
+        if not self.started:
+            new_text = new_text.lstrip()
+            self.started = bool(new_text)
+        return new_text
 
 class LumiAgent:
     def __init__(self, llm, retriever, generator, appointment_manager):
@@ -16,49 +53,87 @@ class LumiAgent:
         self.generator = generator
         self.appointment_manager = appointment_manager
     
-    def init_agent(self, user_id=None, chat_id=None):
-        async def faq_tool(query):
-            return await self.generator.generator(query)
-        self.tools = [
+        # Callers without conversation memory can leave chat_history out
+        self.prompt = PromptTemplate.from_template(REACT_TEMPLATE).partial(chat_history='')
+        self.tools = self._build_tools()
+        self.agent_executor = None
 
+    def _build_tools(self):
+        manager = self.appointment_manager
+        return [
             Tool(
                 name="FAQ",
-                func=lambda q: self.generator.generator(q),
+                func=self.generator.generator,
                 description="""USE THIS FOR: services,contact info , questions about company, product info.
                 Input MUST BE DIRECT QUESTION ABOUT the company or greetings, frarwll or thanking.
                 NEVER USE THIS FOR: Appointments, bookings, or time-related queries."""
             ),
             Tool(
                 name="CheckAvailability",
-                func=lambda q: self.appointment_manager.check_available_slots_wrapper(q),
+                func=manager.check_available_slots_wrapper,
+                coroutine=manager.acheck_available_slots_wrapper,
                 description="Useful for checking available appointment slots. Input should mention a date/time."
             ),
             Tool(
                 name="BookAppointment",
-                func=lambda q: self.appointment_manager.book_appointment_wrapper(q, user_id, chat_id),
+                func=lambda q: manager.book_appointment_wrapper(q, current_user_id.get(), current_chat_id.get(),
+                                                                current_request_key.get()),
+                coroutine=lambda q: manager.abook_appointment_wrapper(q, current_user_id.get(), current_chat_id.get(),
+                                                                      current_request_key.get()),
                 description="Useful for booking appointments. Input must include specific date or time."
             ),
             Tool(
                 name="CancelAppointment",
-                func=lambda q: self.appointment_manager.cancel_appointment_wrapper(q, user_id),
+                func=lambda q: manager.cancel_appointment_wrapper(q, current_user_id.get()),
+                coroutine=lambda q: manager.acancel_appointment_wrapper(q, current_user_id.get()),
                 description="Useful for canceling appointments. Input must include date and time."
             ),
             Tool(
                 name="ViewReservations",
-                func=lambda _: self.appointment_manager.get_user_reservations(user_id),
+                func=lambda _: manager.view_reservations_wrapper(current_user_id.get()),
+                coroutine=lambda _: manager.aview_reservations_wrapper(current_user_id.get()),
                 description="Useful for viewing existing reservations."
             )
         ]
-        self.prompt = hub.pull("hwchase17/react")
 
-        # Create the agent
-        self.agent = create_react_agent(self.llm, self.tools, self.prompt)
-        self.agent_executor = AgentExecutor(
-            agent=self.agent,
-            tools=self.tools,
-            verbose=True,
-            handle_parsing_errors=True,
-            max_iterations=10,
-        )
+    def init_agent(self):
+        '''
+        Building the agent executor, once per process
+
+        The executor is shared by all requests, run it inside agent_context()
+        so the booking tools know which user and chat they act on.
+        '''
+        if self.agent_executor is None:
+            self.agent = create_react_agent(self.llm, self.tools, self.prompt)
+            self.agent_executor = AgentExecutor(
+                agent=self.agent,
+                tools=self.tools,
+                verbose=True,
+                handle_parsing_errors=True,
+                max_iterations=10,
+                return_intermediate_steps=True,
+            )
+        return self.agent_executor
+
+    async def astream(self, agent_executor, inputs):
+        '''
+        Running the agent while yielding progress as it happens
 
-        return self.agent_executor
\ No newline at end of file
+        Yields:
+            ('status', {'tool': name}) when a tool starts
+            ('token', text) for each piece of the final answer
+            ('final', response) with the executor output once it finishes
+        '''
+        filters = {}
+        async for event in agent_executor.astream_events(inputs, version="v2"):
+            kind = event['event']
+            if kind == 'on_tool_start':
+                yield 'status', {'tool': event['name']}
+            elif kind == 'on_chat_model_stream':
+                chunk = event['data']['chunk'].content
+                if chunk:
+                    text = filters.setdefault(event['run_id'], FinalAnswerFilter()).feed(chunk)
+                    if text:
+                        yield 'token', text
+            elif kind == 'on_chain_end' and not event.get('parent_ids'):
+                yield 'final', event['data']['output']
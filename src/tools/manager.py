@@ -1,15 +1,135 @@
 from langchain_core.prompts import PromptTemplate
 from datetime import datetime, timedelta
+from itertools import groupby
 from src.utils.helper import enhance_response
-from src.utils.db import db_loader
+from src.tools.temporal import TemporalParser
+from src.tools.slot_index import SlotLocks
+from src.utils.setting import Reservation
+from src.utils.db import db_loader, async_db_loader
 from src.utils.logger import manager_logger
-from sqlalchemy import text
-from sqlalchemy.exc import OperationalError
+from sqlalchemy import text, bindparam
+from sqlalchemy.exc import DBAPIError, IntegrityError
+import asyncio
+import json
+import random
+import re
 import time
 
+# Statements shared by the sync and async code paths
+
+# Free slots over every candidate day of a request in one round trip
+AVAILABLE_SLOTS_SQL = text("""
+    SELECT day, time FROM appointments
+    WHERE day IN :days
+    AND is_booked = FALSE
+    AND (day > CURRENT_DATE OR (day = CURRENT_DATE AND time > CURRENT_TIME))
+    ORDER BY day, time
+""").bindparams(bindparam("days", expanding=True))
+
+# Claiming a free slot and inserting its reservation in one statement. A
+# reservation already holding the client's idempotency key is returned instead,
+# so a retried request reports the first booking rather than making a second one.
+# Without a key (NULL) nothing is ever replayed.
+CLAIM_SLOT_SQL = text("""
+    WITH existing AS (
+        SELECT reservation_id, day, time FROM reservations
+        WHERE idempotency_key = :idempotency_key
+    ), claimed AS (
+        UPDATE appointments SET is_booked = TRUE
+        WHERE day = :day AND time = :time AND is_booked = FALSE
+        AND NOT EXISTS (SELECT 1 FROM existing)
+        RETURNING appoin_id, day, time
+    ), inserted AS (
+        INSERT INTO reservations (user_id, chat_id, appoin_id, day, time, idempotency_key)
+        SELECT :user_id, :chat_id, appoin_id, day, time, :idempotency_key FROM claimed
+        RETURNING reservation_id, day, time
+    )
+    SELECT reservation_id, day, time, FALSE AS replayed FROM inserted
+    UNION ALL
+    SELECT reservation_id, day, time, TRUE AS replayed FROM existing
+""")
+
+# Same as CLAIM_SLOT_SQL for the earliest free slot of a day, skipping slots
+# other transactions are busy claiming instead of queueing behind them
+CLAIM_FIRST_FREE_SLOT_SQL = text("""
+    WITH existing AS (
+        SELECT reservation_id, day, time FROM reservations
+        WHERE idempotency_key = :idempotency_key
+    ), candidate AS (
+        SELECT appoin_id FROM appointments
+        WHERE day = :day AND is_booked = FALSE
+        AND (day > CURRENT_DATE OR (day = CURRENT_DATE AND time > CURRENT_TIME))
+        AND NOT EXISTS (SELECT 1 FROM existing)
+        ORDER BY time
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    ), claimed AS (
+        UPDATE appointments a SET is_booked = TRUE
+        FROM candidate c
+        WHERE a.appoin_id = c.appoin_id
+        RETURNING a.appoin_id, a.day, a.time
+    ), inserted AS (
+        INSERT INTO reservations (user_id, chat_id, appoin_id, day, time, idempotency_key)
+        SELECT :user_id, :chat_id, appoin_id, day, time, :idempotency_key FROM claimed
+        RETURNING reservation_id, day, time
+    )
+    SELECT reservation_id, day, time, FALSE AS replayed FROM inserted
+    UNION ALL
+    SELECT reservation_id, day, time, TRUE AS replayed FROM existing
+""")
+
+FIND_BOOKING_SQL = text("""
+    SELECT reservation_id, day, time, TRUE AS replayed FROM reservations
+    WHERE idempotency_key = :idempotency_key
+""")
+
+# Messages asking for whatever slot is free on a day
+ANY_TIME_PATTERN = re.compile(r"\b(any ?time|any slot|earliest|first (available|free|open)|whenever)\b", re.IGNORECASE)
+
+FIND_APPOINTMENT_SQL = text("""
+    SELECT appoin_id FROM appointments
+    WHERE day = :day AND time = :time
+""")
+
+# Deleting the reservation and freeing its slot in one statement
+CANCEL_RESERVATION_SQL = text("""
+    WITH cancelled AS (
+        DELETE FROM reservations r
+        USING appointments a
+        WHERE r.appoin_id = a.appoin_id
+        AND r.user_id = :user_id AND a.day = :day AND a.time = :time
+        RETURNING r.appoin_id
+    )
+    UPDATE appointments SET is_booked = FALSE
+    WHERE appoin_id IN (SELECT appoin_id FROM cancelled)
+    RETURNING appoin_id
+""")
+
+# A user's reservations in (day, time) order, one page at a time
+USER_RESERVATIONS_SQL = text("""
+    SELECT reservation_id, day, time FROM reservations
+    WHERE user_id = :user_id
+    ORDER BY day, time
+    LIMIT :limit
+""")
+
+USER_RESERVATIONS_AFTER_SQL = text("""
+    SELECT reservation_id, day, time FROM reservations
+    WHERE user_id = :user_id
+    AND (day, time) > (:after_day, :after_time)
+    ORDER BY day, time
+    LIMIT :limit
+""")
+
+RESERVATIONS_PAGE_SIZE = 50
+
 class AppointmentManager:
-    def __init__(self, llm=None):
+    def __init__(self, llm=None, slot_index=None):
         self.llm = llm
+        self.slot_index = slot_index
+        # Shared with the index so its write-through follows commit order
+        self.slot_locks = slot_index.slot_locks if slot_index is not None else SlotLocks()
+        self.temporal_parser = TemporalParser()
         self.slot_prompt = PromptTemplate(
             input_variables=["query", "today"],
             template="""You are a helpful assistant that extracts date and time info from user input. Today's date is {today} (e.g., Friday, 2025-04-25)
@@ -22,14 +142,60 @@ class AppointmentManager:
             """
         )
     
-    def extract_day_time(self, query: str) -> dict:
+    def extract_day_time(self, query: str, need_day: bool = False) -> dict:
+        parsed = self.temporal_parser.parse(query)
+        resolved = self._rule_day_time(query, parsed, need_day)
+        if resolved is not None:
+            return resolved
         today_str = datetime.today().strftime("%A, %Y-%m-%d")
         chain = self.slot_prompt | self.llm
         result = chain.invoke({"query": query, "today": today_str})
+        return self._merge_day_time(self._parse_day_time(result), parsed)
+
+    async def aextract_day_time(self, query: str, need_day: bool = False) -> dict:
+        parsed = self.temporal_parser.parse(query)
+        resolved = self._rule_day_time(query, parsed, need_day)
+        if resolved is not None:
+            return resolved
+        today_str = datetime.today().strftime("%A, %Y-%m-%d")
+        chain = self.slot_prompt | self.llm
+        result = await chain.ainvoke({"query": query, "today": today_str})
+        return self._merge_day_time(self._parse_day_time(result), parsed)
+
+    def _rule_day_time(self, query: str, parsed: dict, need_day: bool):
+        '''
+        Day and time from the rule-based parser, None when the llm has to decide
+
+        Args:
+            query: the user's message
+            parsed: output of TemporalParser.parse for the query
+            need_day: the caller cannot go on without a day, e.g. "the 3rd at 2pm"
+                or "in two weeks at 10am" only give the rules the time
+        '''
+        missing = parsed["day"] is None and (need_day or parsed["time"] is None)
+        if parsed["ambiguous"] or (missing and self.llm is not None):
+            manager_logger.info(f"Temporal rules could not resolve '{query}', asking the llm")
+            return None
+        manager_logger.info(f"Temporal rules resolved '{query}' to {parsed['day']} {parsed['time']}")
+        return {"day": parsed["day"], "time": parsed["time"]}
+
+    def _merge_day_time(self, extracted: dict, parsed: dict) -> dict:
+        '''The llm's answer, keeping the time the rules found when the llm gave none'''
+        if extracted["time"] is None and not parsed["ambiguous"]:
+            extracted["time"] = parsed["time"]
+        return extracted
+
+    def _parse_day_time(self, result) -> dict:
         manager_logger.info(f"[DEBUG] Raw LLM output: {result.content.strip()}")
         try:
             manager_logger.info("Extracting time from query...")
-            parsed = eval(result.content.strip())
+            content = result.content.strip()
+            if content.startswith("```"):
+                # Models sometimes wrap the object in a markdown code fence
+                content = content.strip("`").removeprefix("json").strip()
+            parsed = json.loads(content)
+            if not isinstance(parsed, dict):
+                raise ValueError(f"expected a JSON object, got {type(parsed).__name__}")
             manager_logger.info("Extracting time done...")
             return {
                 "day": self.normalize_date(parsed.get("day")),
@@ -44,24 +210,35 @@ class AppointmentManager:
             parsed_date = datetime.strptime(day_str, "%Y-%m-%d")
             return parsed_date.strftime("%Y-%m-%d")
         except:
-            return None
+            # "tomorrow", "Sunday" and the like, as the prompt allows
+            return self.temporal_parser.parse_day(day_str)
 
     def normalize_time(self, time_str):
         try:
             parsed_time = datetime.strptime(time_str.strip(), "%H:%M")
             return parsed_time.strftime("%H:%M")
         except:
-            return None
+            return self.temporal_parser.parse_time(time_str)
 
     def check_available_slots(self, query: str):
         parsed = self.extract_day_time(query)
-        day_pattern = parsed["day"]
-        time_pattern = parsed["time"]
+        days = self._candidate_dates(parsed["day"])
+        if self.slot_index is not None and self.slot_index.covers(days):
+            return self.slot_index.available(days)
+        with db_loader() as session:
+            result = session.execute(AVAILABLE_SLOTS_SQL, {"days": days})
+            rows = result.fetchall()
+        return self._group_slots(rows)
 
-        if self._is_specific_date(day_pattern):
-            return self._check_specific_date(day_pattern, time_pattern)
-        else:
-            return self._check_recurring_pattern(day_pattern, time_pattern)
+    async def acheck_available_slots(self, query: str):
+        parsed = await self.aextract_day_time(query)
+        days = self._candidate_dates(parsed["day"])
+        if self.slot_index is not None and self.slot_index.covers(days):
+            return self.slot_index.available(days)
+        async with async_db_loader() as session:
+            result = await session.execute(AVAILABLE_SLOTS_SQL, {"days": days})
+            rows = result.fetchall()
+        return self._group_slots(rows)
 
     def _is_specific_date(self, day_str):
         try:
@@ -70,166 +247,268 @@ class AppointmentManager:
         except:
             return False
 
-    def _check_specific_date(self, target_date, target_time):
-        manager_logger.info(f"[DEBUG] Checking slots for: {target_date}")
-        with db_loader() as session:
-            result = session.execute(
-                text("""
-                    SELECT time FROM appointments 
-                    WHERE day = :day 
-                    AND is_booked = FALSE 
-                    ORDER BY time
-                """),
-                {"day": target_date}
-            )
-            slots = [r[0].strftime("%H:%M") for r in result.fetchall()]
-        manager_logger.info(f"[DEBUG] Found {len(slots)} slots: {slots}")
-        return [(target_date, slots)]
-
-    def _check_recurring_pattern(self, day_pattern, target_time):
+    def _candidate_dates(self, day_pattern):
+        '''Dates a day pattern can refer to, any of the next 14 days when none was given'''
+        if self._is_specific_date(day_pattern):
+            return [self._as_date(day_pattern)]
         today = datetime.today().date()
-        matches = []
-        for delta in range(0, 14):
-            current_date = today + timedelta(days=delta)
-            current_weekday = current_date.strftime("%A").lower()
-            if day_pattern.lower() in current_weekday:
-                date_str = current_date.strftime("%Y-%m-%d")
-                with db_loader() as session:
-                    result = session.execute(
-                        text("""
-                            SELECT time FROM appointments 
-                            WHERE day = :day 
-                            AND is_booked = FALSE 
-                            AND time > CURRENT_TIME
-                        """),
-                        {"day": date_str}
-                    )
-                    slots = [r[0].strftime("%H:%M") for r in result.fetchall()]
-                    if slots:
-                        matches.append((date_str, slots))
+        window = [today + timedelta(days=delta) for delta in range(0, 14)]
+        if not day_pattern:
+            return window
+        return [d for d in window if day_pattern.lower() in d.strftime("%A").lower()]
+
+    def _group_slots(self, rows):
+        '''Turning (day, time) rows ordered by day into [(date_str, [times])]'''
+        matches = [
+            (day.strftime("%Y-%m-%d"), [t.strftime("%H:%M") for _, t in day_rows])
+            for day, day_rows in groupby(rows, key=lambda row: row[0])
+        ]
+        manager_logger.info(f"[DEBUG] Found slots on {len(matches)} days")
         return matches
-    
-    def book_appointment(self, user_id: str, chat_id: str, day: str, time_str: str, retries=3, delay=0.5):
+
+    @staticmethod
+    def _as_date(day_str):
+        return datetime.strptime(day_str, "%Y-%m-%d").date()
+
+    @staticmethod
+    def _as_time(time_str):
+        return datetime.strptime(time_str, "%H:%M").time()
+
+    def _mark_booked(self, day, time_str):
+        if self.slot_index is not None:
+            self.slot_index.mark_booked(day, time_str)
+
+    def _mark_free(self, day, time_str):
+        if self.slot_index is not None:
+            self.slot_index.mark_free(day, time_str)
+
+    def _claim_params(self, user_id, chat_id, day, time_str=None, request_key=None):
+        '''
+        Statement parameters. The idempotency key is the client's key of the message
+        being answered, scoped to the user and the slot asked for, so separate
+        messages never collide and one message can still book several slots.
+        '''
+        return {
+            "user_id": user_id,
+            "chat_id": chat_id,
+            "day": self._as_date(day),
+            "time": self._as_time(time_str) if time_str else None,
+            "idempotency_key": f"{user_id}:{request_key}:{day}:{time_str or 'any'}" if request_key else None,
+        }
+
+    @staticmethod
+    def _is_retryable(error):
+        message = str(error).lower()
+        return "deadlock" in message or "could not serialize" in message
+
+    @staticmethod
+    def _backoff(delay, attempt):
+        '''Exponential backoff with full jitter, so racing requests spread out'''
+        return random.uniform(0, delay * 2 ** attempt)
+
+    def _booking_result(self, row, day, time_str=None):
+        if row is None:
+            if time_str:
+                # The index may still think the slot is free
+                self._mark_booked(day, time_str)
+                return f"Sorry, {time_str} on {day} is not available."
+            return f"Sorry, there are no free slots left on {day}."
+        booked_day, booked_time = row[1].strftime("%Y-%m-%d"), row[2].strftime("%H:%M")
+        if row[3]:
+            return f"You already have an appointment booked for {booked_day} at {booked_time}."
+        self._mark_booked(booked_day, booked_time)
+        resp = f"Your appointment has been booked for {booked_day} at {booked_time}!"
+        return resp
+
+    def _claim(self, statement, params, retries, delay):
         for attempt in range(retries):
             try:
                 with db_loader() as session:
-                    # Check availability and lock row
-                    result = session.execute(
-                        text("""
-                            SELECT appoin_id FROM appointments
-                            WHERE day = :day AND time = :time AND is_booked = FALSE
-                            FOR UPDATE
-                        """),
-                        {"day": day, "time": time_str}
-                    ).fetchone()
-                    if not result:
-                        return f"Sorry, {time_str} on {day} is not available."
-
-                    appoin_id = result[0]
-                    # Update appointments
-                    session.execute(
-                        text("UPDATE appointments SET is_booked = TRUE WHERE appoin_id = :appoin_id"),
-                        {"appoin_id": appoin_id}
-                    )
-                    # Insert reservation
-                    session.execute(
-                        text("""
-                            INSERT INTO reservations (user_id, chat_id, appoin_id, day, time)
-                            VALUES (:user_id, :chat_id, :appoin_id, :day, :time)
-                        """),
-                        {"user_id": user_id, "chat_id": chat_id, "appoin_id": appoin_id, "day": day, "time" : time_str}
-                    )
+                    row = session.execute(statement, params).fetchone()
                     session.commit()
-                    resp = f"Your appointment has been booked for {day} at {time_str}!"
-                    return resp
-            except OperationalError as e:
-                if "deadlock" in str(e).lower() and attempt < retries - 1:
-                    manager_logger.warning(f"Deadlock detected, retrying {attempt + 1}/{retries}...")
-                    time.sleep(delay)
-                    continue
-                manager_logger.error(f"Booking failed: {e}")
-                return "Failed to book appointment due to database error. Please try again later."
-            except Exception as e:
-                manager_logger.error(f"Booking failed: {e}")
-                return f"Failed to book appointment: {str(e)}"
-        return "Failed to book appointment after retries. Please try again later."
+                    if row is None and params["idempotency_key"]:
+                        # A request with the same key may have claimed the slot after this statement's snapshot
+                        row = session.execute(FIND_BOOKING_SQL, params).fetchone()
+                return row
+            except IntegrityError:
+                # A concurrent retry with the same key inserted first
+                with db_loader() as session:
+                    return session.execute(FIND_BOOKING_SQL, params).fetchone()
+            except DBAPIError as e:
+                if not self._is_retryable(e) or attempt == retries - 1:
+                    raise
+                wait = self._backoff(delay, attempt)
+                manager_logger.warning(f"Booking conflict, retrying {attempt + 1}/{retries} in {wait:.3f}s...")
+                time.sleep(wait)
 
-    def cancel_appointment(self, user_id: str, day: str, time: str):
-        with db_loader() as session:
-            # Find appointment
-            result = session.execute(
-                text("""
-                    SELECT appoin_id FROM appointments
-                    WHERE day = :day AND time = :time
-                """),
-                {"day": day, "time": time}
-            ).fetchone()
-            if not result:
-                resp = "No such appointment found."
-                return resp
+    async def _aclaim(self, statement, params, retries, delay):
+        for attempt in range(retries):
+            try:
+                async with async_db_loader() as session:
+                    row = (await session.execute(statement, params)).fetchone()
+                    await session.commit()
+                    if row is None and params["idempotency_key"]:
+                        row = (await session.execute(FIND_BOOKING_SQL, params)).fetchone()
+                return row
+            except IntegrityError:
+                async with async_db_loader() as session:
+                    return (await session.execute(FIND_BOOKING_SQL, params)).fetchone()
+            except DBAPIError as e:
+                if not self._is_retryable(e) or attempt == retries - 1:
+                    raise
+                wait = self._backoff(delay, attempt)
+                manager_logger.warning(f"Booking conflict, retrying {attempt + 1}/{retries} in {wait:.3f}s...")
+                await asyncio.sleep(wait)
 
-            appoin_id = result[0]
-            # Check reservation
-            result = session.execute(
-                text("""
-                    SELECT reservation_id FROM reservations
-                    WHERE user_id = :user_id AND appoin_id = :appoin_id
-                """),
-                {"user_id": user_id, "appoin_id": appoin_id}
-            ).fetchone()
-            if not result:
-                resp = "You don't have a reservation at that time."
-                return resp
+    def book_appointment(self, user_id: str, chat_id: str, day: str, time_str: str, request_key=None, retries=3, delay=0.05):
+        params = self._claim_params(user_id, chat_id, day, time_str, request_key)
+        try:
+            # Requests for the same slot queue here rather than on the row lock
+            with self.slot_locks.lock_slot(day, time_str):
+                row = self._claim(CLAIM_SLOT_SQL, params, retries, delay)
+                return self._booking_result(row, day, time_str)
+        except DBAPIError as e:
+            manager_logger.error(f"Booking failed: {e}")
+            return "Failed to book appointment due to database error. Please try again later."
+        except Exception as e:
+            manager_logger.error(f"Booking failed: {e}")
+            return f"Failed to book appointment: {str(e)}"
+
+    async def abook_appointment(self, user_id: str, chat_id: str, day: str, time_str: str, request_key=None, retries=3, delay=0.05):
+        params = self._claim_params(user_id, chat_id, day, time_str, request_key)
+        try:
+            async with self.slot_locks.alock_slot(day, time_str):
+                row = await self._aclaim(CLAIM_SLOT_SQL, params, retries, delay)
+                return self._booking_result(row, day, time_str)
+        except DBAPIError as e:
+            manager_logger.error(f"Booking failed: {e}")
+            return "Failed to book appointment due to database error. Please try again later."
+        except Exception as e:
+            manager_logger.error(f"Booking failed: {e}")
+            return f"Failed to book appointment: {str(e)}"
+
+    def book_first_available(self, user_id: str, chat_id: str, day: str, request_key=None, retries=3, delay=0.05):
+        params = self._claim_params(user_id, chat_id, day, request_key=request_key)
+        try:
+            row = self._claim(CLAIM_FIRST_FREE_SLOT_SQL, params, retries, delay)
+            return self._booking_result(row, day)
+        except Exception as e:
+            manager_logger.error(f"Booking failed: {e}")
+            return "Failed to book appointment due to database error. Please try again later."
 
-            # Delete reservation and update appointment
-            session.execute(
-                text("""
-                    DELETE FROM reservations
-                    WHERE user_id = :user_id AND appoin_id = :appoin_id
-                """),
-                {"user_id": user_id, "appoin_id": appoin_id}
-            )
-            session.execute(
-                text("""
-                    UPDATE appointments SET is_booked = FALSE
-                    WHERE appoin_id = :appoin_id
-                """),
-                {"appoin_id": appoin_id}
-            )
+    async def abook_first_available(self, user_id: str, chat_id: str, day: str, request_key=None, retries=3, delay=0.05):
+        params = self._claim_params(user_id, chat_id, day, request_key=request_key)
+        try:
+            row = await self._aclaim(CLAIM_FIRST_FREE_SLOT_SQL, params, retries, delay)
+            return self._booking_result(row, day)
+        except Exception as e:
+            manager_logger.error(f"Booking failed: {e}")
+            return "Failed to book appointment due to database error. Please try again later."
+
+    def cancel_appointment(self, user_id: str, day: str, time: str):
+        params = {"user_id": user_id, "day": self._as_date(day), "time": self._as_time(time)}
+        with self.slot_locks.lock_slot(day, time), db_loader() as session:
+            cancelled = session.execute(CANCEL_RESERVATION_SQL, params).fetchall()
             session.commit()
+            if not cancelled:
+                # Only the failure path pays for telling the two errors apart
+                exists = session.execute(FIND_APPOINTMENT_SQL, params).fetchone()
+                return self._cancel_failure(exists)
+            self._mark_free(day, time)
+
+        resp = f"Your appointment on {day} at {time} has been cancelled."
+        return resp
+
+    async def acancel_appointment(self, user_id: str, day: str, time: str):
+        params = {"user_id": user_id, "day": self._as_date(day), "time": self._as_time(time)}
+        async with self.slot_locks.alock_slot(day, time), async_db_loader() as session:
+            cancelled = (await session.execute(CANCEL_RESERVATION_SQL, params)).fetchall()
+            await session.commit()
+            if not cancelled:
+                exists = (await session.execute(FIND_APPOINTMENT_SQL, params)).fetchone()
+                return self._cancel_failure(exists)
+            self._mark_free(day, time)
 
         resp = f"Your appointment on {day} at {time} has been cancelled."
         return resp
+
+    def _cancel_failure(self, appointment_exists):
+        if not appointment_exists:
+            resp = "No such appointment found."
+            return resp
+        resp = "You don't have a reservation at that time."
+        return resp
     
-    def get_user_reservations(self, user_id: str):
+    def _reservations_query(self, user_id, after, limit):
+        params = {"user_id": user_id, "limit": limit}
+        if after is None:
+            return USER_RESERVATIONS_SQL, params
+        after_day, after_time = after
+        params.update(after_day=self._as_date(after_day), after_time=self._as_time(after_time))
+        return USER_RESERVATIONS_AFTER_SQL, params
+
+    def get_user_reservations(self, user_id: str, after=None, limit=RESERVATIONS_PAGE_SIZE):
+        '''
+        Listing a user's reservations
+
+        Args:
+            user_id: the user
+            after: (day, time) of the last reservation of the previous page
+            limit: page size
+        Returns:
+            reservations: list of Reservation ordered by day and time
+        '''
+        statement, params = self._reservations_query(user_id, after, limit)
         with db_loader() as session:
-            result = session.execute(
-                text("""
-                    SELECT a.day, a.time
-                    FROM reservations r
-
-                    JOIN appointments a ON r.appoin_id = a.appoin_id
-                    WHERE r.user_id = :user_id
-                    ORDER BY a.day, a.time
-                """),
-                {"user_id": user_id}
-            )
-            results = result.fetchall()
+            results = session.execute(statement, params).fetchall()
+        return self._reservation_records(results)
 
-        if not results:
+    async def aget_user_reservations(self, user_id: str, after=None, limit=RESERVATIONS_PAGE_SIZE):
+        statement, params = self._reservations_query(user_id, after, limit)
+        async with async_db_loader() as session:
+            results = (await session.execute(statement, params)).fetchall()
+        return self._reservation_records(results)
+
+    def _reservation_records(self, results):
+        return [
+            Reservation(reservation_id=r, day=d.strftime("%Y-%m-%d"), time=t.strftime("%H:%M"))
+            for r, d, t in results
+        ]
+
+    def _format_reservations(self, reservations):
+        if not reservations:
             resp = "You have no current reservations."
             return resp
 
-        resp = "Your reservations:\n" + "\n".join([f"- {d} at {t.strftime('%H:%M')}" for d, t in results])
+        resp = "Your reservations:\n" + "\n".join([f"- {r.day} at {r.time}" for r in reservations])
+        if len(reservations) == RESERVATIONS_PAGE_SIZE:
+            resp += f"\n(showing the first {RESERVATIONS_PAGE_SIZE})"
         return resp
+
+    def view_reservations_wrapper(self, user_id: str) -> str:
+        return self._format_reservations(self.get_user_reservations(user_id))
+
+    async def aview_reservations_wrapper(self, user_id: str) -> str:
+        return self._format_reservations(await self.aget_user_reservations(user_id))
     
-    def book_appointment_wrapper(self, query: str, user_id: str, chat_id: str) -> str:
+    def _ask_for_date(self, day, action):
+        '''Weekday names ("mondays", "every friday") cannot be booked or cancelled as they are'''
+        example = datetime.today().strftime("%Y-%m-%d")
+        resp = (f"Which date do you mean for {day.capitalize()}? "
+                f"Please give the exact date of the appointment you want to {action}, e.g. {example}.")
+        return resp
+
+    def book_appointment_wrapper(self, query: str, user_id: str, chat_id: str, request_key=None) -> str:
         try:
             manager_logger.info(f'Booking appointment for user {user_id}')
-            parsed = self.extract_day_time(query)
+            parsed = self.extract_day_time(query, need_day=True)
             day, time = parsed["day"], parsed["time"]
+            if day and not self._is_specific_date(day):
+                return self._ask_for_date(day, "book")
             if day and time:
-                return self.book_appointment(user_id, chat_id, day=day, time_str=time, retries=3, delay=0.5)
+                return self.book_appointment(user_id, chat_id, day=day, time_str=time, request_key=request_key)
+            elif day and ANY_TIME_PATTERN.search(query):
+                return self.book_first_available(user_id, chat_id, day=day, request_key=request_key)
             else:
                 resp = "Please provide both day and time to book an appointment."
                 return resp
@@ -238,37 +517,80 @@ class AppointmentManager:
             print(f"[ERROR] booking failed: {str(e)}")
             return "Failed to book appointment. Please try again."
 
+    async def abook_appointment_wrapper(self, query: str, user_id: str, chat_id: str, request_key=None) -> str:
+        try:
+            manager_logger.info(f'Booking appointment for user {user_id}')
+            parsed = await self.aextract_day_time(query, need_day=True)
+            day, time = parsed["day"], parsed["time"]
+            if day and not self._is_specific_date(day):
+                return self._ask_for_date(day, "book")
+            if day and time:
+                return await self.abook_appointment(user_id, chat_id, day=day, time_str=time, request_key=request_key)
+            elif day and ANY_TIME_PATTERN.search(query):
+                return await self.abook_first_available(user_id, chat_id, day=day, request_key=request_key)
+            else:
+                resp = "Please provide both day and time to book an appointment."
+                return resp
+        except Exception as e:
+            manager_logger.error(f'Failed to book appointment: {e}')
+            return "Failed to book appointment. Please try again."
+
     def cancel_appointment_wrapper(self, query: str, user_id: str) -> str:
-        parsed = self.extract_day_time(query)
+        parsed = self.extract_day_time(query, need_day=True)
         day, time = parsed["day"], parsed["time"]
+        if day and not self._is_specific_date(day):
+            return self._ask_for_date(day, "cancel")
         if day and time:
             return self.cancel_appointment(user_id=user_id, day=day, time=time)
         else:
             resp = "Please provide the day and time of the appointment you wish to cancel."
             return resp
 
+    async def acancel_appointment_wrapper(self, query: str, user_id: str) -> str:
+        parsed = await self.aextract_day_time(query, need_day=True)
+        day, time = parsed["day"], parsed["time"]
+        if day and not self._is_specific_date(day):
+            return self._ask_for_date(day, "cancel")
+        if day and time:
+            return await self.acancel_appointment(user_id=user_id, day=day, time=time)
+        else:
+            resp = "Please provide the day and time of the appointment you wish to cancel."
+            return resp
+
     def check_available_slots_wrapper(self, query: str) -> str:
         try:
             manager_logger.info("Checking available slots...")
             results = self.check_available_slots(query)
-            if not results:
-                resp = "No available appointments found."
-                return resp
-            
-            response = []
-            for date_str, slots in results:
-                if not slots:
-                    continue
-                human_date = datetime.strptime(date_str, "%Y-%m-%d").strftime("%A, %b %d")
-                response.append(f"Available on {human_date}:")
-                response.extend([f"- {t}" for t in sorted(slots)])
-            if response:
-                resp = "\n".join(response)
-                return resp
-            else:
-                resp = "No slots found."
-                return resp
+            return self._format_slots(results)
         except Exception as e:
             manager_logger.error(f'Failed to check slots: {e}')
             print(f"[ERROR] Slot check failed: {str(e)}")
-            return "Failed to check availability. Please try again."
\ No newline at end of file
+            return "Failed to check availability. Please try again."
+
+    async def acheck_available_slots_wrapper(self, query: str) -> str:
+        try:
+            manager_logger.info("Checking available slots...")
+            results = await self.acheck_available_slots(query)
+            return self._format_slots(results)
+        except Exception as e:
+            manager_logger.error(f'Failed to check slots: {e}')
+            return "Failed to check availability. Please try again."
+
+    def _format_slots(self, results) -> str:
+        if not results:
+            resp = "No available appointments found."
+            return resp
+        
+        response = []
+        for date_str, slots in results:
+            if not slots:
+                continue
+            human_date = datetime.strptime(date_str, "%Y-%m-%d").strftime("%A, %b %d")
+            response.append(f"Available on {human_date}:")
+            response.extend([f"- {t}" for t in sorted(slots)])
+        if response:
+            resp = "\n".join(response)
+            return resp
+        else:
+            resp = "No slots found."
+            return resp
\ No newline at end of file
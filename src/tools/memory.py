@@ -0,0 +1,259 @@
+import asyncio
+import json
+from sqlalchemy import text
+from src.utils.cache import LRUCache
+from src.utils.config import config
+from src.utils.db import async_db_loader
+from src.utils.logger import app_logger
+from src.utils.tokens import count_tokens, truncate_tokens
+
+LOAD_MEMORY_SQL = text("SELECT chatmemory FROM chats WHERE chat_id = :chat_id")
+
+# Only written over the value this worker last read or wrote, another worker may have moved it on
+SAVE_MEMORY_SQL = text("""
+    UPDATE chats SET chatmemory = :memory
+    WHERE chat_id = :chat_id AND chatmemory IS NOT DISTINCT FROM :expected
+    RETURNING chat_id
+""")
+
+SUMMARY_PROMPT = '''You keep a running summary of a conversation between a user and a customer support assistant that answers company questions and books appointments.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{lines}
+
+Write the updated summary in at most {max_words} words. Keep names, dates, times, bookings and open requests, drop small talk. Return only the summary.'''
+
+def format_turns(turns):
+    return '\n'.join(f'User: {question}\nAssistant: {answer}' for question, answer, _ in turns)
+
+class ConversationMemory:
+    '''
+    Per-chat memory for the agent prompt, constant in size however long the chat runs.
+
+    Active chats live in an LRU. Each keeps a window of its latest turns within
+    window_tokens. Turns pushed out of the window are folded into a running
+    summary of at most summary_tokens by the llm, in the background after the
+    reply has been sent. The prompt gets the summary plus the window and nothing
+    else, so it never exceeds summary_tokens + window_tokens.
+
+    State is persisted lazily to chats.chatmemory as JSON: changed chats every
+    persist_seconds, evicted chats on the next round, and everything on close().
+    A chat that is not in memory is loaded from that column on its next turn.
+
+    Every worker keeps its own copy, so a write only lands when the column still
+    holds what this worker last read or wrote. When another worker got there
+    first, the chat is reloaded from the column and the turns this worker added
+    since its last write are replayed on top, folding and summarizing again, so
+    neither worker's turns are lost.
+
+    Args:
+        llm: chat model for the summaries, without one old turns are dropped
+        max_chats: active chats kept in memory
+        window_tokens: token budget of the recent turns
+        summary_tokens: token budget of the summary
+        persist_seconds: seconds between two writes of changed chats
+    '''
+    def __init__(self, llm=None, max_chats=None, window_tokens=None, summary_tokens=None, persist_seconds=None):
+        self.llm = llm
+        self.enabled = config.CONVERSATION_MEMORY_ENABLED
+        self.window_tokens = window_tokens or config.CONVERSATION_MEMORY_WINDOW_TOKENS
+        self.summary_tokens = summary_tokens or config.CONVERSATION_MEMORY_SUMMARY_TOKENS
+        self.persist_seconds = persist_seconds or config.CONVERSATION_MEMORY_PERSIST_SECONDS
+        self.chats = LRUCache(max_chats or config.CONVERSATION_MEMORY_MAX_CHATS, on_evict=self._evicted)
+        self._evicted_chats = {}
+        self._task = None
+        self._summary_tasks = set()
+        self.loads = 0
+        self.summaries = 0
+        self.persisted = 0
+        self.conflicts = 0
+
+    def _evicted(self, chat_id, state):
+        if state['dirty']:
+            self._evicted_chats[chat_id] = state
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _load(self, chat_id, state):
+        '''Replacing the state with what chats.chatmemory holds, keeping the turns not written yet'''
+        async with async_db_loader() as session:
+            row = (await session.execute(LOAD_MEMORY_SQL, {'chat_id': chat_id})).fetchone()
+        self.loads += 1
+        stored = row[0] if row else None
+        if row is None:
+            # The chat is gone, there is nothing to write back to
+            state['pending'] = []
+        # A summary still running on the old state must not land on the new one
+        state.update({'summary': '', 'turns': [], 'folded': [], 'stored': stored,
+                      'summarizing': False, 'generation': state.get('generation', 0) + 1})
+        if stored:
+            try:
+                data = json.loads(stored)
+                state['summary'] = data.get('summary', '')
+                state['turns'] = [(q, a, count_tokens(q) + count_tokens(a)) for q, a in data.get('turns', [])]
+            except (ValueError, TypeError, AttributeError):
+                app_logger.error(f'Unreadable memory for chat {chat_id}, starting fresh')
+        state['dirty'] = False
+        for turn in state['pending']:
+            self._append(chat_id, state, turn)
+
+    async def _state(self, chat_id):
+        state = self.chats.get(chat_id)
+        if state is not None:
+            return state
+        state = self._evicted_chats.pop(chat_id, None)
+        if state is None:
+            state = {'pending': [], 'dirty': False}
+            await self._load(chat_id, state)
+        self.chats.set(chat_id, state)
+        return state
+
+    async def history(self, chat_id):
+        '''
+        Conversation so far, formatted for the agent prompt
+
+        Returns:
+            history: summary and recent turns followed by a blank line, '' for a new chat
+        '''
+        if not self.enabled:
+            return ''
+        self._ensure_started()
+        state = await self._state(chat_id)
+        parts = []
+        if state['summary']:
+            parts.append(f"Summary of the earlier conversation: {state['summary']}")
+        if state['turns']:
+            parts.append(format_turns(state['turns']))
+        if not parts:
+            return ''
+        return 'Previous conversation:\n' + '\n'.join(parts) + '\n\n'
+
+    async def add_turn(self, chat_id, question, answer):
+        '''Recording a question and its answer, folding what falls out of the window'''
+        if not self.enabled:
+            return
+        self._ensure_started()
+        state = await self._state(chat_id)
+        turn = (question, answer, count_tokens(question) + count_tokens(answer))
+        state['pending'].append(turn)
+        self._append(chat_id, state, turn)
+
+    def _append(self, chat_id, state, turn):
+        state['turns'].append(turn)
+        while state['turns'] and sum(tokens for _, _, tokens in state['turns']) > self.window_tokens:
+            state['folded'].append(state['turns'].pop(0))
+        state['dirty'] = True
+        if state['folded'] and not state['summarizing']:
+            state['summarizing'] = True
+            # The loop only keeps a weak reference to its tasks
+            task = asyncio.get_running_loop().create_task(self._summarize(chat_id, state, state['generation']))
+            self._summary_tasks.add(task)
+            task.add_done_callback(self._summary_tasks.discard)
+
+    async def _summarize(self, chat_id, state, generation):
+        try:
+            while state['folded'] and state['generation'] == generation:
+                folded, state['folded'] = state['folded'], []
+                if self.llm is None:
+                    continue
+                prompt = SUMMARY_PROMPT.format(
+                    summary=state['summary'] or '(empty)',
+                    lines=format_turns(folded),
+                    max_words=int(self.summary_tokens * 0.75),
+                )
+                try:
+                    response = await self.llm.ainvoke(prompt)
+                except Exception as e:
+                    app_logger.error(f'Summarizing chat {chat_id} failed: {e}')
+                    continue
+                if state['generation'] != generation:
+                    break
+                state['summary'] = truncate_tokens(response.content.strip(), self.summary_tokens)
+                state['dirty'] = True
+                self.summaries += 1
+        finally:
+            if state['generation'] == generation:
+                state['summarizing'] = False
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.persist_seconds)
+            try:
+                await self.persist()
+            except Exception as e:
+                app_logger.error(f'Persisting chat memory failed: {e}')
+
+    async def persist(self):
+        '''Writing changed and evicted chats to chats.chatmemory in one transaction'''
+        evicted, self._evicted_chats = self._evicted_chats, {}
+        changed = dict(evicted)
+        changed.update((chat_id, state) for chat_id, state in self.chats.items() if state['dirty'])
+        if not changed:
+            return
+        rows = []
+        for chat_id, state in changed.items():
+            state['dirty'] = False
+            rows.append({'chat_id': chat_id, 'expected': state['stored'], 'written': len(state['pending']),
+                         'memory': json.dumps({
+                             'summary': state['summary'],
+                             'turns': [[q, a] for q, a, _ in state['turns']],
+                         })})
+        saved = set()
+        try:
+            async with async_db_loader() as session:
+                for row in rows:
+                    result = await session.execute(SAVE_MEMORY_SQL, {
+                        'chat_id': row['chat_id'], 'memory': row['memory'], 'expected': row['expected'],
+                    })
+                    if result.fetchone() is not None:
+                        saved.add(row['chat_id'])
+                await session.commit()
+        except Exception:
+            for chat_id, state in changed.items():
+                state['dirty'] = True
+            for chat_id, state in evicted.items():
+                self._evicted_chats.setdefault(chat_id, state)
+            raise
+        self.persisted += len(saved)
+
+        for row in rows:
+            chat_id, state = row['chat_id'], changed[row['chat_id']]
+            if chat_id in saved:
+                state['stored'] = row['memory']
+                # Turns added while the transaction ran stay pending for the next round
+                del state['pending'][:row['written']]
+                continue
+            self.conflicts += 1
+            app_logger.info(f'Memory of chat {chat_id} was written by another worker, merging')
+            await self._load(chat_id, state)
+            if chat_id in evicted:
+                self._evicted_chats.setdefault(chat_id, state)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Summaries still running are written by the last persist, a second round
+        # writes the chats merged after a conflict in the first
+        for _ in range(2):
+            if self._summary_tasks:
+                await asyncio.gather(*self._summary_tasks, return_exceptions=True)
+            await self.persist()
+
+    def stats(self):
+        return {
+            'active_chats': len(self.chats),
+            'loads': self.loads,
+            'summaries': self.summaries,
+            'persisted': self.persisted,
+            'conflicts': self.conflicts,
+        }
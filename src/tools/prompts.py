@@ -0,0 +1,21 @@
+# ReAct prompt bundled with the service, hwchase17/react from the langchain hub plus the
+# conversation so far, chat_history is '' or ends with a blank line
+REACT_TEMPLATE = '''Answer the following questions as best you can. You have access to the following tools:
+
+{tools}
+
+Use the following format:
+
+Question: the input question you must answer
+Thought: you should always think about what to do
+Action: the action to take, should be one of [{tool_names}]
+Action Input: the input to the action
+Observation: the result of the action
+... (this Thought/Action/Action Input/Observation can repeat N times)
+Thought: I now know the final answer
+Final Answer: the final answer to the original input question
+
+Begin!
+
+{chat_history}Question: {input}
+Thought:{agent_scratchpad}'''
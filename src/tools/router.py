@@ -0,0 +1,127 @@
+import numpy as np
+from src.rag.semantic_cache import is_transactional
+from src.utils.config import config
+from src.utils.logger import pipeline_logger
+
+# Fixed replies, same wording the FAQ prompt and helper.social_response ask the llm for
+RESPONSES = {
+    'greeting': ('Hey there, I am Lumi a customers service Agent. '
+                 'I can answer any question about NeuroSphere Lab company and I can book you an appointment '
+                 'for a meeting with the company. I am ready to help you.'),
+    'farewell': 'Goodbye! Have a great day!',
+    'thanks': 'You are welcome! Tell me if you need any other help.',
+}
+
+# Prototype messages per intent, 'other' holds near misses that must reach the agent
+INTENT_EXAMPLES = {
+    'greeting': [
+        'hi', 'hello', 'hey', 'hey there', 'hello there', 'hi lumi', 'good morning', 'good afternoon',
+        'good evening', 'greetings', 'howdy', 'hiya', 'yo', 'how are you', 'how are you doing',
+        "what's up", 'nice to meet you', 'hello, anyone there?',
+    ],
+    'farewell': [
+        'bye', 'goodbye', 'bye bye', 'see you', 'see you later', 'see you soon', 'talk to you later',
+        'have a nice day', 'have a good one', 'take care', 'good night', "that's all for today, bye",
+        'catch you later', 'farewell',
+    ],
+    'thanks': [
+        'thanks', 'thank you', 'thank you so much', 'thanks a lot', 'many thanks', 'much appreciated',
+        'i appreciate it', 'thanks for your help', 'thank you for the help', 'cheers', 'great, thanks',
+        'perfect, thank you', 'thx', 'awesome thanks',
+    ],
+    'other': [
+        'what services do you offer', 'how can i contact you', 'what is your email', 'where are you located',
+        'what does neurosphere lab do', 'tell me about your company', 'what are your prices',
+        'do you offer consulting', 'who are you', 'what can you do', 'i need help', 'can you help me',
+        'hello, what services do you offer?', 'hi, how can i contact support?', 'thanks, and what are your hours?',
+        'what are your working hours', 'is there a free trial', 'ok', 'yes', 'no',
+    ],
+}
+
+SOCIAL_INTENTS = tuple(RESPONSES)
+
+class IntentRouter:
+    '''
+    Answering social messages (greetings, farewells, thanks) without the agent.
+
+    Every prototype message is embedded once at startup. A user message is
+    embedded with the same model and scored against the closest prototype of
+    each intent, it is routed only when the best social intent clears the
+    threshold and beats every other intent by the margin. Long, booking-like or
+    ambiguous messages return None and go to the agent.
+
+    Args:
+        embedding_model: all-MiniLM-L6-v2 embedding model
+        threshold: minimum cosine similarity to a social prototype
+        margin: minimum lead over the runner-up intent
+        max_words: longer messages always go to the agent
+    '''
+    def __init__(self,embedding_model,threshold=None,margin=None,max_words=None):
+        self.embedding_model = embedding_model
+        self.enabled = config.INTENT_ROUTER_ENABLED
+        self.threshold = config.INTENT_ROUTER_THRESHOLD if threshold is None else threshold
+        self.margin = config.INTENT_ROUTER_MARGIN if margin is None else margin
+        self.max_words = config.INTENT_ROUTER_MAX_WORDS if max_words is None else max_words
+        self.intents = list(INTENT_EXAMPLES)
+        examples = [text for intent in self.intents for text in INTENT_EXAMPLES[intent]]
+        self.labels = np.array([self.intents.index(intent) for intent in self.intents
+                                for _ in INTENT_EXAMPLES[intent]])
+        try:
+            self.prototypes = self._normalize(self.embedding_model.encode(examples))
+        except Exception as e:
+            pipeline_logger.error(f'Embedding intent prototypes has failed : {e}')
+            raise RuntimeError('Intent router initializing has failed')
+        self.routed = 0
+        self.passed = 0
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype='float32')
+        vectors = vectors.reshape(-1, vectors.shape[-1])
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def scores(self,message):
+        '''Best cosine similarity of the message to each intent'''
+        similarities = self.prototypes @ self._normalize(self.embedding_model.encode(message))[0]
+        return {intent: float(similarities[self.labels == label].max())
+                for label, intent in enumerate(self.intents)}
+
+    def route(self,message):
+        '''
+        Classifying a message
+
+        Args:
+            message: the user's message
+        Returns:
+            intent: 'greeting', 'farewell' or 'thanks', None when the agent should handle it
+        '''
+        if not self.enabled or not message.strip() or len(message.split()) > self.max_words \
+                or is_transactional(message):
+            return None
+        scores = self.scores(message)
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        best, runner_up = ranked[0], ranked[1]
+        if best not in SOCIAL_INTENTS or scores[best] < self.threshold \
+                or scores[best] - scores[runner_up] < self.margin:
+            return None
+        return best
+
+    def answer(self,message):
+        '''
+        Returning the template reply for a social message
+
+        Args:
+            message: the user's message
+        Returns:
+            response: the fixed reply or None when the agent should handle it
+        '''
+        intent = self.route(message)
+        if intent is None:
+            self.passed += 1
+            return None
+        self.routed += 1
+        pipeline_logger.info(f'Intent router answered {intent} for: {message}')
+        return RESPONSES[intent]
+
+    def stats(self):
+        return {'routed': self.routed, 'passed': self.passed}
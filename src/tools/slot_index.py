@@ -0,0 +1,221 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from datetime import date, datetime, timedelta
+from sqlalchemy import text
+from src.utils.config import config
+from src.utils.db import db_loader
+from src.utils.logger import manager_logger
+
+SLOT_CALENDAR_SQL = text("""
+    SELECT day, time, is_booked FROM appointments
+    WHERE day >= :start_day AND day <= :end_day
+""")
+
+LOCK_STRIPES = 64
+
+def day_key(value):
+    '''YYYY-MM-DD for a date, datetime or string coming from any driver'''
+    return value.strftime("%Y-%m-%d") if hasattr(value, "strftime") else str(value)[:10]
+
+def time_key(value):
+    '''HH:MM for a time or string coming from any driver'''
+    return value.strftime("%H:%M") if hasattr(value, "strftime") else str(value)[:5]
+
+class SlotLocks:
+    '''
+    In-process locks keyed by (day, time).
+
+    Writers of the same slot queue up here instead of racing each other on the
+    database, and index updates land in commit order. Threads use striped
+    threading locks, coroutines one asyncio.Lock per slot that is dropped once
+    nobody holds or waits for it. The two are separate, the claim statement
+    keeps the database consistent either way.
+    '''
+    def __init__(self, stripes=LOCK_STRIPES):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        # (day, time) -> [asyncio.Lock, holders and waiters], only touched from the event loop
+        self._async_locks = {}
+
+    def _lock(self, day, slot_time):
+        return self._locks[hash((day_key(day), time_key(slot_time))) % len(self._locks)]
+
+    @contextmanager
+    def lock_slot(self, day, slot_time):
+        with self._lock(day, slot_time):
+            yield
+
+    @asynccontextmanager
+    async def alock_slot(self, day, slot_time):
+        '''lock_slot() for coroutines, waiters are woken in order by the event loop'''
+        key = (day_key(day), time_key(slot_time))
+        entry = self._async_locks.get(key)
+        if entry is None:
+            entry = self._async_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._async_locks[key]
+
+class SlotIndex:
+    '''
+    In-memory calendar of free appointment slots.
+
+    Every distinct slot time gets a fixed bit position and every day in the
+    horizon is an int bitmap of its free slots, so an availability check is a
+    few dict lookups and bit operations. The calendar is loaded and then
+    reconciled against the appointments table every reconcile_seconds by a
+    lazily started daemon thread, which picks up changes made by other workers.
+    In between, book and cancel write through with mark_booked()/mark_free()
+    while holding the slot's lock from slot_locks.
+    The database stays authoritative, the index only answers reads.
+
+    Args:
+        horizon_days: number of days from today kept in memory
+        reconcile_seconds: seconds between two reloads from the database
+    '''
+    def __init__(self, horizon_days=None, reconcile_seconds=None):
+        self.horizon_days = horizon_days or config.SLOT_INDEX_HORIZON_DAYS
+        self.reconcile_seconds = reconcile_seconds or config.SLOT_INDEX_RECONCILE_SECONDS
+        self.lock = threading.RLock()
+        self.times = []
+        self.positions = {}
+        self.free = None
+        self.start_day = None
+        self.end_day = None
+        self.reconciles = 0
+        self._pending = None
+        self._reconcile_lock = threading.Lock()
+        self.slot_locks = SlotLocks()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='slot-index', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.reconcile()
+            except Exception as e:
+                manager_logger.error(f'Slot index reconcile failed : {e}')
+            time.sleep(self.reconcile_seconds)
+
+    def reconcile(self):
+        '''Reloading the calendar from the database, keeping writes made meanwhile'''
+        with self._reconcile_lock:
+            start_day = date.today()
+            end_day = start_day + timedelta(days=self.horizon_days)
+            with self.lock:
+                self._pending = []
+            try:
+                with db_loader() as session:
+                    rows = session.execute(SLOT_CALENDAR_SQL, {"start_day": start_day, "end_day": end_day}).fetchall()
+            except Exception:
+                with self.lock:
+                    self._pending = None
+                raise
+
+            times = sorted({time_key(row[1]) for row in rows})
+            positions = {t: bit for bit, t in enumerate(times)}
+            free = {}
+            for day, slot_time, is_booked in rows:
+                key = day_key(day)
+                free.setdefault(key, 0)
+                if not is_booked:
+                    free[key] |= 1 << positions[time_key(slot_time)]
+
+            with self.lock:
+                self.times, self.positions, self.free = times, positions, free
+                # Book and cancel calls that landed while the rows were read
+                for key, slot_time, booked in self._pending:
+                    self._apply(key, slot_time, booked)
+                self._pending = None
+                self.start_day, self.end_day = day_key(start_day), day_key(end_day)
+                self.reconciles += 1
+        manager_logger.info(f'Slot index loaded {len(rows)} slots over {len(free)} days')
+
+    def covers(self, days):
+        '''Whether every day is inside the loaded horizon, starting the loader if needed'''
+        self._ensure_started()
+        with self.lock:
+            if self.free is None:
+                return False
+            return all(self.start_day <= day_key(day) <= self.end_day for day in days)
+
+    def available(self, days, now=None):
+        '''
+        Free upcoming slots of the given days
+
+        Args:
+            days: dates to look at, all covered by the index
+            now: reference datetime for hiding past slots of today
+        Returns:
+            matches: [(date_str, [times])] for the days that have free slots
+        '''
+        now = now or datetime.now()
+        today, current_time = day_key(now), time_key(now)
+        matches = []
+        with self.lock:
+            for day in days:
+                key = day_key(day)
+                mask = self.free.get(key, 0)
+                slots = []
+                while mask:
+                    bit = mask & -mask
+                    slot_time = self.times[bit.bit_length() - 1]
+                    if key > today or (key == today and slot_time > current_time):
+                        slots.append(slot_time)
+                    mask ^= bit
+                if slots:
+                    matches.append((key, sorted(slots)))
+        return matches
+
+    def mark_booked(self, day, slot_time):
+        self._write(day_key(day), time_key(slot_time), True)
+
+    def mark_free(self, day, slot_time):
+        self._write(day_key(day), time_key(slot_time), False)
+
+    def _write(self, key, slot_time, booked):
+        with self.lock:
+            if self._pending is not None:
+                self._pending.append((key, slot_time, booked))
+            if self.free is not None:
+                self._apply(key, slot_time, booked)
+
+    def _apply(self, key, slot_time, booked):
+        position = self.positions.get(slot_time)
+        if position is None:
+            if booked:
+                return
+            # A slot time the last load did not know about
+            position = len(self.times)
+            self.times.append(slot_time)
+            self.positions[slot_time] = position
+        if booked:
+            self.free[key] = self.free.get(key, 0) & ~(1 << position)
+        else:
+            self.free[key] = self.free.get(key, 0) | (1 << position)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'loaded': self.free is not None,
+                'days': len(self.free or {}),
+                'slot_times': len(self.times),
+                'reconciles': self.reconciles,
+            }
@@ -0,0 +1,189 @@
+import re
+from datetime import date, timedelta
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+WEEKDAY_ALIASES = {
+    'mon': 0, 'tue': 1, 'tues': 1, 'wed': 2, 'weds': 2, 'thu': 3, 'thur': 3, 'thurs': 3,
+    'fri': 4, 'sat': 5, 'sun': 6, **{name: i for i, name in enumerate(WEEKDAYS)},
+}
+MONTHS = {
+    'jan': 1, 'january': 1, 'feb': 2, 'february': 2, 'mar': 3, 'march': 3, 'apr': 4, 'april': 4,
+    'may': 5, 'jun': 6, 'june': 6, 'jul': 7, 'july': 7, 'aug': 8, 'august': 8, 'sep': 9, 'sept': 9,
+    'september': 9, 'oct': 10, 'october': 10, 'nov': 11, 'november': 11, 'dec': 12, 'december': 12,
+}
+
+_WEEKDAY = '|'.join(sorted(WEEKDAY_ALIASES, key=len, reverse=True))
+_MONTH = '|'.join(sorted(MONTHS, key=len, reverse=True))
+_ORDINAL = r'(\d{1,2})(?:st|nd|rd|th)?'
+
+ISO_DATE = re.compile(r'\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b')
+NUMERIC_DATE = re.compile(r'\b(\d{1,2})([/.])(\d{1,2})(?:\2(\d{2,4}))?\b')
+DAY_MONTH = re.compile(rf'\b{_ORDINAL}(?:\s+of)?\s+({_MONTH})\.?(?:,?\s+(\d{{4}}))?\b')
+MONTH_DAY = re.compile(rf'\b({_MONTH})\.?\s+{_ORDINAL}(?:,?\s+(\d{{4}}))?\b')
+RELATIVE_DAY = re.compile(r'\b(day after tomorrow|today|tonight|tomorrow|tmrw|tmr)\b')
+IN_DAYS = re.compile(r'\bin\s+(\d{1,2}|a|one|two|three|four|five|six|seven)\s+days?\b')
+RECURRING_WEEKDAY = re.compile(rf'\b(?:every|each)\s+({_WEEKDAY})\b|\b({_WEEKDAY})s\b')
+WEEKDAY = re.compile(rf'\b(?:(next|this|coming)\s+)?({_WEEKDAY})\b')
+NEXT_WEEK = re.compile(r'\bnext\s+week\b')
+
+TIME_12H = re.compile(r'\b(\d{1,2})(?:[:.](\d{2}))?\s*([ap])\.?\s?m\b\.?')
+TIME_24H = re.compile(r'\b([01]?\d|2[0-3])[:h.]([0-5]\d)\b')
+NAMED_TIME = re.compile(r'\b(noon|midday|midnight)\b')
+BARE_HOUR = re.compile(r"\b(?:at|around|by)\s+(\d{1,2})(?:\s*o'?clock)?\b(?!\s*(?:[:/.-]|st|nd|rd|th|days?))")
+
+NUMBER_WORDS = {'a': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7}
+NAMED_TIMES = {'noon': '12:00', 'midday': '12:00', 'midnight': '00:00'}
+
+class TemporalParser:
+    '''
+    Rule-based extraction of the day and time of an appointment request.
+
+    Resolves relative days, weekday names, ISO and written dates and 12h/24h
+    times against a reference date. Specific days come back as YYYY-MM-DD,
+    recurring ones ("every monday", "mondays") as the lowercase weekday name and
+    times as HH:MM. When the text supports more than one reading, like 05/06,
+    "at 3" or two different dates, the result is flagged ambiguous and the
+    caller should ask the llm instead.
+    '''
+    def parse(self, text, today=None):
+        '''
+        Extracting the day and time from a message
+
+        Args:
+            text: the user's message
+            today: reference date, defaults to the current date
+        Returns:
+            parsed: {'day': str or None, 'time': str or None, 'ambiguous': bool}
+        '''
+        today = today or date.today()
+        text = text.lower()
+        days, day_ambiguous, text = self._days(text, today)
+        times, time_ambiguous = self._times(text)
+        ambiguous = day_ambiguous or time_ambiguous or len(days) > 1 or len(times) > 1
+        return {
+            'day': days[0] if len(days) == 1 else None,
+            'time': times[0] if len(times) == 1 else None,
+            'ambiguous': ambiguous,
+        }
+
+    def parse_day(self, text, today=None):
+        '''Resolving a day on its own, None when missing or ambiguous'''
+        if not text:
+            return None
+        days, ambiguous, _ = self._days(str(text).lower(), today or date.today())
+        return days[0] if len(days) == 1 and not ambiguous else None
+
+    def parse_time(self, text):
+        '''Resolving a time on its own, None when missing or ambiguous'''
+        if not text:
+            return None
+        times, ambiguous = self._times(str(text).lower())
+        return times[0] if len(times) == 1 and not ambiguous else None
+
+    def _days(self, text, today):
+        '''Returning the distinct days found, whether one was ambiguous, and the text with dates removed'''
+        found = []
+        ambiguous = False
+
+        def add(value):
+            if value is not None and value not in found:
+                found.append(value)
+
+        def consume(pattern, handler):
+            nonlocal text
+            for match in pattern.finditer(text):
+                add(handler(match))
+            text = pattern.sub(' ', text)
+
+        consume(ISO_DATE, lambda m: self._date(int(m[1]), int(m[2]), int(m[3])))
+        consume(DAY_MONTH, lambda m: self._written_date(today, int(m[1]), MONTHS[m[2]], m[3]))
+        consume(MONTH_DAY, lambda m: self._written_date(today, int(m[2]), MONTHS[m[1]], m[3]))
+
+        for match in NUMERIC_DATE.finditer(text):
+            first, second, year = int(match[1]), int(match[3]), match[4]
+            if match[2] == '.' and year is None:
+                # 10.30 is a time, not a date
+                continue
+            if first > 12 and second <= 12:
+                add(self._written_date(today, first, second, year))
+            elif second > 12 and first <= 12:
+                add(self._written_date(today, second, first, year))
+            elif first == second:
+                add(self._written_date(today, first, second, year))
+            else:
+                # 05/06 reads as 5 June or May 6
+                ambiguous = True
+            text = text.replace(match[0], ' ', 1)
+
+        consume(RELATIVE_DAY, lambda m: self._relative(today, m[1]))
+        consume(IN_DAYS, lambda m: self._iso(today + timedelta(days=int(NUMBER_WORDS.get(m[1], m[1])))))
+        consume(RECURRING_WEEKDAY, lambda m: WEEKDAYS[WEEKDAY_ALIASES[m[1] or m[2]]])
+
+        for match in WEEKDAY.finditer(text):
+            weekday = WEEKDAY_ALIASES[match[2]]
+            delta = (weekday - today.weekday()) % 7
+            if match[1] == 'next' and delta == 0:
+                delta = 7
+            add(self._iso(today + timedelta(days=delta)))
+        text = WEEKDAY.sub(' ', text)
+
+        if NEXT_WEEK.search(text) and not found:
+            ambiguous = True
+        return found, ambiguous, text
+
+    def _times(self, text):
+        found = []
+        ambiguous = False
+
+        def add(value):
+            if value is not None and value not in found:
+                found.append(value)
+
+        for match in TIME_12H.finditer(text):
+            hour, minute = int(match[1]), int(match[2] or 0)
+            if not 1 <= hour <= 12 or minute > 59:
+                continue
+            hour = hour % 12 + (12 if match[3] == 'p' else 0)
+            add(f'{hour:02d}:{minute:02d}')
+        text = TIME_12H.sub(' ', text)
+
+        for match in TIME_24H.finditer(text):
+            add(f'{int(match[1]):02d}:{match[2]}')
+        text = TIME_24H.sub(' ', text)
+
+        for match in NAMED_TIME.finditer(text):
+            add(NAMED_TIMES[match[1]])
+
+        for match in BARE_HOUR.finditer(text):
+            hour = int(match[1])
+            if 13 <= hour <= 23:
+                add(f'{hour:02d}:00')
+            elif 1 <= hour <= 12:
+                # "at 3" could be 03:00 or 15:00
+                ambiguous = True
+        return found, ambiguous
+
+    def _relative(self, today, word):
+        offsets = {'today': 0, 'tonight': 0, 'tomorrow': 1, 'tmrw': 1, 'tmr': 1, 'day after tomorrow': 2}
+        return self._iso(today + timedelta(days=offsets[word]))
+
+    def _written_date(self, today, day, month, year):
+        if year is not None:
+            year = int(year)
+            return self._date(year + 2000 if year < 100 else year, month, day)
+        value = self._date(today.year, month, day)
+        if value is not None and value < self._iso(today):
+            # A date without a year that has already passed means next year
+            value = self._date(today.year + 1, month, day)
+        return value
+
+    @staticmethod
+    def _date(year, month, day):
+        try:
+            return date(year, month, day).strftime('%Y-%m-%d')
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _iso(value):
+        return value.strftime('%Y-%m-%d')
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+
+def normalize_query(text):
+    '''Canonical form of a user query used as a cache key'''
+    return ' '.join(str(text).lower().split()).strip(' ?!.')
+
+class LRUCache:
+    '''
+    Thread-safe LRU mapping with an optional time-to-live.
+
+    Args:
+        max_size: maximum number of entries kept
+        ttl: seconds an entry stays valid, None keeps it until it is evicted
+        on_evict: called with (key, value) for entries dropped by size or ttl
+    '''
+    def __init__(self,max_size,ttl=None,on_evict=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _expired(self,stored_at):
+        return self.ttl is not None and time.monotonic() - stored_at > self.ttl
+
+    def _notify(self,evicted):
+        if self.on_evict:
+            for key, value in evicted:
+                self.on_evict(key, value)
+
+    def get(self,key,default=None):
+        evicted = []
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self._expired(item[1]):
+                del self._data[key]
+                evicted.append((key, item[0]))
+                item = None
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+        self._notify(evicted)
+        return default if item is None else item[0]
+
+    def peek(self,key,default=None):
+        '''Reading an entry without touching its recency or the counters'''
+        with self._lock:
+            item = self._data.get(key)
+            return default if item is None else item[0]
+
+    def set(self,key,value):
+        evicted = []
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                old_key, (old_value, _) = self._data.popitem(last=False)
+                evicted.append((old_key, old_value))
+        self._notify(evicted)
+
+    def evict_oldest(self):
+        '''Dropping the least recently used entry, returns False when empty'''
+        with self._lock:
+            if not self._data:
+                return False
+            key, (value, _) = self._data.popitem(last=False)
+        self._notify([(key, value)])
+        return True
+
+    def pop(self,key,default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._data.items()]
+
+    def __contains__(self,key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,51 @@
+from fastapi import HTTPException
+from sqlalchemy.sql import text
+from src.utils.cache import LRUCache
+from src.utils.config import config
+from src.utils.db import async_db_loader
+from src.utils.logger import app_logger
+
+CHECK_CHAT_SQL = text("SELECT chat_id FROM chats WHERE chat_id = :chat_id AND user_id = :user_id")
+
+class ChatOwnership:
+    '''
+    Checking that a chat belongs to the user before a chat route runs.
+
+    The check runs in its own short session, so the connection is back in the
+    pool before the agent runs. Pairs that passed, or were created by
+    /bootstrap and /create_chat, are kept in an LRU with a ttl, so the
+    messages of a conversation skip the query. Chats are never handed to
+    another user, so a cached pair cannot become wrong.
+
+    Args:
+        max_size: most (user_id, chat_id) pairs kept
+        ttl: seconds a pair is trusted
+    '''
+    def __init__(self, max_size=None, ttl=None):
+        self.owners = LRUCache(max_size or config.CHAT_OWNERSHIP_CACHE_MAX_SIZE,
+                               ttl=ttl or config.CHAT_OWNERSHIP_CACHE_TTL)
+
+    def remember(self, user_id, chat_id):
+        '''Recording a pair known to be valid, e.g. a chat just created for the user'''
+        self.owners.set((user_id, chat_id), True)
+
+    async def ensure(self, user_id, chat_id):
+        '''
+        Raising 404 when the chat does not exist or belongs to another user
+
+        Args:
+            user_id: user of the request
+            chat_id: chat of the request
+        '''
+        if self.owners.get((user_id, chat_id)):
+            return
+        async with async_db_loader() as session:
+            result = await session.execute(CHECK_CHAT_SQL, {"chat_id": chat_id, "user_id": user_id})
+            chat = result.fetchone()
+        if not chat:
+            app_logger.error(f"Chat {chat_id} not found for user {user_id}")
+            raise HTTPException(status_code=404, detail="Chat not found")
+        self.remember(user_id, chat_id)
+
+    def stats(self):
+        return self.owners.stats()
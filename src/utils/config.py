@@ -12,12 +12,66 @@ class Config:
             config_data = yaml.safe_load(file)
 
         self.EMBEDDING_MODEL = config_data['embedding_model']
+        self.EMBEDDING_BACKEND = config_data['embedding_backend']['backend']
+        self.EMBEDDING_ONNX_DIR = config_data['embedding_backend']['onnx_dir']
+        self.EMBEDDING_QUANTIZE = config_data['embedding_backend']['quantize']
+        self.EMBEDDING_THREADS = config_data['embedding_backend']['intra_op_threads']
         self.LLM_MODEL = config_data['llm_model']
         self.TEMBERATURE =config_data['temperature']
         self.DATA_PATH = config_data['faqs_path']
         self.INDEX_PATH = config_data['index_path']
+        self.INDEX_MANIFEST_PATH = config_data['index_manifest_path']
+        self.EMBEDDINGS_PATH = config_data['embeddings_path']
+        self.ANSWERS_PATH = config_data['answers_path']
+        self.ANSWERS_MMAP = config_data['answers_mmap']
+        self.FAQ_DELTA_PATH = config_data['faq_delta_path']
+        self.FAQ_COMPACT_EVERY = config_data['faq_compact_every']
+        self.INDEX_TYPE = config_data['index']['type']
+        self.INDEX_METRIC = config_data['index']['metric']
+        self.INDEX_NLIST = config_data['index']['nlist']
+        self.INDEX_NPROBE = config_data['index']['nprobe']
+        self.INDEX_HNSW_M = config_data['index']['hnsw_m']
+        self.INDEX_EF_CONSTRUCTION = config_data['index']['ef_construction']
+        self.INDEX_EF_SEARCH = config_data['index']['ef_search']
+        self.INDEX_PQ_M = config_data['index']['pq_m']
+        self.INDEX_PQ_NBITS = config_data['index']['pq_nbits']
+        self.READ_ONLY_INDEX = os.getenv('READ_ONLY_INDEX', str(config_data['serving']['read_only_index'])).lower() == 'true'
+        # Number of serving worker processes
+        self.WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+        self.QUERY_EMBEDDING_CACHE_SIZE = config_data['query_embedding_cache_size']
+        self.RETRIEVAL_BATCHING = config_data['retrieval_batching']['enabled']
+        self.RETRIEVAL_MAX_BATCH_SIZE = config_data['retrieval_batching']['max_batch_size']
+        self.RETRIEVAL_MAX_WAIT_MS = config_data['retrieval_batching']['max_wait_ms']
+        self.CONTEXT_MAX_K = config_data['context']['max_k']
+        self.CONTEXT_GAP = config_data['context']['gap']
+        self.CONTEXT_DUPLICATE_SIMILARITY = config_data['context']['duplicate_similarity']
+        self.CONTEXT_MAX_TOKENS = config_data['context']['max_tokens']
+        self.DIRECT_ANSWER_ENABLED = config_data['direct_answer']['enabled']
+        self.DIRECT_ANSWER_MAX_DISTANCE = config_data['direct_answer']['max_distance']
+        self.DIRECT_ANSWER_MIN_MARGIN = config_data['direct_answer']['min_margin']
+        self.SEMANTIC_CACHE_ENABLED = config_data['semantic_cache']['enabled']
+        self.SEMANTIC_CACHE_THRESHOLD = config_data['semantic_cache']['threshold']
+        self.SEMANTIC_CACHE_MAX_SIZE = config_data['semantic_cache']['max_size']
+        self.SEMANTIC_CACHE_TTL = config_data['semantic_cache']['ttl_seconds']
+        self.INTENT_ROUTER_ENABLED = config_data['intent_router']['enabled']
+        self.INTENT_ROUTER_THRESHOLD = config_data['intent_router']['threshold']
+        self.INTENT_ROUTER_MARGIN = config_data['intent_router']['margin']
+        self.INTENT_ROUTER_MAX_WORDS = config_data['intent_router']['max_words']
+        self.SLOT_INDEX_ENABLED = config_data['slot_index']['enabled']
+        self.SLOT_INDEX_HORIZON_DAYS = config_data['slot_index']['horizon_days']
+        self.SLOT_INDEX_RECONCILE_SECONDS = config_data['slot_index']['reconcile_seconds']
+        self.MESSAGE_WRITER_MAX_BATCH = config_data['message_writer']['max_batch']
+        self.MESSAGE_WRITER_MAX_WAIT_MS = config_data['message_writer']['max_wait_ms']
+        self.CHAT_OWNERSHIP_CACHE_MAX_SIZE = config_data['chat_ownership_cache']['max_size']
+        self.CHAT_OWNERSHIP_CACHE_TTL = config_data['chat_ownership_cache']['ttl_seconds']
+        self.CONVERSATION_MEMORY_ENABLED = config_data['conversation_memory']['enabled']
+        self.CONVERSATION_MEMORY_MAX_CHATS = config_data['conversation_memory']['max_chats']
+        self.CONVERSATION_MEMORY_WINDOW_TOKENS = config_data['conversation_memory']['window_tokens']
+        self.CONVERSATION_MEMORY_SUMMARY_TOKENS = config_data['conversation_memory']['summary_tokens']
+        self.CONVERSATION_MEMORY_PERSIST_SECONDS = config_data['conversation_memory']['persist_seconds']
         self.OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
         self.EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
+        self.ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
         self.LOGGER_FORMAT = config_data['logging']['format']
         self.PIPELINE_LOGGER = config_data['logging']['pipeline_log_file']
         self.APP_LOGGER = config_data['logging']['app_log_file']
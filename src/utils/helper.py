@@ -1,12 +1,6 @@
 from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough
 import re
-from src.model.load_models import ModelLoader
-
-
-
-model_loader = ModelLoader()
-llm_model = model_loader.get_llm_model()
+from src.model.registry import model_registry
 
 def social_response(query):
     prompt = PromptTemplate(
@@ -21,7 +15,7 @@ def social_response(query):
     This is the meesage : {message}
     """)
 
-    llm_chain = prompt | llm_model
+    llm_chain = prompt | model_registry.llm_model()
     respnse = llm_chain.invoke({'message' : query})
     cleaned_response = re.sub(r'\*\*(.*?)\*\*',r'\1',respnse.content)
     return cleaned_response
@@ -34,7 +28,7 @@ def enhance_response (query):
     message: {message}
     """)
 
-    llm_chain = prompt | llm_model
+    llm_chain = prompt | model_registry.llm_model()
     respnse = llm_chain.invoke({'message' : query})
     cleaned_response = re.sub(r'\*\*(.*?)\*\*',r'\1',respnse.content)
     return cleaned_response
@@ -0,0 +1,115 @@
+import asyncio
+from sqlalchemy import func, insert
+from sqlalchemy.sql import table, column
+from src.utils.config import config
+from src.utils.db import async_db_loader
+from src.utils.logger import app_logger
+
+messages_table = table('messages', column('chat_id'), column('message_text'), column('message_type'), column('timestamp'))
+
+class MessageWriter:
+    '''
+    Write-behind buffer for chat messages.
+
+    Routes hand rows to write() and return without touching the pool, a single
+    background task drains the queue and inserts whatever piled up, from every
+    chat, as one multi-row INSERT in one transaction. Rows written together keep
+    their order, so a question and its answer get consecutive message ids.
+    close() drains everything that was queued before returning and is awaited on
+    shutdown.
+
+    Args:
+        max_batch: most rows per INSERT
+        max_wait_ms: how long the first queued row waits for more
+        retries: attempts per batch before it is dropped and logged
+    '''
+    def __init__(self, max_batch=None, max_wait_ms=None, retries=3):
+        self.max_batch = max_batch or config.MESSAGE_WRITER_MAX_BATCH
+        self.max_wait = (max_wait_ms or config.MESSAGE_WRITER_MAX_WAIT_MS) / 1000
+        self.retries = retries
+        self.batches = 0
+        self.rows = 0
+        self.dropped = 0
+        self._queue = None
+        self._task = None
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = self._queue or asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def write(self, *rows):
+        '''
+        Queueing message rows, must be called from the event loop
+
+        Args:
+            rows: (chat_id, message_text, message_type) tuples
+        '''
+        self._ensure_started()
+        for chat_id, message_text, message_type in rows:
+            self._queue.put_nowait({
+                'chat_id': chat_id,
+                'message_text': message_text,
+                'message_type': message_type,
+                'timestamp': func.current_timestamp(),
+            })
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - asyncio.get_running_loop().time()
+            try:
+                batch.append(self._queue.get_nowait() if remaining <= 0 else
+                             await asyncio.wait_for(self._queue.get(), remaining))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        return batch
+
+    async def _insert(self, batch):
+        for attempt in range(self.retries):
+            try:
+                async with async_db_loader() as session:
+                    await session.execute(insert(messages_table).values(batch))
+                    await session.commit()
+                self.batches += 1
+                self.rows += len(batch)
+                return
+            except Exception as e:
+                app_logger.error(f'Writing {len(batch)} messages failed ({attempt + 1}/{self.retries}): {e}')
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        self.dropped += len(batch)
+        for row in batch:
+            app_logger.error(f"Dropped message for chat {row['chat_id']} ({row['message_type']}): {row['message_text']}")
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                await self._insert(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def flush(self):
+        '''Waiting until every row queued so far is written'''
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self):
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize() if self._queue is not None else 0,
+            'batches': self.batches,
+            'rows': self.rows,
+            'dropped': self.dropped,
+        }
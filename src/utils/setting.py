@@ -1,4 +1,17 @@
+from typing import Optional
 from pydantic import BaseModel
 
 class Query(BaseModel):
-    question : str
\ No newline at end of file
+    question : str
+    # Generated by the client per message and reused when it retries, bookings made
+    # while answering a retried message are returned instead of being made twice
+    idempotency_key : Optional[str] = None
+
+class FaqEntry(BaseModel):
+    question : str
+    answer : str
+
+class Reservation(BaseModel):
+    reservation_id : int
+    day : str
+    time : str
@@ -0,0 +1,21 @@
+import time
+
+class StartupProfile:
+    '''
+    Wall time of each startup phase, a phase ends at its mark() call.
+
+    Args:
+        started: perf_counter() value the first phase is measured from
+    '''
+    def __init__(self,started=None):
+        self.started = started or time.perf_counter()
+        self._last = self.started
+        self.phases = {}
+
+    def mark(self,name):
+        now = time.perf_counter()
+        self.phases[name] = round(now - self._last, 4)
+        self._last = now
+
+    def as_dict(self):
+        return {'phases': dict(self.phases), 'total': round(sum(self.phases.values()), 4)}
@@ -0,0 +1,31 @@
+import tiktoken
+from functools import lru_cache
+from src.utils.config import config
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    '''Tokenizer of the configured llm, o200k_base for models tiktoken does not know'''
+    try:
+        return tiktoken.encoding_for_model(config.LLM_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding('o200k_base')
+
+def count_tokens(text):
+    return len(get_encoding().encode(text or '', disallowed_special=()))
+
+def truncate_tokens(text, max_tokens, keep='start'):
+    '''
+    Cutting a text down to a token budget
+
+    Args:
+        text: text to cut
+        max_tokens: budget
+        keep: 'start' keeps the beginning, 'end' keeps the most recent part
+    Returns:
+        text: the text itself when it fits, else its decoded first or last max_tokens tokens
+    '''
+    tokens = get_encoding().encode(text or '', disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text or ''
+    tokens = tokens[:max_tokens] if keep == 'start' else tokens[-max_tokens:]
+    return get_encoding().decode(tokens)